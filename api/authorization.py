@@ -1,28 +1,45 @@
 #api/authorization.py
+import asyncio
+import hashlib
 import os
+import time
 import jwt
-from fastapi import HTTPException, status
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, Security, status
+from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from datetime import datetime, timedelta
 from passlib.context import CryptContext
-from api.shared import load_users
-from dotenv import load_dotenv
+from utils.env import load_env
+from api.shared import user_store
 import logging
 
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
-
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 # Password hashing
 pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 
+# bcrypt runs on its own small pool (never on the event loop); logins beyond the limit wait, then get a 429
+AUTH_HASH_WORKERS = int(os.getenv("AUTH_HASH_WORKERS", 2))
+AUTH_MAX_CONCURRENT_LOGINS = int(os.getenv("AUTH_MAX_CONCURRENT_LOGINS", 8))
+AUTH_QUEUE_TIMEOUT = float(os.getenv("AUTH_QUEUE_TIMEOUT", 5))
+
+hash_executor = ThreadPoolExecutor(max_workers=max(1, AUTH_HASH_WORKERS), thread_name_prefix="bcrypt")
+login_slots = asyncio.Semaphore(max(1, AUTH_MAX_CONCURRENT_LOGINS))
+
 # Fetch the SECRET_KEY from the environment
 SECRET_KEY = os.getenv("SECRET_KEY")
 logging.info(f"This is the Secret Key: {SECRET_KEY}")
 if not SECRET_KEY:
     raise ValueError("SECRET_KEY is not set in environment variables.")
 
+# Verified-token cache: entries kept, and the longest an entry is trusted (never past the token's own exp)
+TOKEN_CACHE_SIZE = int(os.getenv("TOKEN_CACHE_SIZE", 10000))
+TOKEN_CACHE_TTL = float(os.getenv("TOKEN_CACHE_TTL", 300))
+
+bearer_scheme = HTTPBearer()
+
 # Create access token
 def create_access_token(data: dict):
     to_encode = data.copy()
@@ -45,9 +62,99 @@ def verify_token(token: str):
             status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid token", headers={"WWW-Authenticate": "Bearer"}
         )
 
+# Wait for a free login slot, or refuse with a 429 once AUTH_QUEUE_TIMEOUT passes
+async def _acquire_login_slot():
+    try:
+        await asyncio.wait_for(login_slots.acquire(), timeout=AUTH_QUEUE_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_429_TOO_MANY_REQUESTS, detail="Too many concurrent logins, try again shortly.",
+            headers={"Retry-After": str(max(1, int(AUTH_QUEUE_TIMEOUT)))}
+        )
+
+
+# Hash a new password on the bcrypt pool
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(hash_executor, pwd_context.hash, password)
+
+
 # Authenticate user
-def authenticate_user(username: str, password: str):
-    users = load_users()
-    if username in users and pwd_context.verify(password, users[username]["password"]):
-        return {"username": username}
-    return None
+async def authenticate_user(username: str, password: str):
+    # Waits for the users-file lock while a registration is being written, so not on the event loop
+    user = await asyncio.to_thread(user_store.get, username)
+    if user is None:
+        return None
+    await _acquire_login_slot()
+    try:
+        loop = asyncio.get_running_loop()
+        verified = await loop.run_in_executor(hash_executor, pwd_context.verify, password, user["password"])
+    finally:
+        login_slots.release()
+    return {"username": username} if verified else None
+
+
+# LRU of already verified token claims, keyed on a SHA-256 of the token so raw tokens are not held
+class VerifiedTokenCache:
+    def __init__(self, max_size: int = TOKEN_CACHE_SIZE, ttl: float = TOKEN_CACHE_TTL):
+        self.max_size = max_size
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()  # digest -> (expires_at, claims)
+
+    @staticmethod
+    def _key(token: str) -> bytes:
+        return hashlib.sha256(token.encode()).digest()
+
+    def get(self, token: str):
+        key = self._key(token)
+        entry = self._entries.get(key)
+        if entry is not None and entry[0] > time.time():
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+        if entry is not None:
+            del self._entries[key]
+        self.misses += 1
+        return None
+
+    def put(self, token: str, claims: dict):
+        expires_at = time.time() + self.ttl
+        if "exp" in claims:
+            expires_at = min(expires_at, float(claims["exp"]))
+        key = self._key(token)
+        self._entries[key] = (expires_at, claims)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+        self.hits = self.misses = 0
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+token_cache = VerifiedTokenCache()
+
+
+# verify_token with the result cached until the token expires (failures are never cached)
+def verify_token_cached(token: str) -> dict:
+    claims = token_cache.get(token)
+    if claims is None:
+        claims = verify_token(token)
+        token_cache.put(token, claims)
+    return claims
+
+
+# FastAPI dependency for protected endpoints: the verified claims of the bearer token
+async def require_token(credentials: HTTPAuthorizationCredentials = Security(bearer_scheme)) -> dict:
+    return verify_token_cached(credentials.credentials)
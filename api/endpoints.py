@@ -1,22 +1,32 @@
 #api/endpoints.py
-from dotenv import load_dotenv
-from fastapi import APIRouter, HTTPException, Query, Security, Body
-from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
-from pydantic import BaseModel, EmailStr, Field, validator
+import asyncio
+import csv
+import io
+import os
+from datetime import date
 
-from api.authorization import create_access_token, verify_token, authenticate_user, pwd_context
-from api.schemas import TransactionBase
-from api.shared import save_users, load_users
-from utils.db_operations import fetch_transactions
+from fastapi import APIRouter, HTTPException, Query, Depends, Body, Response
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, EmailStr, Field, TypeAdapter, validator
 
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
+from utils.env import load_env
+from api.authorization import create_access_token, authenticate_user, hash_password, require_token
+from api.pagination import NEXT_CURSOR_HEADER, encode_cursor, decode_cursor
+from api.schemas import TransactionBase
+from api.shared import user_store
+from utils.cache import response_cache
+from utils.db_operations import (
+    Transaction, fetch_settlement_summary, fetch_transactions, index_catalog, search_transactions, stream_transactions
+)
+from utils.query_spec import QuerySpec, QuerySpecError
+from utils.search import SEARCH_MAX_RESULTS, SearchQueryError, search_terms
+from utils.rollups import ROLLUP_DIMENSIONS
+from utils.serialization import dumps
 
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 router = APIRouter()
-bearer_scheme = HTTPBearer()
 
 # Available columns for filtering and sorting
 FILTER_COLUMNS = [
@@ -35,6 +45,19 @@ FILTER_COLUMNS = [
 
 SORT_COLUMNS = FILTER_COLUMNS.copy()
 
+# Sorts no index can serve: "reject" refuses them, "cap" allows them only under an indexed filter and caps the page
+UNINDEXED_SORT_POLICY = os.getenv("UNINDEXED_SORT_POLICY", "cap")
+UNINDEXED_SORT_MAX_LIMIT = int(os.getenv("UNINDEXED_SORT_MAX_LIMIT", 20))
+
+# Columns a client may request through `fields`
+PROJECTION_COLUMNS = [col.name for col in Transaction.__table__.columns]
+
+# Date columns a bulk export can be bounded by
+EXPORT_DATE_COLUMNS = ["BANKING_DATE", "SETTLEMENT_DATE"]
+
+# Serializes a page of transactions exactly as the response_model would
+TRANSACTION_LIST = TypeAdapter(list[TransactionBase])
+
 # User login model
 class UserLogin(BaseModel):
     username: str
@@ -53,6 +76,16 @@ class UserRegistration(BaseModel):
             raise ValueError("Password must contain at least one letter.")
         return value
 
+# Columns requested through `fields`, validated; None selects every column
+def parse_fields(fields: str):
+    if not fields:
+        return None
+    projection = list(dict.fromkeys(name.strip() for name in fields.split(",") if name.strip()))
+    unknown = [name for name in projection if name not in PROJECTION_COLUMNS]
+    if unknown or not projection:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown) or fields}")
+    return projection
+
 # Health check
 @router.get("/", tags=["Health Check"])
 async def health_check():
@@ -61,7 +94,7 @@ async def health_check():
 # Token generation endpoint
 @router.post("/login", tags=["Authentication"])
 async def login(user: UserLogin = Body(...)):
-    authenticated_user = authenticate_user(user.username, user.password)
+    authenticated_user = await authenticate_user(user.username, user.password)
     if not authenticated_user:
         raise HTTPException(status_code=401, detail="Invalid username or password.")
 
@@ -71,11 +104,12 @@ async def login(user: UserLogin = Body(...)):
 # User registration endpoint
 @router.post("/register", tags=["User Management"])
 async def register_user(user: UserRegistration = Body(...)):
-    users = load_users()
-    if user.email in users:
+    # The store's reads and its locked, fsynced write run on threads, off the event loop
+    if await asyncio.to_thread(user_store.get, user.email) is not None:
+        raise HTTPException(status_code=400, detail="User already exists.")
+    record = {"password": await hash_password(user.password)}
+    if not await asyncio.to_thread(user_store.add, user.email, record):  # registered concurrently while hashing
         raise HTTPException(status_code=400, detail="User already exists.")
-    users[user.email] = {"password": pwd_context.hash(user.password)}
-    save_users(users)
     return {"message": "User registered successfully!"}
 
 
@@ -88,16 +122,189 @@ async def get_transactions(
         filter_value: str = Query(None),
         sort_by: str = Query(None, enum=SORT_COLUMNS),
         sort_order: str = Query("asc", regex="^(asc|desc)$"),
-        credentials: HTTPAuthorizationCredentials = Security(bearer_scheme),
+        cursor: str = Query(None, description=f"Opaque token from the {NEXT_CURSOR_HEADER} header of the previous page"),
+        fields: str = Query(None, description="Comma-separated columns to return, e.g. DOC_IDT,AMOUNT,SETTLEMENT_DATE"),
+        where: list[str] = Query(None, description="Repeatable COLUMN:op:value predicates, ANDed; op is one of "
+                                                   "eq, in, gt, gte, lt, lte, between, prefix, e.g. "
+                                                   "AMOUNT:between:10,500 or MERCHANT:prefix:ACME"),
+        claims: dict = Depends(require_token),
 ):
     """
     Endpoint to fetch transactions with the ability to follow redirects by client-side tools (e.g., Postman, curl).
     Ensure that your client settings are configured to follow redirects (Postman will do this by default).
+
+    Full pages carry an X-Next-Cursor header; pass it back as `cursor` (with the same filter and sort) to read
+    the next page at constant cost. skip/limit remain available for small offsets.
+    `fields` returns only the listed columns, selected and serialized without building models.
+    `where` narrows the page with several predicates at once, e.g. where=DIRECTION:eq:DR&where=AMOUNT:gte:100.
     """
-    token = credentials.credentials
-    verify_token(token)  # Will raise an exception if invalid
+    try:
+        spec = QuerySpec.parse(where, Transaction.__table__, filter_by, filter_value)
+    except QuerySpecError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    # Index-aware allow-list for sorting: some index must serve the sort under one of the pinned columns
+    pinned = spec.equality_columns or [None]
+    if sort_by and not any(index_catalog.supports(column, sort_by) for column in pinned):
+        indexed_filter = any(index_catalog.is_indexed(predicate.column) for predicate in spec.predicates)
+        if UNINDEXED_SORT_POLICY == "reject" or not indexed_filter:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Sorting by {sort_by} is not index-backed for this query. "
+                       f"Sort by one of {', '.join(index_catalog.sortable_columns)}, or filter on an indexed column.",
+            )
+        limit = min(limit, UNINDEXED_SORT_MAX_LIMIT)
+
+    projection = parse_fields(fields)
+
+    after = None
+    if cursor:
+        if skip:
+            raise HTTPException(status_code=400, detail="skip cannot be combined with cursor.")
+        after = decode_cursor(cursor, sort_by, sort_order, filter_by, filter_value, where)
+
+    # Read-through cache keyed on the normalized query; ingestion bumps the generation to invalidate it
+    filtered = bool(filter_by and filter_value)
+    query = {
+        "skip": skip, "limit": limit, "filter_by": filter_by if filtered else None,
+        "filter_value": filter_value if filtered else None, "sort_by": sort_by, "sort_order": sort_order,
+        "cursor": cursor, "fields": ",".join(projection) if projection else None,
+        "where": spec.texts(),
+    }
+    cached = await response_cache.get("transactions", query)
+    if cached is not None:
+        body, headers = cached
+        return Response(content=body, media_type="application/json", headers=headers)
 
     transactions = await fetch_transactions(
-        skip=skip, limit=limit, filter_by=filter_by, filter_value=filter_value, sort_by=sort_by, sort_order=sort_order
+        skip=skip, limit=limit, sort_by=sort_by, sort_order=sort_order, after=after, fields=projection, where=spec
+    )
+    headers = {}
+    if len(transactions) == limit:
+        headers[NEXT_CURSOR_HEADER] = encode_cursor(
+            transactions[-1], sort_by, sort_order, filter_by, filter_value, where
+        )
+    if projection:
+        # Rows lead with the requested columns, so each tuple is sliced and zipped straight into JSON
+        width = len(projection)
+        body = dumps([dict(zip(projection, row[:width])) for row in transactions])
+    else:
+        body = TRANSACTION_LIST.dump_json([TransactionBase.from_orm(tx) for tx in transactions])
+    if transactions:  # fetch_transactions returns [] on database errors, which must not be cached
+        await response_cache.set("transactions", query, body, headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+# Ranked full-text search over MERCHANT, ACCOUNT_NAME, TRANS_DETAILS and TRANS_INFO
+@router.get("/transactions/search", tags=["Transactions"])
+async def get_transaction_search(
+        q: str = Query(..., description="Words or fragments of words, e.g. 'acme sto'; every term must match"),
+        skip: int = Query(0, ge=0),
+        limit: int = Query(20, ge=1, le=100),
+        fields: str = Query(None, description="Comma-separated columns to return, e.g. DOC_IDT,MERCHANT,AMOUNT"),
+        claims: dict = Depends(require_token),
+):
+    """
+    Transactions whose merchant, account name or details contain every term of `q`, best matches first.
+    Each result holds the requested columns (all by default) and its relevance `score`.
+    Results can be paged with skip/limit up to the first SEARCH_MAX_RESULTS matches.
+    """
+    try:
+        terms = search_terms(q)
+    except SearchQueryError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if skip + limit > SEARCH_MAX_RESULTS:
+        raise HTTPException(status_code=400, detail=f"Only the first {SEARCH_MAX_RESULTS} matches can be paged; "
+                                                    f"narrow the search instead.")
+    projection = parse_fields(fields)
+
+    query = {"q": " ".join(terms), "skip": skip, "limit": limit, "fields": ",".join(projection) if projection else None}
+    cached = await response_cache.get("search", query)
+    if cached is not None:
+        body, headers = cached
+        return Response(content=body, media_type="application/json", headers=headers)
+
+    results = await search_transactions(terms, skip, limit, projection)
+    names = projection or PROJECTION_COLUMNS
+    body = dumps([{**{name: row._mapping[name] for name in names}, "score": score} for score, row in results])
+    if results:
+        await response_cache.set("search", query, body)
+    return Response(content=body, media_type="application/json")
+
+
+# Encoders turning one streamed partition of row tuples into a chunk of the export body
+def _ndjson_chunk(columns: list, rows: list) -> bytes:
+    return b"".join(dumps(dict(zip(columns, row))) + b"\n" for row in rows)
+
+
+def _csv_chunk(columns: list, rows: list) -> bytes:
+    buffer = io.StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue().encode()
+
+
+async def _export_body(export_format: str, **filters):
+    columns = [col.name for col in Transaction.__table__.columns]
+    if export_format == "csv":
+        yield _csv_chunk(columns, [columns])
+    encode = _csv_chunk if export_format == "csv" else _ndjson_chunk
+    async for rows in stream_transactions(**filters):
+        yield encode(columns, rows)
+
+
+# Streaming bulk export of a date range (chunked transfer, bounded memory)
+@router.get("/transactions/export", tags=["Transactions"])
+async def export_transactions(
+        export_format: str = Query("ndjson", alias="format", regex="^(ndjson|csv)$"),
+        date_field: str = Query("BANKING_DATE", enum=EXPORT_DATE_COLUMNS),
+        date_from: date = Query(None),
+        date_to: date = Query(None),
+        filter_by: str = Query(None, enum=FILTER_COLUMNS),
+        filter_value: str = Query(None),
+        claims: dict = Depends(require_token),
+):
+    """
+    Stream every transaction matching the filter and the inclusive date_field range as NDJSON or CSV.
+    Rows are read through a server-side cursor and written as they arrive, so exports of any size use flat memory.
+    """
+    if date_from and date_to and date_from > date_to:
+        raise HTTPException(status_code=400, detail="date_from must not be after date_to.")
+
+    media_type = "text/csv" if export_format == "csv" else "application/x-ndjson"
+    filename = f"transactions_{date_from or 'start'}_{date_to or 'end'}.{export_format}"
+    body = _export_body(
+        export_format, filter_by=filter_by, filter_value=filter_value, date_field=date_field,
+        date_from=date_from, date_to=date_to,
+    )
+    return StreamingResponse(body, media_type=media_type,
+                             headers={"Content-Disposition": f'attachment; filename="{filename}"'})
+
+
+# Settlement totals from the incrementally maintained rollups
+@router.get("/settlements/summary", tags=["Settlements"])
+async def settlement_summary(
+        date_from: date = Query(None),
+        date_to: date = Query(None),
+        settl_currency: int = Query(None, ge=0),
+        card_brand_name: str = Query(None),
+        direction: str = Query(None),
+        group_by: str = Query(None, description=f"Comma-separated subset of {', '.join(ROLLUP_DIMENSIONS)}"),
+        claims: dict = Depends(require_token),
+):
+    """
+    Transaction counts and SETTL_AMOUNT sums by SETTLEMENT_DATE, SETTL_CURRENCY, CARD_BRAND_NAME and DIRECTION.
+    Answered from the rollup table, so cost depends on the number of groups rather than on transactions.
+    """
+
+    dimensions = None
+    if group_by:
+        dimensions = list(dict.fromkeys(name.strip() for name in group_by.split(",") if name.strip()))
+        unknown = [name for name in dimensions if name not in ROLLUP_DIMENSIONS]
+        if unknown or not dimensions:
+            raise HTTPException(status_code=400, detail=f"Cannot group by: {', '.join(unknown) or group_by}")
+
+    rows = await fetch_settlement_summary(
+        date_from=date_from, date_to=date_to, group_by=dimensions,
+        filters={"SETTL_CURRENCY": settl_currency, "CARD_BRAND_NAME": card_brand_name, "DIRECTION": direction},
     )
-    return [TransactionBase.from_orm(tx) for tx in transactions]
+    return Response(content=dumps(rows), media_type="application/json")
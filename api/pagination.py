@@ -0,0 +1,61 @@
+#api/pagination.py
+import base64
+import binascii
+import datetime
+import decimal
+import json
+
+from fastapi import HTTPException
+
+from utils.db_operations import Transaction
+
+# Response header carrying the cursor for the next page
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+def _encode_value(value):
+    if isinstance(value, (datetime.date, decimal.Decimal)):
+        return str(value)
+    return value
+
+
+def _decode_value(column_name: str, value):
+    if value is None:
+        return None
+    python_type = Transaction.__table__.c[column_name].type.python_type
+    if python_type is datetime.date:
+        return datetime.date.fromisoformat(value)
+    return python_type(value)
+
+
+# Opaque cursor: the query it belongs to plus the sort value and DOC_IDT of the last row served
+def encode_cursor(transaction, sort_by: str, sort_order: str, filter_by: str, filter_value: str,
+                  where: list = None) -> str:
+    payload = {
+        "s": sort_by,
+        "o": sort_order,
+        "f": [filter_by, filter_value],
+        "v": _encode_value(getattr(transaction, sort_by)) if sort_by else None,
+        "k": transaction.DOC_IDT,
+    }
+    if where:
+        payload["w"] = where
+    raw = json.dumps(payload, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str, sort_by: str, sort_order: str, filter_by: str, filter_value: str,
+                  where: list = None) -> tuple:
+    """Return (last sort value, last DOC_IDT) for fetch_transactions' `after`, or raise a 400."""
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        payload = json.loads(raw)
+        query = (payload["s"], payload["o"], payload["f"], payload.get("w") or [])
+        value = _decode_value(sort_by, payload["v"]) if sort_by else None
+        doc_idt = payload["k"]
+    except (binascii.Error, ValueError, KeyError, TypeError, decimal.InvalidOperation):
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    if query != (sort_by, sort_order, [filter_by, filter_value], where or []):
+        raise HTTPException(status_code=400, detail="Cursor does not match the requested filter and sort.")
+    return value, doc_idt
@@ -2,13 +2,11 @@
 from pydantic import BaseModel, condecimal, conint
 from datetime import date
 from typing import Optional
-from dotenv import load_dotenv
 
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
+from utils.env import load_env
 
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 # Transaction model
 class TransactionBase(BaseModel):
@@ -1,33 +1,87 @@
 #api/shared.py
 import json
 import os
-from dotenv import load_dotenv
+import threading
 
+from utils.env import load_env
+from utils.file_lock import FileLock
 
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
-
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 # Users file path
 USERS_FILE = os.getenv("USERS_FILE", "data/users.json")
 
 
-def initialize_users_file():
-    if not os.path.exists(USERS_FILE):
-        with open(USERS_FILE, "w") as file:
-            json.dump({}, file)
+# users.json kept in memory, re-read only when its mtime changes, and written atomically under a lock
+class UserStore:
+    def __init__(self, path: str = USERS_FILE):
+        self.path = path
+        self._users = {}
+        self._mtime = None
+        self._lock = threading.Lock()
+
+    def _refresh(self):
+        try:
+            mtime = os.stat(self.path).st_mtime_ns
+        except FileNotFoundError:
+            self._users, self._mtime = {}, None
+            return
+        if mtime != self._mtime:
+            with open(self.path, "r") as file:
+                self._users = json.load(file)
+            self._mtime = mtime
+
+    def get(self, username: str):
+        """The stored record for username, or None."""
+        with self._lock:
+            self._refresh()
+            return self._users.get(username)
+
+    def all(self) -> dict:
+        with self._lock:
+            self._refresh()
+            return dict(self._users)
+
+    def add(self, username: str, record: dict) -> bool:
+        """Store a new user; returns False without writing if the username is already taken."""
+        with self._lock, self._file_lock():
+            self._refresh()
+            if username in self._users:
+                return False
+            self._write({**self._users, username: record})
+            return True
 
+    def replace(self, users: dict):
+        with self._lock, self._file_lock():
+            self._write(dict(users))
 
-initialize_users_file()
+    def _write(self, users: dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w") as file:
+            json.dump(users, file)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+        self._users = users
+        self._mtime = os.stat(self.path).st_mtime_ns
+
+    def _file_lock(self):
+        return FileLock(f"{self.path}.lock")
+
+
+user_store = UserStore()
+
+
+def initialize_users_file():
+    if not os.path.exists(USERS_FILE):
+        user_store.replace({})
 
 
 def load_users():
-    with open(USERS_FILE, "r") as file:
-        return json.load(file)
+    return user_store.all()
 
 
 def save_users(users):
-    with open(USERS_FILE, "w") as file:
-        json.dump(users, file)
+    user_store.replace(users)
@@ -0,0 +1,73 @@
+#benchmarks/bench_verify_token.py
+"""Per-request auth overhead: full jwt.decode on every call versus the verified-token cache.
+
+Usage: python -m benchmarks.bench_verify_token --requests 50000 --tokens 10
+"""
+import argparse
+import asyncio
+import os
+import time
+
+# api.authorization refuses to import without a key; any value works for timing
+os.environ.setdefault("SECRET_KEY", "benchmark-secret-key-benchmark-secret-key")
+
+from fastapi.security import HTTPAuthorizationCredentials  # noqa: E402
+
+from api.authorization import (  # noqa: E402
+    VerifiedTokenCache, create_access_token, require_token, token_cache, verify_token, verify_token_cached
+)
+
+
+def per_call_us(func, tokens: list, requests: int) -> float:
+    started = time.perf_counter()
+    for i in range(requests):
+        func(tokens[i % len(tokens)])
+    return (time.perf_counter() - started) / requests * 1e6
+
+
+# The dependency as FastAPI awaits it, to include the coroutine overhead in the cached figure
+def dependency_us(tokens: list, requests: int) -> float:
+    credentials = [HTTPAuthorizationCredentials(scheme="Bearer", credentials=token) for token in tokens]
+
+    async def run():
+        started = time.perf_counter()
+        for i in range(requests):
+            await require_token(credentials[i % len(credentials)])
+        return (time.perf_counter() - started) / requests * 1e6
+
+    return asyncio.run(run())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=50_000)
+    parser.add_argument("--tokens", type=int, default=10, help="Distinct tokens cycled through (batch clients)")
+    args = parser.parse_args()
+
+    tokens = [create_access_token({"sub": f"client-{i}@example.com"}) for i in range(args.tokens)]
+    uncached = per_call_us(verify_token, tokens, args.requests)
+
+    token_cache.clear()  # start cold so the miss on each token's first use is counted
+    cached = per_call_us(verify_token_cached, tokens, args.requests)
+    stats = token_cache.stats()
+    through_dependency = dependency_us(tokens, args.requests)
+
+    # Every call a miss: the cost the cache adds when tokens are never reused
+    cold = VerifiedTokenCache(max_size=0)
+    started = time.perf_counter()
+    for i in range(args.requests):
+        token = tokens[i % len(tokens)]
+        if cold.get(token) is None:
+            cold.put(token, verify_token(token))
+    all_miss = (time.perf_counter() - started) / args.requests * 1e6
+
+    print(f"requests={args.requests} tokens={args.tokens}")
+    print(f"verify_token (jwt.decode)  : {uncached:8.2f} us/request")
+    print(f"verify_token_cached        : {cached:8.2f} us/request  ({uncached / cached:,.1f}x faster, "
+          f"hit rate {stats['hit_rate']:.2%})")
+    print(f"require_token dependency   : {through_dependency:8.2f} us/request")
+    print(f"cache, every lookup missing: {all_miss:8.2f} us/request")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,52 @@
+#benchmarks/compare.py
+"""Compare two benchmark result files and flag the metrics that got worse.
+
+Usage: python -m benchmarks.compare benchmarks/results/base.json benchmarks/results/new.json --threshold 0.1
+"""
+import argparse
+import json
+
+# Metrics where a larger value is worse; every other numeric field is informational
+LOWER_IS_BETTER = ("seconds", "p50_ms", "p99_ms", "max_ms")
+HIGHER_IS_BETTER = ("rows_per_s",)
+
+
+def compare(base: dict, new: dict, threshold: float) -> list:
+    """(benchmark, metric, base, new, relative change, regressed) for every metric present in both runs."""
+    rows = []
+    for name, new_result in new["results"].items():
+        base_result = base["results"].get(name, {})
+        for metric in LOWER_IS_BETTER + HIGHER_IS_BETTER:
+            if metric not in new_result or metric not in base_result or not base_result[metric]:
+                continue
+            change = (new_result[metric] - base_result[metric]) / base_result[metric]
+            worse = change > threshold if metric in LOWER_IS_BETTER else change < -threshold
+            rows.append((name, metric, base_result[metric], new_result[metric], change, worse))
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("base")
+    parser.add_argument("new")
+    parser.add_argument("--threshold", type=float, default=0.1, help="Relative change counted as a regression")
+    args = parser.parse_args()
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    if base["params"] != new["params"] or base["database"] != new["database"]:
+        print(f"Warning: runs differ in parameters or database ({base['params']} on {base['database']} vs "
+              f"{new['params']} on {new['database']}).")
+
+    print(f"{base['commit'][:8]} -> {new['commit'][:8]}")
+    rows = compare(base, new, args.threshold)
+    for name, metric, old_value, new_value, change, worse in rows:
+        flag = "  REGRESSION" if worse else ""
+        print(f"{name:32} {metric:11} {old_value:14,.3f} -> {new_value:14,.3f} ({change:+.1%}){flag}")
+    raise SystemExit(1 if any(row[-1] for row in rows) else 0)
+
+
+if __name__ == "__main__":
+    main()
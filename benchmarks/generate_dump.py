@@ -0,0 +1,120 @@
+#benchmarks/generate_dump.py
+"""Write a synthetic pipe-delimited MOMORW_TRANSACTION_DUMP file with the TransactionBase columns.
+
+Usage: python -m benchmarks.generate_dump data/MOMORW_TRANSACTION_DUMP_20241031.csv --rows 100000 --duplicate-ratio 0.1
+"""
+import argparse
+import datetime
+
+import numpy as np
+import pandas as pd
+
+from utils.validation import FIELD_RULES
+
+# Columns in dump order (the order TransactionBase declares them in)
+DUMP_COLUMNS = list(FIELD_RULES)
+
+# Low-cardinality columns get realistic value sets so filters, rollups and indexes behave as on real dumps
+CHOICES = {
+    "DIRECTION": ["DR", "CR"],
+    "CARD_BRAND_NAME": ["VISA", "MASTERCARD", "MOMO", "UNIONPAY"],
+    "PAYMENT_SCHEME": ["VISA", "MASTERCARD", "LOCAL"],
+    "POSTING_STATUS": ["POSTED", "PENDING", "REVERSED"],
+    "SOURCE_ON_US_FLAG": ["Y", "N"],
+    "TARGET_ON_US_FLAG": ["Y", "N"],
+    "CORRECTION_TYPE": ["", "", "", "REVERSAL", "ADJUSTMENT"],
+    "TRANSACTION_TYPE_NAME": ["PURCHASE", "CASH WITHDRAWAL", "REFUND", "TRANSFER", "BALANCE INQUIRY"],
+    "SERVICE_CLASS_NAME": ["DEBIT", "CREDIT", "PREPAID"],
+}
+CURRENCIES = [646, 840, 978, 404, 800]
+MCC_CODES = [5411, 5812, 5999, 6011, 4121, 4814, 5541, 5311]
+
+# Distinct values for the remaining text columns: merchants, accounts and branches repeat, references do not
+CARDINALITY = {"MERCHANT": 500, "ACCOUNT_NUMBER": 5000, "ACCOUNT_NAME": 5000, "CONTRACT_NUMBER": 5000,
+               "PARENT_CONTRACT_NUMBER": 1000, "PAN": 20000, "TRANS_CITY": 40, "TRANS_COUNTRY_CODE": 5,
+               "GL_NUMBER": 50}
+UNIQUE_COLUMNS = {"TRANS_RRN", "TRANS_ARN", "TRANS_SRN", "AUTH_CODE", "RBS_NUMBER"}
+
+
+def _format_dates(dates: pd.Series) -> pd.Series:
+    # Dumps write dates as 31-OCT-24; there are few distinct dates, so format each once
+    codes, uniques = pd.factorize(dates)
+    labels = np.array([day.strftime("%d-%b-%y").upper() for day in uniques], dtype=object)
+    return pd.Series(labels[codes], index=dates.index)
+
+
+def build_frame(rows: int, duplicate_ratio: float = 0.0, start_id: int = 10 ** 9,
+                banking_date: datetime.date = datetime.date(2024, 10, 31), seed: int = 0) -> pd.DataFrame:
+    """Rows of dump text; duplicate_ratio of them repeat the DOC_IDT of an earlier row with new values."""
+    rng = np.random.default_rng(seed)
+    sequence = np.arange(rows)
+    doc_ids = start_id + sequence
+    repeats = rng.random(rows) < duplicate_ratio
+    repeats[0] = False
+    doc_ids[repeats] = start_id + (rng.random(repeats.sum()) * sequence[repeats]).astype(np.int64)
+
+    banking = pd.Timestamp(banking_date)
+    frame = {}
+    for name, rule in FIELD_RULES.items():
+        if name == "DOC_IDT":
+            frame[name] = doc_ids.astype(str)
+        elif name in ("PREVIOUS_DOC_IDT", "CORRECTED_DOC_IDT"):
+            linked = rng.random(rows) < 0.02
+            frame[name] = np.where(linked, (start_id + rng.integers(0, rows, rows)).astype(str), "")
+        elif name in CHOICES:
+            frame[name] = rng.choice(CHOICES[name], rows)
+        elif name in UNIQUE_COLUMNS:
+            frame[name] = (name[:3] + pd.Series(doc_ids).astype(str)).to_numpy()
+        elif rule["kind"] == "str":
+            values = rng.integers(0, CARDINALITY.get(name, 100), rows)
+            frame[name] = (f"{name[:3]}" + pd.Series(values).astype(str)).to_numpy()
+        elif rule["kind"] == "int":
+            if "CURR" in name:
+                frame[name] = rng.choice(CURRENCIES, rows)
+            elif name == "TRANS_MCC":
+                frame[name] = rng.choice(MCC_CODES, rows)
+            else:
+                frame[name] = rng.integers(0, 1000, rows)
+        elif rule["kind"] == "decimal":
+            places = rule["decimal_places"] or 2
+            scale = 10.0 if places > 2 else 5000.0
+            frame[name] = np.round(rng.random(rows) * scale, places)
+        elif rule["kind"] == "date":
+            if name == "BANKING_DATE":
+                dates = pd.Series(banking, index=range(rows))
+            elif name == "ACCOUNT_DATE_OPEN":
+                dates = banking - pd.to_timedelta(rng.integers(30, 3650, rows), unit="D")
+            elif name == "ACCOUNT_DATE_CLOSE":
+                dates = banking + pd.to_timedelta(rng.integers(365, 3650, rows), unit="D")
+            else:
+                dates = banking + pd.to_timedelta(rng.integers(-3, 3, rows), unit="D")
+            formatted = _format_dates(pd.Series(dates))
+            if name == "ACCOUNT_DATE_CLOSE":
+                # Open accounts have no close date; parse_csv fills those in with its default date
+                formatted = formatted.where(rng.random(rows) < 0.1, "")
+            frame[name] = formatted.to_numpy()
+    return pd.DataFrame(frame, columns=DUMP_COLUMNS)
+
+
+def write_dump(path: str, rows: int, duplicate_ratio: float = 0.0, start_id: int = 10 ** 9,
+               banking_date: datetime.date = datetime.date(2024, 10, 31), seed: int = 0) -> str:
+    build_frame(rows, duplicate_ratio, start_id, banking_date, seed).to_csv(path, sep="|", index=False)
+    return path
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("path")
+    parser.add_argument("--rows", type=int, default=100_000)
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="Share of rows repeating a DOC_IDT")
+    parser.add_argument("--start-id", type=int, default=10 ** 9, help="First DOC_IDT; overlap dumps by sharing ids")
+    parser.add_argument("--banking-date", type=datetime.date.fromisoformat, default=datetime.date(2024, 10, 31))
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    write_dump(args.path, args.rows, args.duplicate_ratio, args.start_id, args.banking_date, args.seed)
+    print(f"Wrote {args.rows} rows to {args.path}")
+
+
+if __name__ == "__main__":
+    main()
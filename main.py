@@ -1,63 +1,116 @@
 #main.py
+from utils.startup import startup_report
+
+# Time every first-party import below for the startup report
+startup_report.track_imports()
+
 import asyncio
 import os
 import logging
-from concurrent.futures import ThreadPoolExecutor
+import time
 from contextlib import asynccontextmanager
 
 import uvicorn
-from fastapi import FastAPI, HTTPException, Depends
-from fastapi.security import OAuth2PasswordRequestForm
+from fastapi import FastAPI, Request, Response
 from sqlalchemy import select
-from dotenv import load_dotenv
 
-from api.authorization import create_access_token, authenticate_user
+from utils.env import load_env
+from api.authorization import token_cache
 from api.endpoints import router as api_router
-from utils.db_operations import process_and_load_data, get_session, Transaction
-from utils.fetch_files import fetch_files
+from api.shared import initialize_users_file
+from utils.cache import cache_client, response_cache
+from utils.archive import ARCHIVE_ENABLED
+from utils.db_operations import (
+    get_read_session, init_schema, Transaction, index_advisor, ingest_manifest, archive_job, session_router
+)
+from utils.loop_monitor import loop_monitor
+from utils.metrics import HTTP_REQUEST_SECONDS, register_stats, render_metrics
+from utils.offload import run_blocking, shutdown as shutdown_offload
+from utils.query_spec import statement_cache
 
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
-
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 # Configure logger
 logger = logging.getLogger("uvicorn")
 logging.basicConfig(level=logging.INFO)
 
-# Configure task executor
-executor = ThreadPoolExecutor()
+# Loads new dumps, and the new tails of appended ones, recorded in the shared ingest manifest; created by the
+# first periodic run, together with the rest of the ingestion stack
+ingest_scheduler = None
+task = None
+
+
+# The ingestion stack pulls in pandas and pyarrow, so it is imported off the loop once the app is serving
+def import_ingestion():
+    from utils.doc_index import doc_index
+    from utils.fetch_files import fetch_files
+    from utils.ingest import load_chunks
+    from utils.ingest_scheduler import IngestScheduler
+    return doc_index, fetch_files, load_chunks, IngestScheduler
+
 
 # Set up Lifespan
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     global task
     try:
+        with startup_report.phase("users_file"):
+            await asyncio.to_thread(initialize_users_file)
+        with startup_report.phase("init_schema"):
+            try:
+                await init_schema()
+            except Exception as e:
+                # The periodic task retries; until then requests fail on the database, not at boot
+                logger.error(f"Schema initialisation failed: {e}")
+        loop_monitor.start()
+        session_router.start()
         logger.info("Initializing background task.")
         task = asyncio.create_task(periodic_task())
+        startup_report.finish()
         yield
     except Exception as e:
         logger.error(f"Lifespan error: {e}")
     finally:
-        task.cancel()
-        try:
-            await task
-        except asyncio.CancelledError:
-            logger.info("Periodic task cancelled.")
+        if task is not None:
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                logger.info("Periodic task cancelled.")
+        if ingest_scheduler is not None:
+            ingest_scheduler.close()
+        shutdown_offload()
+        await loop_monitor.stop()
+        await cache_client.close()
+        await session_router.dispose()
 
 # Function to run background recurring tasks before startup
 async def periodic_task():
+    global ingest_scheduler
     while True:
         try:
+            await init_schema()
+            doc_index, fetch_files, load_chunks, IngestScheduler = await run_blocking(import_ingestion)
+            if ingest_scheduler is None:
+                ingest_scheduler = IngestScheduler(ingest_manifest)
+
             logger.info("Fetching and processing new files.")
             await fetch_files()
 
-            file_path = r"data/MOMORW_TRANSACTION_DUMP_20241031.csv"
-            logger.info(f"Processing file: {file_path}")
-            await process_and_load_data(file_path)
+            # New rows from every dump in the ingest directory, staged in parallel and streamed in dump-date order
+            await ingest_scheduler.run(load_chunks)
+            await run_blocking(doc_index.compact)
+
+            # Keep the hot table to the open months; reads cover the archive transparently
+            if ARCHIVE_ENABLED:
+                await archive_job.run()
 
             logger.info("Periodic task completed successfully.")
+
+            # Surface the slow, unindexed filter/sort shapes seen since startup
+            index_advisor.log_report()
+            loop_monitor.log_report()
         except Exception as e:
             logger.error(f"Error during periodic task: {e}")
         await asyncio.sleep(3600)
@@ -68,10 +121,39 @@ app = FastAPI(lifespan=lifespan)
 # Included endpoints
 app.include_router(api_router, prefix="/api")
 
+# Cache and event-loop figures, read at scrape time
+register_stats("response_cache", response_cache.stats, "API response cache")
+register_stats("token_cache", token_cache.stats, "Verified-token cache")
+register_stats("event_loop_lag", loop_monitor.stats, "Event loop lag probe")
+register_stats("db_read_routing", session_router.stats, "Read replica routing")
+register_stats("statement_cache", statement_cache.stats, "Transaction page statements reused by query shape")
+register_stats("startup", startup_report.stats, "Import and init cost at startup")
+
+# Request latency per route template (not per raw path, which would explode label cardinality)
+@app.middleware("http")
+async def record_latency(request: Request, call_next):
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        route = request.scope.get("route")
+        HTTP_REQUEST_SECONDS.labels(
+            request.method, route.path if route is not None else "unmatched", str(status)
+        ).observe(time.perf_counter() - started)
+
+# Prometheus scrape endpoint
+@app.get("/metrics", tags=["Monitoring"], include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
 # Root
 @app.get("/", tags=["Root"])
 async def root():
-    async with get_session() as session:
+    async with get_read_session() as session:
         transactions = await session.execute(select(Transaction).limit(10))
         transactions = transactions.scalars().all()
     return {
@@ -0,0 +1,16 @@
+#tests/conftest.py
+import os
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+# The app modules read their configuration at import, so everything is set before the first one is loaded
+SCRATCH = tempfile.mkdtemp(prefix="momo_tests_")
+os.environ["DOTENV_PATH"] = os.path.join(SCRATCH, "missing.env")  # never the developer's myenv/.env
+os.environ.setdefault("DATABASE_URL", f"sqlite+aiosqlite:///{SCRATCH}/test.db")
+os.environ.setdefault("DOC_INDEX_PATH", os.path.join(SCRATCH, "doc_idt_index"))
+os.environ.setdefault("USERS_FILE", os.path.join(SCRATCH, "users.json"))
+os.environ.setdefault("CACHE_BACKEND", "memory")
+os.environ.setdefault("SECRET_KEY", "test-secret-key-test-secret-key-test")
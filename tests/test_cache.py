@@ -0,0 +1,122 @@
+#tests/test_cache.py
+import asyncio
+
+import pytest
+import redis
+
+from utils import cache
+from utils.cache import AsyncRedisCache, LocalCache, ResponseCache
+
+
+# The slice of redis.asyncio.Redis the cache uses, over a dict; while down, every command fails to connect
+class FakeRedis:
+    def __init__(self):
+        self.data = {}
+        self.down = False
+
+    def _check(self):
+        if self.down:
+            raise redis.ConnectionError("Connection refused")
+
+    async def get(self, key):
+        self._check()
+        return self.data.get(key)
+
+    async def set(self, key, value, ex=None, nx=False):
+        self._check()
+        if nx and key in self.data:
+            return None
+        self.data[key] = value if isinstance(value, bytes) else str(value).encode()
+        return True
+
+    async def incrby(self, key, amount):
+        self._check()
+        value = int(self.data.get(key, b"0")) + amount
+        self.data[key] = str(value).encode()
+        return value
+
+    async def incr(self, key):
+        return await self.incrby(key, 1)
+
+    async def mget(self, keys):
+        self._check()
+        return [self.data.get(key) for key in keys]
+
+    async def aclose(self):
+        pass
+
+
+def _worker(server: FakeRedis) -> ResponseCache:
+    backend = AsyncRedisCache(fallback=LocalCache())
+    backend._client = server
+    return ResponseCache(backend)
+
+
+@pytest.fixture(autouse=True)
+def fresh_generation_reads(monkeypatch):
+    # Every lookup reads the generation from the backend rather than a worker's copy of it
+    monkeypatch.setattr(cache, "CACHE_GENERATION_TTL", -1.0)
+
+
+def test_bump_invalidates_cached_pages():
+    async def scenario():
+        worker = _worker(FakeRedis())
+        await worker.set("transactions", {"skip": 0}, b"page")
+        assert await worker.get("transactions", {"skip": 0}) == (b"page", {})
+
+        await worker.bump_generation()
+        assert await worker.get("transactions", {"skip": 0}) is None
+
+    asyncio.run(scenario())
+
+
+def test_bump_is_seen_by_other_workers():
+    async def scenario():
+        server = FakeRedis()
+        first, second = _worker(server), _worker(server)
+        await second.set("transactions", {"skip": 0}, b"page")
+
+        await first.bump_generation()
+        assert await second.get("transactions", {"skip": 0}) is None
+
+    asyncio.run(scenario())
+
+
+def test_missing_generation_never_restarts_from_zero():
+    async def scenario():
+        server = FakeRedis()
+        worker = _worker(server)
+        await worker.bump_generation()
+        await worker.bump_generation()
+        before = await worker.generation()
+
+        del server.data[ResponseCache.GENERATION_KEY]  # evicted
+        assert await worker.generation() > before
+        del server.data[ResponseCache.GENERATION_KEY]
+        assert await worker.bump_generation() > before
+
+    asyncio.run(scenario())
+
+
+def test_bump_during_outage_reaches_redis_when_it_is_back(monkeypatch):
+    monkeypatch.setattr(cache, "REDIS_RETRY_SECONDS", 0.05)
+
+    async def scenario():
+        server = FakeRedis()
+        ingesting, serving = _worker(server), _worker(server)
+        await serving.set("transactions", {"skip": 0}, b"before the ingest")
+        before = await serving.generation()
+
+        server.down = True
+        assert await ingesting.bump_generation() > 0  # recorded on the fallback only
+        # Nothing is served from a worker's own memory meanwhile
+        await ingesting.set("transactions", {"skip": 0}, b"during the outage")
+        assert await ingesting.get("transactions", {"skip": 0}) is None
+
+        server.down = False
+        await asyncio.sleep(0.2)  # the retry window passes; the ingesting worker is sent no request
+        assert int(server.data[ResponseCache.GENERATION_KEY]) == before + 1
+        assert await serving.get("transactions", {"skip": 0}) is None
+
+    asyncio.run(scenario())
+
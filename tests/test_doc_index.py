@@ -0,0 +1,29 @@
+#tests/test_doc_index.py
+import asyncio
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from utils.doc_index import DocIdIndex, normalize_doc_ids
+
+
+def test_keys_committed_before_the_first_rebuild_are_kept(tmp_path):
+    async def scenario():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path}/index.db")
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE transactions (DOC_IDT VARCHAR(50))"))
+            await conn.execute(text("INSERT INTO transactions VALUES ('1')"))
+
+        index = DocIdIndex(str(tmp_path / "doc_idt_index"), capacity=1000, tables=("transactions",))
+        # No bits file and no filter yet: a batch committed now is only known through the journal
+        index.add(["2"])
+        await index.rebuild(engine)
+        await engine.dispose()
+        return index
+
+    index = asyncio.run(scenario())
+    assert index._bloom.might_contain(normalize_doc_ids(["1", "2"])).all()
+
+    # The compacted file a later process loads holds the key too
+    reloaded = DocIdIndex(index.path, capacity=1000)
+    assert reloaded._read().might_contain(normalize_doc_ids(["2"])).all()
@@ -0,0 +1,43 @@
+#tests/test_parse_transform.py
+import pandas as pd
+import pytest
+
+from benchmarks.generate_dump import write_dump
+from utils.parse_transform import iter_csv_chunks, parse_csv
+
+
+# A dump whose row blank_row has no DOC_IDT: read per chunk, only that row's chunk would see a float key column
+@pytest.fixture
+def dump_path(tmp_path):
+    path = write_dump(str(tmp_path / "MOMORW_TRANSACTION_DUMP_20241031.csv"), 3000, seed=1)
+    lines = open(path).read().splitlines()
+    column = lines[0].split("|").index("DOC_IDT")
+    blank_row = lines[1500].split("|")
+    blank_row[column] = ""
+    lines[1500] = "|".join(blank_row)
+    with open(path, "w") as f:
+        f.write("\n".join(lines) + "\n")
+    return path
+
+
+def test_chunked_keys_match_whole_file(dump_path):
+    whole = parse_csv(dump_path)
+    chunked = pd.concat(list(iter_csv_chunks(dump_path, chunk_size=1000)))
+
+    assert len(whole) == len(chunked) == 3000
+    assert whole["DOC_IDT"].tolist() == chunked["DOC_IDT"].tolist()
+    assert whole["DOC_IDT"].iloc[0] == "1000000000"
+    assert not whole["DOC_IDT"].str.endswith(".0").any()
+
+
+def test_tail_load_keys_match_whole_file(dump_path):
+    with open(dump_path, "rb") as f:
+        lines = f.readlines()
+    # The first 2000 data rows committed; the tail starts right after them
+    start_offset = sum(len(line) for line in lines[:2001])
+
+    whole = parse_csv(dump_path)
+    tail = pd.concat(list(iter_csv_chunks(dump_path, chunk_size=400, start_offset=start_offset)))
+
+    assert tail["DOC_IDT"].tolist() == whole["DOC_IDT"].iloc[2000:].tolist()
+
@@ -0,0 +1,79 @@
+#tests/test_session_router.py
+import asyncio
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from utils import cache
+from utils.cache import LocalCache, ResponseCache
+from utils.session_router import SessionRouter
+
+
+# A primary and a replica that has not caught up yet: the row written to the primary is not on the replica
+async def _databases(tmp_path) -> tuple:
+    urls = (f"sqlite+aiosqlite:///{tmp_path}/primary.db", f"sqlite+aiosqlite:///{tmp_path}/replica.db")
+    for url in urls:
+        engine = create_async_engine(url)
+        async with engine.begin() as conn:
+            await conn.execute(text("CREATE TABLE transactions (DOC_IDT VARCHAR(50))"))
+        await engine.dispose()
+    return urls
+
+
+async def _read(router: SessionRouter) -> list:
+    async with router.read_session() as session:
+        return [row[0] for row in await session.execute(text("SELECT DOC_IDT FROM transactions"))]
+
+
+@pytest.fixture(autouse=True)
+def fresh_generation_reads(monkeypatch):
+    # The API worker reads the generation from the shared backend on every routing decision
+    monkeypatch.setattr(cache, "CACHE_GENERATION_TTL", -1.0)
+
+
+def test_reads_follow_an_ingest_to_the_primary_until_the_pin_expires(tmp_path):
+    async def scenario():
+        primary_url, replica_url = await _databases(tmp_path)
+        shared = LocalCache()  # the cache every worker sees, standing in for Redis
+        ingesting, serving = ResponseCache(shared), ResponseCache(shared)
+        router = SessionRouter(primary_url, [replica_url], pin_seconds=0.3)
+        router.generation_source = serving.generation
+        try:
+            assert await _read(router) == []  # replica; the first generation read pins nothing
+
+            async with router.write_sessions() as session:
+                await session.execute(text("INSERT INTO transactions VALUES ('1')"))
+                await session.commit()
+            await ingesting.bump_generation()
+
+            assert await _read(router) == ["1"]  # the bump pins reads to the primary
+            assert await _read(router) == ["1"]
+            assert router.stats()["pinned"] == 1
+
+            await asyncio.sleep(0.4)
+            assert await _read(router) == []  # back on the lagging replica
+            assert router.stats()["primary_reads"] == 2
+        finally:
+            await router.dispose()
+
+    asyncio.run(scenario())
+
+
+def test_no_pin_when_read_your_writes_is_off(tmp_path):
+    async def scenario():
+        primary_url, replica_url = await _databases(tmp_path)
+        shared = LocalCache()
+        ingesting, serving = ResponseCache(shared), ResponseCache(shared)
+        router = SessionRouter(primary_url, [replica_url], pin_seconds=0)
+        router.generation_source = serving.generation
+        try:
+            await _read(router)
+            await ingesting.bump_generation()
+            await _read(router)
+            assert router.stats()["primary_reads"] == 0
+            assert router.stats()["replica1_reads"] == 2
+        finally:
+            await router.dispose()
+
+    asyncio.run(scenario())
@@ -0,0 +1,39 @@
+#tests/test_validation.py
+import decimal
+
+import numpy as np
+import pandas as pd
+
+from utils.validation import frame_to_records, validate_frame
+
+
+def _frame(amounts, fx_rates=None):
+    rows = len(amounts)
+    return pd.DataFrame({
+        "INSTITUTION_BRANCH_CODE": [1] * rows,
+        "BANKING_DATE": ["2024-10-31"] * rows,
+        "DOC_IDT": [str(i) for i in range(rows)],
+        "AMOUNT": amounts,
+        "SETTLEMENT_FX_RATE": fx_rates if fx_rates is not None else [""] * rows,
+    })
+
+
+def test_decimals_bind_exactly_past_float_precision():
+    valid, rejected = validate_frame(_frame(["1234567890123456.78", "9007199254740993.01"]))
+
+    records = frame_to_records(valid)
+    assert rejected.empty
+    assert [record["AMOUNT"] for record in records] == [decimal.Decimal("1234567890123456.78"),
+                                                        decimal.Decimal("9007199254740993.01")]
+
+
+def test_decimal_scale_and_digits_follow_pydantic():
+    amounts = ["1.505", "1.500", "12345678901234567", "abc", "", 1.1, "1e2"]
+    valid, rejected = validate_frame(_frame(amounts, ["1.1234567", "1", "", "", "", np.nan, ""]))
+
+    assert sorted(rejected["DOC_IDT"]) == ["0", "2", "3"]
+    records = {record["DOC_IDT"]: record for record in frame_to_records(valid)}
+    assert records["1"]["AMOUNT"] == decimal.Decimal("1.500")
+    assert records["4"]["AMOUNT"] is None
+    assert records["5"]["AMOUNT"] == decimal.Decimal("1.1")
+    assert records["6"]["AMOUNT"] == decimal.Decimal("100")
@@ -0,0 +1,278 @@
+#utils/archive.py
+"""Hot/cold storage for transactions: closed BANKING_DATE months move to a partitioned, compressed archive table.
+
+Usage: python -m utils.archive run [--cutoff YYYY-MM-DD]
+       python -m utils.archive status
+"""
+import argparse
+import asyncio
+import datetime
+import logging
+import os
+import time
+
+from sqlalchemy import (
+    DDL, Column, Index, PrimaryKeyConstraint, Table, delete, event, func, insert, select, text, update
+)
+
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Rows stay hot for at least this many days; each run archives the whole months older than that
+HOT_RETENTION_DAYS = int(os.getenv("HOT_RETENTION_DAYS", 45))
+ARCHIVE_ENABLED = os.getenv("ARCHIVE_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Rows moved per transaction, and how long readers may keep using a boundary they have cached
+ARCHIVE_BATCH_SIZE = int(os.getenv("ARCHIVE_BATCH_SIZE", 10000))
+ARCHIVE_BOUNDARY_TTL = float(os.getenv("ARCHIVE_BOUNDARY_TTL", 60))
+
+# Catch-all partition every monthly partition is split off from
+FUTURE_PARTITION = "p_future"
+
+
+def month_start(day: datetime.date) -> datetime.date:
+    return day.replace(day=1)
+
+
+def next_month(day: datetime.date) -> datetime.date:
+    return (day.replace(day=1) + datetime.timedelta(days=32)).replace(day=1)
+
+
+def archive_cutoff(today: datetime.date = None, retention_days: int = HOT_RETENTION_DAYS) -> datetime.date:
+    """First BANKING_DATE that stays hot: the start of the month holding today - retention_days."""
+    today = today or datetime.date.today()
+    return month_start(today - datetime.timedelta(days=retention_days))
+
+
+def _as_date(value):
+    if isinstance(value, datetime.datetime):
+        return value.date()
+    if isinstance(value, datetime.date):
+        return value
+    try:
+        return datetime.date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+# The cold copy of the hot table. Every unique key of a partitioned InnoDB table must contain the partitioning
+# column, so the key is (DOC_IDT, BANKING_DATE); the archive job keeps each DOC_IDT in exactly one table
+def archive_table(hot_table: Table, metadata, name: str = "transactions_archive") -> Table:
+    columns = [
+        Column(col.name, col.type, nullable=col.name not in ("DOC_IDT", "BANKING_DATE"))
+        for col in hot_table.columns
+    ]
+    indexes = [
+        Index(index.name.replace(hot_table.name, name, 1), *(col.name for col in index.columns))
+        for index in hot_table.indexes
+    ]
+    table = Table(
+        name, metadata, *columns, PrimaryKeyConstraint("DOC_IDT", "BANKING_DATE"), *indexes,
+        mysql_row_format="COMPRESSED", mysql_key_block_size="8",
+    )
+    # One partition per archived month, split off the catch-all as the job reaches it
+    event.listen(table, "after_create", DDL(
+        f"ALTER TABLE {name} PARTITION BY RANGE COLUMNS(BANKING_DATE) "
+        f"(PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))"
+    ).execute_if(dialect="mysql"))
+    return table
+
+
+# Whether a query may touch archived rows. Rows at or after the boundary are only ever in the hot table;
+# below it they are in the archive, or still hot until the job reaches them, so both are read
+def needs_archive(boundary, filter_by: str = None, filter_value=None, sort_by: str = None, sort_order: str = "asc",
+                  after: tuple = None, date_field: str = None, date_from=None) -> bool:
+    if boundary is None:
+        return False
+    if filter_by == "BANKING_DATE" and filter_value:
+        day = _as_date(filter_value)
+        if day is not None and day >= boundary:
+            return False
+    if date_field == "BANKING_DATE" and date_from:
+        day = _as_date(date_from)
+        if day is not None and day >= boundary:
+            return False
+    # Ascending BANKING_DATE pages past the boundary can no longer reach older rows
+    if sort_by == "BANKING_DATE" and sort_order == "asc" and after is not None and after[0] is not None:
+        day = _as_date(after[0])
+        if day is not None and day >= boundary:
+            return False
+    return True
+
+
+# BANKING_DATE below which rows may be archived, cached for ttl seconds per process
+class ArchiveBoundary:
+    def __init__(self, session_factory, periods_table, ttl: float = ARCHIVE_BOUNDARY_TTL):
+        self.session_factory = session_factory
+        self.periods_table = periods_table
+        self.ttl = ttl
+        self._value = None
+        self._loaded_at = None
+
+    async def get(self):
+        """The end of the last published archive period, or None when nothing has been archived."""
+        if self._loaded_at is not None and time.monotonic() - self._loaded_at < self.ttl:
+            return self._value
+        return await self.refresh()
+
+    async def refresh(self):
+        async with self.session_factory() as session:
+            result = await session.execute(select(func.max(self.periods_table.c.PERIOD_END)))
+            self._value = _as_date(result.scalar()) if result is not None else None
+        self._loaded_at = time.monotonic()
+        return self._value
+
+    def clear(self):
+        self._loaded_at = None
+
+
+# Moves every hot row of closed months into the archive, a batch of DOC_IDTs per transaction
+class ArchiveJob:
+    def __init__(self, session_factory, hot_table: Table, cold_table: Table, periods_table: Table,
+                 boundary: ArchiveBoundary, batch_size: int = ARCHIVE_BATCH_SIZE):
+        self.session_factory = session_factory
+        self.hot_table = hot_table
+        self.cold_table = cold_table
+        self.periods_table = periods_table
+        self.boundary = boundary
+        self.batch_size = max(1, batch_size)
+
+    async def run(self, cutoff: datetime.date = None, settle_seconds: float = None) -> dict:
+        """Archive hot rows with BANKING_DATE before cutoff (default: archive_cutoff()); returns rows moved per month."""
+        cutoff = month_start(cutoff or archive_cutoff())
+        settle_seconds = self.boundary.ttl if settle_seconds is None else settle_seconds
+        started = time.perf_counter()
+
+        async with self.session_factory() as session:
+            oldest = _as_date((await session.execute(
+                select(func.min(self.hot_table.c.BANKING_DATE)).where(self.hot_table.c.BANKING_DATE < cutoff)
+            )).scalar())
+        if oldest is None:
+            logger.info(f"No hot transactions before {cutoff} to archive.")
+            return {}
+
+        periods = []
+        period = month_start(oldest)
+        while period < cutoff:
+            periods.append(period)
+            period = next_month(period)
+
+        # Publish the new boundary first and give every process time to pick it up, so no reader still
+        # treats these months as hot-only once their rows start moving
+        published = await self.boundary.refresh()
+        await self._publish(periods)
+        if published is None or cutoff > published:
+            logger.info(f"Archive boundary moved to {cutoff}; waiting {settle_seconds:.0f}s for readers to see it.")
+            await asyncio.sleep(settle_seconds)
+        self.boundary.clear()
+
+        moved = {}
+        for period in periods:
+            moved[period] = await self._archive_period(period, next_month(period))
+        logger.info(f"Archived {sum(moved.values())} transactions from {len(periods)} months before {cutoff} "
+                    f"in {time.perf_counter() - started:.2f}s.")
+        return moved
+
+    async def _publish(self, periods: list):
+        table = self.periods_table
+        async with self.session_factory() as session:
+            known = {_as_date(day) for day in (await session.execute(
+                select(table.c.PERIOD_START).where(table.c.PERIOD_START.in_(periods))
+            )).scalars()}
+            new = [
+                {"PERIOD_START": period, "PERIOD_END": next_month(period), "ROW_COUNT": 0,
+                 "STATUS": "pending", "UPDATED_AT": datetime.datetime.now()}
+                for period in periods if period not in known
+            ]
+            if new:
+                await session.execute(insert(table), new)
+            await session.commit()
+
+    async def _archive_period(self, start: datetime.date, end: datetime.date) -> int:
+        hot, cold = self.hot_table, self.cold_table
+        await self._ensure_partition(end)
+        in_period = (hot.c.BANKING_DATE >= start) & (hot.c.BANKING_DATE < end)
+        columns = [col.name for col in hot.columns]
+        moved = 0
+        while True:
+            # Insert and delete commit together, so each row is visible in exactly one table at a time
+            async with self.session_factory() as session:
+                doc_ids = (await session.execute(
+                    select(hot.c.DOC_IDT).where(in_period).order_by(hot.c.DOC_IDT).limit(self.batch_size)
+                )).scalars().all()
+                if not doc_ids:
+                    break
+                await session.execute(insert(cold).from_select(
+                    columns, select(*hot.columns).where(hot.c.DOC_IDT.in_(doc_ids))
+                ))
+                await session.execute(delete(hot).where(hot.c.DOC_IDT.in_(doc_ids)))
+                await session.commit()
+            moved += len(doc_ids)
+
+        table = self.periods_table
+        async with self.session_factory() as session:
+            await session.execute(update(table).where(table.c.PERIOD_START == start).values(
+                ROW_COUNT=table.c.ROW_COUNT + moved, STATUS="archived", UPDATED_AT=datetime.datetime.now()
+            ))
+            await session.commit()
+        logger.info(f"Archived {moved} transactions with BANKING_DATE in [{start}, {end}).")
+        return moved
+
+    # MySQL: split a partition ending at `end` off the catch-all, unless an existing partition already covers it
+    async def _ensure_partition(self, end: datetime.date):
+        async with self.session_factory() as session:
+            if session.bind.dialect.name != "mysql":
+                return
+            names = (await session.execute(text(
+                "SELECT PARTITION_NAME FROM information_schema.PARTITIONS "
+                "WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = :table AND PARTITION_NAME IS NOT NULL"
+            ), {"table": self.cold_table.name})).scalars().all()
+            if FUTURE_PARTITION not in names:
+                logger.warning(f"{self.cold_table.name} is not partitioned; archiving into it unpartitioned.")
+                return
+            bounds = [next_month(datetime.date(int(name[1:5]), int(name[5:7]), 1))
+                      for name in names if name != FUTURE_PARTITION]
+            if any(bound >= end for bound in bounds):
+                return
+            last_month = end - datetime.timedelta(days=1)
+            await session.execute(text(
+                f"ALTER TABLE {self.cold_table.name} REORGANIZE PARTITION {FUTURE_PARTITION} INTO ("
+                f"PARTITION p{last_month:%Y%m} VALUES LESS THAN ('{end.isoformat()}'), "
+                f"PARTITION {FUTURE_PARTITION} VALUES LESS THAN (MAXVALUE))"
+            ))
+        logger.info(f"Added partition p{last_month:%Y%m} to {self.cold_table.name}.")
+
+    async def status(self) -> list:
+        async with self.session_factory() as session:
+            result = await session.execute(select(self.periods_table).order_by(self.periods_table.c.PERIOD_START))
+            return [dict(row._mapping) for row in result]
+
+
+async def _run(args) -> int:
+    from utils.db_operations import archive_job, init_schema, session_router
+
+    try:
+        await init_schema()
+        if args.command == "run":
+            await archive_job.run(cutoff=args.cutoff, settle_seconds=args.settle_seconds)
+        for period in await archive_job.status():
+            print(f"{period['PERIOD_START']} .. {period['PERIOD_END']}  {period['STATUS']:8} "
+                  f"{period['ROW_COUNT']:>12} rows  {period['UPDATED_AT']}")
+    finally:
+        await session_router.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["run", "status"])
+    parser.add_argument("--cutoff", type=datetime.date.fromisoformat,
+                        help="Archive months before this date (default: HOT_RETENTION_DAYS ago)")
+    parser.add_argument("--settle-seconds", type=float,
+                        help="Wait after moving the boundary (default: ARCHIVE_BOUNDARY_TTL)")
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(_run(parser.parse_args())))
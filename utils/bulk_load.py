@@ -0,0 +1,204 @@
+#utils/bulk_load.py
+import asyncio
+import logging
+import os
+import time
+from dataclasses import dataclass, field
+
+from sqlalchemy import select
+from sqlalchemy.dialects import mysql, sqlite
+from sqlalchemy.exc import OperationalError
+
+from utils.db_errors import ROW_ERRORS
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Rows per executemany batch, batches in flight at once, and retries for lock timeouts/deadlocks
+BULK_BATCH_SIZE = int(os.getenv("BULK_BATCH_SIZE", 1000))
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", 4))
+BULK_MAX_RETRIES = int(os.getenv("BULK_MAX_RETRIES", 3))
+
+# MySQL error codes worth retrying unchanged: lock wait timeout, deadlock
+TRANSIENT_ERROR_CODES = {1205, 1213}
+
+
+# Per-file outcome of a bulk load
+@dataclass
+class BulkLoadReport:
+    inserted: int = 0
+    updated: int = 0
+    rejected: int = 0
+    batches: int = 0
+    retries: int = 0
+    elapsed: float = 0.0
+    rejected_rows: list = field(default_factory=list)  # (key, reason) pairs
+
+    def reject(self, key, reason: str):
+        self.rejected += 1
+        self.rejected_rows.append((key, reason))
+
+    def merge(self, other: "BulkLoadReport") -> "BulkLoadReport":
+        self.inserted += other.inserted
+        self.updated += other.updated
+        self.rejected += other.rejected
+        self.batches += other.batches
+        self.retries += other.retries
+        self.elapsed += other.elapsed
+        self.rejected_rows.extend(other.rejected_rows)
+        return self
+
+    def __str__(self):
+        return (f"inserted={self.inserted} updated={self.updated} rejected={self.rejected} "
+                f"batches={self.batches} retries={self.retries} elapsed={self.elapsed:.2f}s")
+
+
+# Dialect-specific INSERT ... ON DUPLICATE KEY UPDATE / ON CONFLICT DO UPDATE with no bound values
+def upsert_statement(table, dialect_name: str):
+    """Build an upsert for table that updates every non-key column, ready for executemany."""
+    key_columns = [col.name for col in table.primary_key.columns]
+    if dialect_name == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update(
+            {col.name: stmt.inserted[col.name] for col in table.columns if col.name not in key_columns}
+        )
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns,
+            set_={col.name: stmt.excluded[col.name] for col in table.columns if col.name not in key_columns},
+        )
+    raise ValueError(f"Bulk upsert is not supported for the '{dialect_name}' dialect.")
+
+
+# Insert that skips rows whose key is already stored, leaving the stored row untouched
+def insert_ignore_statement(table, dialect_name: str):
+    if dialect_name == "mysql":
+        return mysql.insert(table).prefix_with("IGNORE")
+    if dialect_name == "sqlite":
+        return sqlite.insert(table).on_conflict_do_nothing()
+    raise ValueError(f"Insert-ignore is not supported for the '{dialect_name}' dialect.")
+
+
+# Upsert that adds the incoming values onto the stored ones for the given columns (counters, running sums)
+def increment_statement(table, dialect_name: str, columns: list):
+    key_columns = [col.name for col in table.primary_key.columns]
+    if dialect_name == "mysql":
+        stmt = mysql.insert(table)
+        return stmt.on_duplicate_key_update({name: table.c[name] + stmt.inserted[name] for name in columns})
+    if dialect_name == "sqlite":
+        stmt = sqlite.insert(table)
+        return stmt.on_conflict_do_update(
+            index_elements=key_columns, set_={name: table.c[name] + stmt.excluded[name] for name in columns}
+        )
+    raise ValueError(f"Increment upsert is not supported for the '{dialect_name}' dialect.")
+
+
+# Runs several before_write hooks in order, inside the same batch transaction
+def chain_hooks(*hooks):
+    async def before_write(session, batch: list, existing_keys: set):
+        for hook in hooks:
+            await hook(session, batch, existing_keys)
+    return before_write
+
+
+def _is_transient(error: Exception) -> bool:
+    if not isinstance(error, OperationalError):
+        return False
+    args = getattr(error.orig, "args", ())
+    return bool(args) and args[0] in TRANSIENT_ERROR_CODES
+
+
+# Batched upsert engine: each batch is its own executemany and its own transaction
+class BulkLoader:
+    def __init__(self, session_factory, table, batch_size: int = BULK_BATCH_SIZE,
+                 concurrency: int = BULK_CONCURRENCY, before_write=None, on_commit=None):
+        self.session_factory = session_factory
+        self.table = table
+        self.batch_size = max(1, batch_size)
+        self.concurrency = max(1, concurrency)
+        self.before_write = before_write  # awaited as (session, batch, existing_keys) inside each batch's transaction
+        self.on_commit = on_commit  # awaited with the keys of every committed batch
+        self.key = list(table.primary_key.columns)[0]
+        self._statements = {}
+
+    async def load(self, records: list) -> BulkLoadReport:
+        """Upsert records in concurrent batches, bisecting batches that fail on row errors down to the offending rows.
+
+        Any other database error (see utils.db_errors.ABORT_ERRORS) is raised once its retries are spent, and the load is aborted.
+        """
+        report = BulkLoadReport()
+        started = time.perf_counter()
+
+        # A later row for the same key overwrites an earlier one, as in a single multi-row upsert.
+        # Collapsing them here also keeps concurrent batches from touching the same key.
+        by_key = {}
+        for record in records:
+            by_key[record[self.key.name]] = record
+        records = list(by_key.values())
+
+        batches = [records[i:i + self.batch_size] for i in range(0, len(records), self.batch_size)]
+        semaphore = asyncio.Semaphore(self.concurrency)
+
+        async def run(batch):
+            async with semaphore:
+                await self._write(batch, report)
+
+        tasks = [asyncio.ensure_future(run(batch)) for batch in batches]
+        try:
+            await asyncio.gather(*tasks)
+        except BaseException:
+            # One batch hit an error no retry or split can get past: stop the others and abort the load
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            logger.error(f"Bulk load of {len(records)} records aborted after {report.batches} batches: {report}")
+            raise
+
+        report.elapsed = time.perf_counter() - started
+        logger.info(f"Bulk load of {len(records)} records finished: {report}")
+        return report
+
+    def _statement(self, session):
+        dialect_name = session.get_bind().dialect.name
+        if dialect_name not in self._statements:
+            self._statements[dialect_name] = upsert_statement(self.table, dialect_name)
+        return self._statements[dialect_name]
+
+    async def _write(self, batch: list, report: BulkLoadReport, attempt: int = 0):
+        keys = [record[self.key.name] for record in batch]
+        try:
+            async with self.session_factory() as session:
+                result = await session.execute(select(self.key).where(self.key.in_(keys)))
+                existing = {row[0] for row in result}
+                if self.before_write is not None:
+                    await self.before_write(session, batch, existing)
+                await session.execute(self._statement(session), batch)
+                await session.commit()
+        except Exception as e:
+            if _is_transient(e) and attempt < BULK_MAX_RETRIES:
+                report.retries += 1
+                await asyncio.sleep(0.1 * 2 ** attempt)
+                await self._write(batch, report, attempt + 1)
+                return
+            if not isinstance(e, ROW_ERRORS):
+                raise
+            if len(batch) == 1:
+                logger.error(f"Rejected {self.key.name}={keys[0]}: {e}")
+                report.reject(keys[0], str(e))
+                return
+            # Split the failed batch and retry each half on its own
+            report.retries += 1
+            middle = len(batch) // 2
+            await self._write(batch[:middle], report)
+            await self._write(batch[middle:], report)
+            return
+
+        if self.on_commit is not None:
+            await self.on_commit(keys)
+        report.batches += 1
+        report.updated += len(existing)
+        report.inserted += len(batch) - len(existing)
@@ -1,18 +1,331 @@
 #utils/cache.py
+import asyncio
+import hashlib
+import logging
+import os
+import time
+from collections import OrderedDict
+
+import orjson
 import redis
-from dotenv import load_dotenv
+import redis.asyncio as aioredis
+
+from utils.env import load_env
+from utils.serialization import dumps, loads
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Redis connection settings; the pool is only created on first use
+REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
+REDIS_PORT = int(os.getenv("REDIS_PORT", 6379))
+REDIS_DB = int(os.getenv("REDIS_DB", 0))
+REDIS_POOL_SIZE = int(os.getenv("REDIS_POOL_SIZE", 20))
+REDIS_TIMEOUT = float(os.getenv("REDIS_TIMEOUT", 0.5))
+
+# After a connection failure, serve from the in-process fallback for this long before trying Redis again
+REDIS_RETRY_SECONDS = float(os.getenv("REDIS_RETRY_SECONDS", 30))
+
+# Failures that mean Redis is unreachable rather than that a command was wrong
+REDIS_ERRORS = (redis.ConnectionError, redis.TimeoutError, OSError)
+
+# Response cache settings: backend ("redis" or "memory"), entry TTL, in-process memory cap and largest entry stored
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "redis")
+CACHE_TTL = int(os.getenv("CACHE_TTL", 3600))
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", 64 * 1024 * 1024))
+CACHE_MAX_ENTRY_BYTES = int(os.getenv("CACHE_MAX_ENTRY_BYTES", 1024 * 1024))
+
+# How long a worker trusts the ingest generation it last read before asking the backend again
+CACHE_GENERATION_TTL = float(os.getenv("CACHE_GENERATION_TTL", 1.0))
+
+
+# In-process LRU with per-entry TTL and a byte cap; also the fake used when no Redis is available
+class LocalCache:
+    degraded = False
+
+    def __init__(self, max_bytes: int = CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.used_bytes = 0
+        self._entries = OrderedDict()  # key -> (expires_at, value)
+
+    async def get(self, key: str):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._drop(key)
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: int = None):
+        if key in self._entries:
+            self._drop(key)
+        if len(value) > self.max_bytes:
+            return
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._entries[key] = (expires_at, value)
+        self.used_bytes += len(value)
+        while self.used_bytes > self.max_bytes:
+            self._drop(next(iter(self._entries)))
+
+    async def add(self, key: str, value: bytes) -> bool:
+        """Set key only if it is absent; True if it was set."""
+        if await self.get(key) is not None:
+            return False
+        await self.set(key, value)
+        return True
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        await self.set(key, str(value).encode())
+        return value
+
+    async def mget(self, keys: list) -> list:
+        return [await self.get(key) for key in keys]
+
+    async def mset(self, mapping: dict, ttl: int = None):
+        for key, value in mapping.items():
+            await self.set(key, value, ttl=ttl)
+
+    def _drop(self, key: str):
+        _, value = self._entries.pop(key)
+        self.used_bytes -= len(value)
+
+
+# Async Redis client on a lazily created connection pool, falling back to a LocalCache while Redis is down
+class AsyncRedisCache:
+    def __init__(self, host: str = REDIS_HOST, port: int = REDIS_PORT, db: int = REDIS_DB,
+                 pool_size: int = REDIS_POOL_SIZE, timeout: float = REDIS_TIMEOUT, fallback: LocalCache = None):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self.fallback = fallback if fallback is not None else LocalCache()
+        self._client = None
+        self._down_until = 0.0
+        self._pending_incr = {}  # key -> increments made on the fallback, still to be applied to Redis
+        self._replay_task = None
+
+    @property
+    def degraded(self) -> bool:
+        """True while calls go to the in-process fallback instead of Redis."""
+        return time.monotonic() < self._down_until
+
+    @property
+    def client(self):
+        if self._client is None:
+            pool = aioredis.ConnectionPool(
+                host=self.host, port=self.port, db=self.db, max_connections=self.pool_size,
+                socket_timeout=self.timeout, socket_connect_timeout=self.timeout,
+            )
+            self._client = aioredis.Redis(connection_pool=pool)
+        return self._client
+
+    async def _call(self, operation: str, *args, **kwargs):
+        if not self.degraded:
+            try:
+                if self._pending_incr:
+                    await self._replay_pending()
+                return await getattr(self, f"_redis_{operation}")(*args, **kwargs)
+            except REDIS_ERRORS as e:
+                logger.warning(f"Redis at {self.host}:{self.port} unavailable ({e}); using the in-process cache "
+                               f"for {REDIS_RETRY_SECONDS:.0f}s.")
+                self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+        if operation == "incr":
+            self._record_incr(*args)
+        return await getattr(self.fallback, operation)(*args, **kwargs)
+
+    # An increment made on the fallback is invisible to other workers, so it is applied to Redis once it is back
+    def _record_incr(self, key: str):
+        self._pending_incr[key] = self._pending_incr.get(key, 0) + 1
+        if self._replay_task is None or self._replay_task.done():
+            self._replay_task = asyncio.get_running_loop().create_task(self._replay_when_back())
+
+    # Retried on its own, so the increments reach Redis even if this worker serves no further requests
+    async def _replay_when_back(self):
+        while self._pending_incr:
+            await asyncio.sleep(max(self._down_until - time.monotonic(), 0.0))
+            try:
+                await self._replay_pending()
+                self._down_until = 0.0
+            except REDIS_ERRORS:
+                self._down_until = time.monotonic() + REDIS_RETRY_SECONDS
+
+    async def _replay_pending(self):
+        """INCRBY every key by the increments it missed; never a reset, since other workers may have bumped too."""
+        pending, self._pending_incr = self._pending_incr, {}
+        try:
+            for key in list(pending):
+                await self.client.incrby(key, pending[key])
+                logger.info(f"Applied {pending.pop(key)} increment(s) of {key} made while Redis was down.")
+        finally:
+            for key, count in pending.items():
+                self._pending_incr[key] = self._pending_incr.get(key, 0) + count
+
+    async def get(self, key: str):
+        return await self._call("get", key)
+
+    async def set(self, key: str, value: bytes, ttl: int = None):
+        await self._call("set", key, value, ttl=ttl)
+
+    async def add(self, key: str, value: bytes) -> bool:
+        return await self._call("add", key, value)
+
+    async def incr(self, key: str) -> int:
+        return await self._call("incr", key)
+
+    async def mget(self, keys: list) -> list:
+        return await self._call("mget", keys)
+
+    async def mset(self, mapping: dict, ttl: int = None):
+        await self._call("mset", mapping, ttl=ttl)
+
+    async def _redis_get(self, key):
+        return await self.client.get(key)
+
+    async def _redis_set(self, key, value, ttl=None):
+        await self.client.set(key, value, ex=ttl)
+
+    async def _redis_add(self, key, value):
+        return bool(await self.client.set(key, value, nx=True))
+
+    async def _redis_incr(self, key):
+        return await self.client.incr(key)
+
+    async def _redis_mget(self, keys):
+        return await self.client.mget(keys) if keys else []
+
+    async def _redis_mset(self, mapping, ttl=None):
+        # One round trip for the whole mapping, each key with its own expiry
+        async with self.client.pipeline(transaction=False) as pipe:
+            for key, value in mapping.items():
+                pipe.set(key, value, ex=ttl)
+            await pipe.execute()
+
+    async def close(self):
+        if self._replay_task is not None:
+            self._replay_task.cancel()
+            self._replay_task = None
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+
+cache_client = AsyncRedisCache()
+
+
+# JSON-encoded values on top of the shared client (orjson handles dates and datetimes natively)
+async def cache_data(key, data, ttl: int = None):
+    await cache_client.set(key, dumps(data), ttl=ttl)
+
+
+async def get_cached_data(key):
+    raw = await cache_client.get(key)
+    return loads(raw) if raw is not None else None
+
+
+async def cache_many(mapping: dict, ttl: int = None):
+    await cache_client.mset({key: dumps(value) for key, value in mapping.items()}, ttl=ttl)
+
+
+async def get_cached_many(keys: list) -> list:
+    return [loads(raw) if raw is not None else None for raw in await cache_client.mget(keys)]
+
+
+# Read-through cache for API responses, invalidated wholesale by bumping the ingest generation.
+# Bypassed while the backend is degraded: each worker's in-process fallback would hold pages that an ingest
+# in another worker cannot invalidate
+class ResponseCache:
+    GENERATION_KEY = "txcache:generation"
+
+    def __init__(self, backend, ttl: int = CACHE_TTL, max_entry_bytes: int = CACHE_MAX_ENTRY_BYTES):
+        self.backend = backend
+        self.ttl = ttl
+        self.max_entry_bytes = max_entry_bytes
+        self.hits = 0
+        self.misses = 0
+        self.errors = 0
+        self._generation = None
+        self._generation_read_at = 0.0
+
+    async def generation(self) -> int:
+        now = time.monotonic()
+        if self._generation is None or now - self._generation_read_at > CACHE_GENERATION_TTL:
+            self._generation = await self._stored_generation()
+            self._generation_read_at = now
+        return self._generation
+
+    async def _stored_generation(self) -> int:
+        raw = await self.backend.get(self.GENERATION_KEY)
+        if raw is not None:
+            return int(raw)
+        # Never set, or evicted: starting again from 0 would serve entries cached under an old generation, so
+        # start from the clock (in microseconds), past any generation reached before
+        fresh = time.time_ns() // 1000
+        if await self.backend.add(self.GENERATION_KEY, str(fresh).encode()):
+            return fresh
+        return int(await self.backend.get(self.GENERATION_KEY) or fresh)  # another worker set it first
+
+    async def bump_generation(self) -> int:
+        """Invalidate every cached response at once; old entries simply age out under their TTL."""
+        try:
+            await self._stored_generation()  # so incr never starts from a missing key
+            self._generation = await self.backend.incr(self.GENERATION_KEY)
+            self._generation_read_at = time.monotonic()
+            logger.info(f"Response cache generation bumped to {self._generation}.")
+            return self._generation
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Could not bump response cache generation: {e}")
+            return -1
+
+    async def key_for(self, namespace: str, params: dict) -> str:
+        normalized = orjson.dumps({k: v for k, v in params.items() if v is not None}, default=str,
+                                  option=orjson.OPT_SORT_KEYS)
+        digest = hashlib.sha1(normalized).hexdigest()
+        return f"txcache:{namespace}:g{await self.generation()}:{digest}"
 
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
+    async def get(self, namespace: str, params: dict):
+        """Return the cached (body, headers) for a normalized query, or None on a miss."""
+        if self.backend.degraded:
+            self.misses += 1
+            return None
+        try:
+            raw = await self.backend.get(await self.key_for(namespace, params))
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Response cache read failed: {e}")
+            raw = None
+        if raw is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        headers, _, body = raw.partition(b"\n")
+        return body, loads(headers)
 
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+    async def set(self, namespace: str, params: dict, body: bytes, headers: dict = None):
+        raw = orjson.dumps(headers or {}) + b"\n" + body
+        if len(raw) > self.max_entry_bytes or self.backend.degraded:
+            return
+        try:
+            await self.backend.set(await self.key_for(namespace, params), raw, ttl=self.ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.error(f"Response cache write failed: {e}")
 
-#This utitly caches data like tokens e.t.c
-redis_cache = redis.StrictRedis(host='localhost', port=6379, db=0)
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "errors": self.errors,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
 
-def cache_data(key, data):
-    redis_cache.set(key, data)
 
-def get_cached_data(key):
-    return redis_cache.get(key)
+response_cache = ResponseCache(LocalCache() if CACHE_BACKEND == "memory" else cache_client)
@@ -0,0 +1,8 @@
+#utils/db_errors.py
+from sqlalchemy.exc import DataError, IntegrityError, InterfaceError, OperationalError, ProgrammingError
+
+# Errors caused by the rows themselves, which bisecting a batch can pin down to the offending ones
+ROW_ERRORS = (IntegrityError, DataError)
+
+# Errors no subset of the batch can avoid (lost connection, missing table, no privilege): the load is aborted
+ABORT_ERRORS = (OperationalError, InterfaceError, ProgrammingError)
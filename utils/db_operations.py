@@ -1,23 +1,28 @@
 #utils/db_operations.py
+import datetime
 import logging
 import os
+import time
 from contextlib import asynccontextmanager
 
-import pandas as pd
-from pydantic import ValidationError
-from sqlalchemy import Column, Integer, String, Date, DECIMAL, CHAR, Text
-from sqlalchemy import insert
-from sqlalchemy.dialects.mysql import insert
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession
+from sqlalchemy import (
+    Column, Integer, BigInteger, String, Date, DateTime, Double, DECIMAL, CHAR, Text, Index, and_, or_, tuple_, func,
+    union_all, bindparam, insert, inspect, text
+)
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.future import select
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.schema import CreateColumn
+
+from utils.archive import ArchiveBoundary, ArchiveJob, archive_table, needs_archive
+from utils.cache import response_cache
+from utils.index_advisor import IndexAdvisor, IndexCatalog
+from utils.metrics import track_round_trips
+from utils.query_spec import QuerySpec, statement_cache
+from utils.ingest_manifest import FileManifest
+from utils.rollups import ROLLUP_DIMENSIONS
+from utils.search import SearchIndex, search_table
+from utils.session_router import SessionRouter
 
-from api.schemas import TransactionBase
-from utils.parse_transform import parse_csv, deduplicate_data
-
-# Configure the logging
-logging.basicConfig(level=logging.DEBUG)
 logger = logging.getLogger(__name__)
 
 # Database configuration
@@ -26,15 +31,31 @@ DATABASE_URL = os.getenv("DATABASE_URL", "mysql+aiomysql://Fere:%40Dharmahikona7
 
 
 
-engine = create_async_engine(DATABASE_URL, pool_size=10, max_overflow=20)
-AsyncSessionLocal = sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+# Writes (ingestion, manifest, rollups, archive) use the primary's writer pool; API reads go through
+# get_read_session to replicas or the primary's reader pool
+session_router = SessionRouter(DATABASE_URL)
+engine = session_router.writer
+for routed_engine in session_router.engines:
+    track_round_trips(routed_engine)
+AsyncSessionLocal = session_router.write_sessions
 
 Base = declarative_base()
 
+# Rows fetched per round trip when streaming exports
+EXPORT_PARTITION_SIZE = int(os.getenv("EXPORT_PARTITION_SIZE", 5000))
+
 
 # Transaction model
 class Transaction(Base):
     __tablename__ = 'transactions'
+    # Secondary indexes for the hot filter/sort shapes; InnoDB appends DOC_IDT to each, which keyset pages rely on
+    __table_args__ = (
+        Index("ix_transactions_banking_date", "BANKING_DATE"),
+        Index("ix_transactions_settlement_date", "SETTLEMENT_DATE"),
+        Index("ix_transactions_trans_rrn", "TRANS_RRN"),
+        Index("ix_transactions_account_number_banking_date", "ACCOUNT_NUMBER", "BANKING_DATE"),
+        Index("ix_transactions_merchant_banking_date", "MERCHANT", "BANKING_DATE"),
+    )
 
     INSTITUTION_BRANCH_CODE = Column(Integer)
     BANKING_DATE = Column(Date)
@@ -105,14 +126,130 @@ class Transaction(Base):
     PARENT_CONTRACT_NUMBER = Column(String(255))
 
 
-# Synchronous table creation
-def create_tables():
-    import sqlalchemy
-    sync_engine = sqlalchemy.create_engine(DATABASE_URL.replace("mysql+aiomysql", "mysql+pymysql"))
-    Base.metadata.create_all(sync_engine)
+# Settlement totals per day/currency/brand/direction, kept up to date from every committed ingest batch
+class SettlementRollup(Base):
+    __tablename__ = 'settlement_rollups'
+
+    SETTLEMENT_DATE = Column(Date, primary_key=True)
+    SETTL_CURRENCY = Column(Integer, primary_key=True)
+    CARD_BRAND_NAME = Column(String(255), primary_key=True)
+    DIRECTION = Column(String(255), primary_key=True)
+    TXN_COUNT = Column(BigInteger, nullable=False, default=0)
+    SETTL_AMOUNT_SUM = Column(DECIMAL(24, 2), nullable=False, default=0)
+
+
+# One row per dump file: what it looked like when last loaded and how far into it rows are committed
+class IngestedFile(Base):
+    __tablename__ = 'ingest_manifest'
+
+    FILE_NAME = Column(String(255), primary_key=True)
+    FILE_SIZE = Column(BigInteger, nullable=False)
+    FILE_MTIME = Column(Double, nullable=False)
+    CONTENT_HASH = Column(CHAR(64), nullable=False)  # sha256 of the bytes up to COMMITTED_OFFSET
+    ROW_COUNT = Column(BigInteger, nullable=False)
+    COMMITTED_OFFSET = Column(BigInteger, nullable=False)
+    UPDATED_AT = Column(DateTime, nullable=False)
+    CLAIMED_BY = Column(String(255))  # the instance loading the dump, until LEASE_EXPIRES (UTC)
+    LEASE_EXPIRES = Column(DateTime)
+
+
+# Closed BANKING_DATE months moved out of transactions by utils.archive (see archive_table)
+transactions_archive = archive_table(Transaction.__table__, Base.metadata)
+
+
+# One row per archived month; the latest PERIOD_END is the boundary below which reads include the archive
+class ArchivedPeriod(Base):
+    __tablename__ = 'transaction_archive_periods'
+
+    PERIOD_START = Column(Date, primary_key=True)
+    PERIOD_END = Column(Date, nullable=False)
+    ROW_COUNT = Column(BigInteger, nullable=False, default=0)
+    STATUS = Column(String(16), nullable=False)  # pending until the job has moved the month's rows
+    UPDATED_AT = Column(DateTime, nullable=False)
+
+
+# One full-text search document per transaction, hot or archived (see utils.search)
+transaction_search = search_table(Base.metadata)
+
+
+# Every transaction, hot and archived, for full-history aggregates such as the rollup rebuild
+def transaction_history():
+    return union_all(
+        select(*Transaction.__table__.columns), select(*transactions_archive.columns)
+    ).subquery("transaction_history")
 
 
-create_tables()
+# Bump whenever a table or index is added to the models, so the next startup creates it
+SCHEMA_VERSION = 3
+
+
+# The schema version the tables were last created for; startup skips all DDL when it is current
+class SchemaVersion(Base):
+    __tablename__ = 'schema_version'
+
+    VERSION = Column(Integer, primary_key=True)
+    APPLIED_AT = Column(DateTime, nullable=False)
+
+
+def _stored_schema_version(conn):
+    if not inspect(conn).has_table(SchemaVersion.__tablename__):
+        return None
+    return conn.execute(select(func.max(SchemaVersion.VERSION))).scalar()
+
+
+def _create_schema(conn):
+    Base.metadata.create_all(conn)
+    # create_all skips tables that already exist, so add any (nullable) column and index declared since
+    inspector = inspect(conn)
+    for table in Base.metadata.sorted_tables:
+        stored = {column["name"] for column in inspector.get_columns(table.name)}
+        for column in table.columns:
+            if column.name not in stored:
+                ddl = CreateColumn(column).compile(dialect=conn.dialect)
+                conn.execute(text(f"ALTER TABLE {table.name} ADD COLUMN {ddl}"))
+                logger.info(f"Added column {table.name}.{column.name}.")
+    for index in [*Transaction.__table__.indexes, *transactions_archive.indexes]:
+        index.create(conn, checkfirst=True)
+
+
+_schema_ready = False
+
+
+# Async table creation, run from the app lifespan (and the CLIs) instead of at import
+async def init_schema() -> bool:
+    """Create missing tables and indexes unless the database already records SCHEMA_VERSION; True if DDL ran."""
+    global _schema_ready
+    if _schema_ready:
+        return False
+    async with engine.begin() as conn:
+        mysql = conn.dialect.name == "mysql"
+        if mysql:
+            # Workers restarting together: one creates the schema, the others wait and then find it current
+            await conn.execute(text("SELECT GET_LOCK('momo_schema_init', 60)"))
+        try:
+            stored = await conn.run_sync(_stored_schema_version)
+            if stored is not None and stored >= SCHEMA_VERSION:
+                if stored > SCHEMA_VERSION:
+                    logger.warning(f"Database schema version {stored} is newer than this build ({SCHEMA_VERSION}).")
+                _schema_ready = True
+                return False
+            started = time.perf_counter()
+            await conn.run_sync(_create_schema)
+            await conn.execute(insert(SchemaVersion.__table__).values(
+                VERSION=SCHEMA_VERSION, APPLIED_AT=datetime.datetime.now()
+            ))
+            logger.info(f"Created schema version {SCHEMA_VERSION} (was {stored}) in "
+                        f"{time.perf_counter() - started:.2f}s.")
+        finally:
+            if mysql:
+                await conn.execute(text("SELECT RELEASE_LOCK('momo_schema_init')"))
+    _schema_ready = True
+    return True
+
+
+# Which filter/sort shapes the declared indexes serve, and a recorder of the slow ones seen in traffic
+index_catalog = IndexCatalog(Transaction.__table__)
+index_advisor = IndexAdvisor(index_catalog)
 
 
 
@@ -127,189 +264,106 @@ async def get_session():
             raise
 
 
-# Improved preprocessing with logging
-async def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
-    """Preprocess the data: convert dates, handle NaNs, and filter invalid rows."""
-    logger.info("Starting data preprocessing.")
-
-    # Convert date columns to datetime
-    date_columns = ['BANKING_DATE', 'ACCOUNT_DATE_CLOSE']
-    for col in date_columns:
-        if col in df.columns:
-            df[col] = pd.to_datetime(df[col], errors='coerce')
-
-    # Replace NaN with None for SQLAlchemy compatibility
-    df = df.where(pd.notnull(df), None)
-
-    # Filter out rows without 'DOC_IDT'
-    df = df[df['DOC_IDT'].notnull()]
-
-    logger.info(f"Preprocessing complete. Valid rows count: {len(df)}.")
-    return df
-
-
-# Enhanced function to fetch existing DOC_IDT values with detailed logging
-async def get_existing_doc_ids(doc_ids: list) -> set:
-    """Fetch existing DOC_IDT values from the database with detailed logging."""
-    logger.info(f"Fetching existing DOC_IDT values for {len(doc_ids)} records from the database.")
-    async with get_session() as session:
+# Read-only API queries: a healthy replica, or the primary's reader pool
+@asynccontextmanager
+async def get_read_session():
+    async with session_router.read_session() as session:
         try:
-            existing_query = select(Transaction.DOC_IDT).where(Transaction.DOC_IDT.in_(doc_ids))
-            result = await session.execute(existing_query)
-            existing_ids = {row[0] for row in result}
-            logger.debug(f"Fetched existing DOC_IDT values: {existing_ids}")
-            return existing_ids
+            yield session
         except Exception as e:
-            logger.error(f"Error fetching existing DOC_IDT values: {e}")
-            return set()
-
-
-# Improved filtering with logging
-def filter_new_records(df: pd.DataFrame, existing_ids: set) -> pd.DataFrame:
-    """Filter out rows with existing DOC_IDT values, with detailed logging."""
-    initial_count = len(df)
-    logger.info(f"Starting filtering process. Initial DataFrame size: {initial_count}.")
+            logger.error(f"Error during read session: {e}")
+            raise
 
-    # Log the type of existing_ids to ensure it's a set of strings
-    logger.info(f"Existing DOC_IDT values fetched from DB: {len(existing_ids)}")
-    logger.debug(f"Type of existing_ids: {type(existing_ids)}")
 
-    # Ensure existing_ids is a set of strings (in case it's not)
-    existing_ids = {str(id) for id in existing_ids}
-    logger.debug(f"Converted existing_ids to string type: {existing_ids}")
+# After an ingest bumps the generation, freshly cached pages must not be built from a lagging replica
+session_router.generation_source = response_cache.generation
 
-    filtered_rows = []
-    for index, row in df.iterrows():
-        doc_id = row['DOC_IDT']
 
-        # Log the type of DOC_IDT to ensure it's a string
-        logger.debug(f"Processing row {index} with DOC_IDT: {doc_id} (Type: {type(doc_id)})")
+# Shared record of which dumps (and how much of each) have been loaded
+ingest_manifest = FileManifest(get_session, IngestedFile.__table__)
 
-        # Ensure DOC_IDT is treated as a string for accurate comparison
-        if isinstance(doc_id, str):
-            doc_id = doc_id.strip()  # Remove any potential leading/trailing whitespace
-            logger.debug(f"Stripped DOC_IDT: {doc_id}")
-        else:
-            logger.warning(f"DOC_IDT in row {index} is not a string, converting to string.")
-            doc_id = str(doc_id)
+# Where reads switch from hot-only to hot + archive, and the job that moves closed months
+archive_boundary = ArchiveBoundary(get_session, ArchivedPeriod.__table__)
+archive_job = ArchiveJob(get_session, Transaction.__table__, transactions_archive, ArchivedPeriod.__table__,
+                         archive_boundary)
 
-        if doc_id in existing_ids:
-            logger.info(f"Skipping existing records...")
-        else:
-            logger.debug(f"New record identified: DOC_IDT={doc_id}, Row={row.to_dict()}")
-            filtered_rows.append(row)
+# Ranked full-text matches, written with each ingest batch and read from the replicas
+search_index = SearchIndex(get_session, get_read_session, transaction_search,
+                           [Transaction.__table__, transactions_archive])
 
-    df_filtered = pd.DataFrame(filtered_rows, columns=df.columns)
-    logger.info(f"Filtered out {initial_count - len(df_filtered)} rows. Remaining rows: {len(df_filtered)}.")
-    return df_filtered
 
+# Seek predicate for keyset pagination on (sort column, DOC_IDT); NULLs sort first ascending and last descending
+def keyset_condition(column, last_value, last_doc_idt: str, sort_order: str = "asc", key=None):
+    key = Transaction.DOC_IDT if key is None else key
+    if column is None or column is key:
+        return key > last_doc_idt if sort_order == "asc" else key < last_doc_idt
 
-# Insert records with logging
-async def insert_unique_records(df: pd.DataFrame):
-    """Insert unique records into the database."""
-    try:
-        records = []
-        # Convert DataFrame rows to TransactionBase models
-        for index, row in df.iterrows():
-            transaction_data = row.to_dict()
-            logger.debug(f"Row {index} data types: {[(k, type(v)) for k, v in transaction_data.items()]}")
-            try:
-                # Create a Pydantic model instance (Validation)
-                try:
-                    transaction = TransactionBase(**transaction_data)
-                except ValidationError as e:
-                    logger.error(f"Validation error for row {index}: {e.errors()}")
-                    continue
-                records.append(transaction.dict())  # Get dictionary representation for insertion
-            except Exception as e:
-                logger.error(f"Error creating Pydantic model for row {index}: {e}")
-                continue
-
-        if not records:
-            logger.warning("No valid records to insert.")
-            return
-
-        logger.debug(f"Preparing to insert records: {records}")
-
-        # Generate the SQL statement
-        stmt = insert(Transaction).values(records)
-        stmt = stmt.on_duplicate_key_update(
-            {col.name: col for col in stmt.inserted}
-        )
-
-        async with get_session() as session:
-            await session.execute(stmt)
-            await session.commit()
-
-        logger.info(f"Inserted {len(records)} new records.")
-    except Exception as e:
-        logger.error(f"Error during unique records insertion: {e}")
+    if sort_order == "asc":
+        if last_value is None:
+            return or_(and_(column.is_(None), key > last_doc_idt), column.isnot(None))
+        return tuple_(column, key) > tuple_(last_value, last_doc_idt)
 
-# Main function with logging and error handling
-async def process_and_insert_data(df: pd.DataFrame):
-    """Main function to process and insert data into the database."""
-    try:
-        logger.info("Starting data insertion process.")
-
-        # Preprocess the data
-        df = await preprocess_data(df)
-        if df.empty:
-            logger.info("No valid records to process. Exiting.")
-            return
-
-        # Get unique DOC_IDT values to check in the database
-        unique_ids = df['DOC_IDT'].unique().tolist()
-        logger.info(f"Extracted {len(unique_ids)} unique DOC_IDT values for deduplication.")
-
-        # Fetch existing DOC_IDT values from the database
-        existing_ids = await get_existing_doc_ids(unique_ids)
-        logger.info(f"Found {len(existing_ids)} existing DOC_IDT values in the database.")
-
-        # Filter out existing records
-        logger.info("Starting record filtering...")
-        df_new = filter_new_records(df, existing_ids)
-        if df_new.empty:
-            logger.info("No new records to insert after filtering. Exiting.")
-            return
-
-        # Insert new records
-        logger.info(f"Inserting {len(df_new)} new records into the database.")
-        await insert_unique_records(df_new)
-        logger.info("Data insertion process completed successfully.")
-    except Exception as e:
-        logger.error(f"Error during the insertion process: {e}")
+    if last_value is None:
+        return and_(column.is_(None), key < last_doc_idt)
+    return or_(tuple_(column, key) < tuple_(last_value, last_doc_idt), column.is_(None))
 
 
-# Function to fetch data from the database (remains unchanged)
+# Function to fetch data from the database
 async def fetch_transactions(
         skip: int,
         limit: int,
         filter_by: str = None,
         filter_value: str = None,
         sort_by: str = None,
-        sort_order: str = "asc"
-) -> list[Transaction]:
+        sort_order: str = "asc",
+        after: tuple = None,
+        fields: list = None,
+        where: QuerySpec = None
+) -> list:
+    """Fetch a page of transactions.
+
+    Pages are ordered by sort_by with DOC_IDT as tiebreaker. Passing after=(last sort value, last DOC_IDT)
+    seeks past the previous page instead of skipping rows, so page cost does not grow with depth.
+    `where` adds ANDed predicates (equality, in, ranges, prefix) to the filter_by/filter_value equality.
+    With fields, only those columns (plus DOC_IDT and sort_by, needed for cursors) are selected and plain
+    Core rows are returned instead of Transaction entities. Pages that can reach archived BANKING_DATE months
+    read the hot and archive tables together and also return Core rows.
+    """
     try:
-        query = select(Transaction).offset(skip).limit(limit)
-
-        # Apply filtering if requested
-        if filter_by and filter_value:
-            filter_condition = getattr(Transaction, filter_by) == filter_value
-            query = query.where(filter_condition)
-
-        # Apply sorting if requested
-        if sort_by:
-            if sort_order == "asc":
-                query = query.order_by(getattr(Transaction, sort_by).asc())
-            else:
-                query = query.order_by(getattr(Transaction, sort_by).desc())
+        spec = QuerySpec.parse(None, Transaction.__table__, filter_by, filter_value)
+        if where is not None:
+            spec = QuerySpec(spec.predicates + where.predicates)
+        lower_date = spec.lower_bound("BANKING_DATE")
+        history = needs_archive(await archive_boundary.get(), sort_by=sort_by, sort_order=sort_order, after=after,
+                                date_field="BANKING_DATE", date_from=lower_date)
+
+        if fields or history:
+            names = list(dict.fromkeys([*(fields or []), "DOC_IDT", *([sort_by] if sort_by else [])]))
+            if not fields:
+                names = [col.name for col in Transaction.__table__.columns]
+        else:
+            names = None
+
+        # Built once per shape; values, the seek position and limit/offset are bound on every execution
+        shape = ("history" if history else "hot", tuple(names or ()), spec.shape, sort_by, sort_order, bool(skip),
+                 _after_shape(after))
+        if history:
+            query = statement_cache.get(
+                shape, lambda: history_page_query(names, spec, sort_by, sort_order, after, bool(skip))
+            )
+        else:
+            query = statement_cache.get(shape, lambda: _hot_page_query(names, spec, sort_by, sort_order, after, bool(skip)))
+        params = {**spec.params(), **_page_params(skip, limit, after)}
 
         # Execution of the query
-        async with get_session() as session:
-            result = await session.execute(query)
-            transactions = result.scalars().all()
-
-        logger.info(f"Fetched {len(transactions)} transactions from the database.")
+        started = time.perf_counter()
+        async with get_read_session() as session:
+            result = await session.execute(query, params)
+            transactions = result.all() if names else result.scalars().all()
+        index_advisor.record(spec.index_column, sort_by, (time.perf_counter() - started) * 1000)
+
+        source = "the hot and archive tables" if history else "the database"
+        logger.info(f"Fetched {len(transactions)} transactions from {source}.")
         return transactions
 
     except Exception as e:
@@ -317,11 +371,147 @@ async def fetch_transactions(
         return []
 
 
-# Function to process and load data from CSV file
-async def process_and_load_data(file_path):
-    df = parse_csv(file_path)
-    if not df.empty:
-        deduplicated_df = await deduplicate_data(df, engine)
-        await process_and_insert_data(deduplicated_df)
-    else:
-        logger.warning("Parsed DataFrame is empty. Skipping insertion.")
+# The seek predicate's form depends on whether there is a previous row and whether its sort value is NULL
+def _after_shape(after: tuple):
+    if after is None:
+        return None
+    return "null" if after[0] is None else "value"
+
+
+def _page_params(skip: int, limit: int, after: tuple) -> dict:
+    params = {"page_limit": limit, "branch_limit": skip + limit}
+    if skip:
+        params["page_offset"] = skip
+    if after is not None:
+        params["after_value"], params["after_key"] = after
+    return params
+
+
+def _hot_page_query(names, spec: QuerySpec, sort_by, sort_order, after, skip: bool):
+    table = Transaction.__table__
+    columns = [table.c[name] for name in names] if names else [Transaction]
+    query = _table_page_query(table, columns, spec, sort_by, sort_order, after, "page_limit")
+    return query.offset(bindparam("page_offset", type_=Integer)) if skip else query
+
+
+# One page ordered by sort_by then DOC_IDT from a single table, seeking past `after`
+def _table_page_query(table, columns: list, spec: QuerySpec, sort_by, sort_order, after, limit_param: str):
+    query = select(*columns).where(*spec.conditions(table)).limit(bindparam(limit_param, type_=Integer))
+    sort_column = table.c[sort_by] if sort_by else None
+    if after is not None:
+        last_value = None if after[0] is None else bindparam("after_value", type_=sort_column.type)
+        query = query.where(keyset_condition(sort_column, last_value, bindparam("after_key", type_=String),
+                                             sort_order, key=table.c.DOC_IDT))
+    return query.order_by(*_page_order(table, sort_by, sort_order))
+
+
+def _page_order(table, sort_by, sort_order) -> list:
+    columns = [table.c[sort_by], table.c.DOC_IDT] if sort_by and sort_by != "DOC_IDT" else [table.c.DOC_IDT]
+    return [col.asc() if sort_order == "asc" else col.desc() for col in columns]
+
+
+# A page over hot and archived rows: each table yields its own first skip + limit rows through its indexes,
+# and only those are merged and re-sorted, so the cost follows the page size rather than the archive size
+def history_page_query(names: list, spec: QuerySpec, sort_by=None, sort_order: str = "asc", after: tuple = None,
+                       skip: bool = False):
+    branches = [
+        _table_page_query(table, [table.c[name] for name in names], spec, sort_by, sort_order, after,
+                          "branch_limit").subquery()
+        for table in (Transaction.__table__, transactions_archive)
+    ]
+    history = union_all(*(select(*branch.c) for branch in branches)).subquery("history")
+    query = select(*history.c).order_by(*_page_order(history, sort_by, sort_order))
+    query = query.limit(bindparam("page_limit", type_=Integer))
+    return query.offset(bindparam("page_offset", type_=Integer)) if skip else query
+
+
+# Settlement totals answered from the rollup table
+async def fetch_settlement_summary(
+        date_from=None,
+        date_to=None,
+        filters: dict = None,
+        group_by: list = None
+) -> list[dict]:
+    """Sum TXN_COUNT and SETTL_AMOUNT_SUM over the rollups, grouped by the requested dimensions."""
+    group_by = group_by or list(ROLLUP_DIMENSIONS)
+    dimensions = [getattr(SettlementRollup, name) for name in group_by]
+    query = select(
+        *dimensions,
+        func.sum(SettlementRollup.TXN_COUNT).label("TXN_COUNT"),
+        func.sum(SettlementRollup.SETTL_AMOUNT_SUM).label("SETTL_AMOUNT_SUM"),
+    ).group_by(*dimensions).order_by(*dimensions)
+
+    if date_from:
+        query = query.where(SettlementRollup.SETTLEMENT_DATE >= date_from)
+    if date_to:
+        query = query.where(SettlementRollup.SETTLEMENT_DATE <= date_to)
+    for name, value in (filters or {}).items():
+        if value is not None:
+            query = query.where(getattr(SettlementRollup, name) == value)
+
+    async with get_read_session() as session:
+        result = await session.execute(query)
+        rows = [dict(row._mapping) for row in result]
+
+    # Report the "no value" placeholders stored in rollup keys as nulls again
+    for row in rows:
+        for name in group_by:
+            if row[name] == ROLLUP_DIMENSIONS[name]:
+                row[name] = None
+    return rows
+
+
+# Ranked search results with their transactions, looked up by DOC_IDT in the hot and archive tables
+async def search_transactions(terms: list, skip: int, limit: int, fields: list = None) -> list:
+    """(score, row) pairs for the matches ranked skip .. skip + limit; rows hold `fields` (default: every column)."""
+    try:
+        started = time.perf_counter()
+        ranked = await search_index.search(terms, skip, limit)
+        if not ranked:
+            return []
+        doc_ids = [doc_id for doc_id, _ in ranked]
+        names = list(dict.fromkeys([*(fields or [col.name for col in Transaction.__table__.columns]), "DOC_IDT"]))
+        rows = {}
+        async with get_read_session() as session:
+            for table in (Transaction.__table__, transactions_archive):
+                query = select(*(table.c[name] for name in names)).where(table.c.DOC_IDT.in_(doc_ids))
+                rows.update((row.DOC_IDT, row) for row in await session.execute(query))
+        logger.info(f"Search for {terms} returned {len(ranked)} matches in "
+                    f"{(time.perf_counter() - started) * 1000:.0f}ms.")
+        return [(score, rows[doc_id]) for doc_id, score in ranked if doc_id in rows]
+    except Exception as e:
+        logger.error(f"Error searching transactions: {e}")
+        return []
+
+
+# Stream rows for bulk export through a server-side cursor, one partition at a time
+async def stream_transactions(
+        filter_by: str = None,
+        filter_value: str = None,
+        date_field: str = None,
+        date_from=None,
+        date_to=None,
+        partition_size: int = EXPORT_PARTITION_SIZE
+):
+    """Yield lists of plain row tuples in Transaction column order, never holding more than one partition.
+
+    Hot rows come first, then archived ones when the range can reach archived BANKING_DATE months.
+    """
+    tables = [Transaction.__table__]
+    boundary = await archive_boundary.get()
+    if needs_archive(boundary, filter_by, filter_value, date_field=date_field, date_from=date_from):
+        tables.append(transactions_archive)
+
+    for table in tables:
+        query = select(*table.columns).execution_options(yield_per=partition_size)
+        if filter_by and filter_value:
+            query = query.where(table.c[filter_by] == filter_value)
+        if date_field and date_from:
+            query = query.where(table.c[date_field] >= date_from)
+        if date_field and date_to:
+            query = query.where(table.c[date_field] <= date_to)
+
+        async with get_read_session() as session:
+            result = await session.stream(query)
+            async for partition in result.partitions(partition_size):
+                yield partition
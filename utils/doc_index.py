@@ -0,0 +1,312 @@
+#utils/doc_index.py
+import asyncio
+import logging
+import math
+import os
+import threading
+import time
+
+import numpy as np
+import pandas as pd
+from sqlalchemy.sql import bindparam, text
+
+from utils.env import load_env
+from utils.file_lock import FileLock
+from utils.offload import run_blocking
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Bloom filter sizing and on-disk location (<path>.npz holds the bits, <path>.journal the keys added since).
+# Every instance that ingests must use the same files, so each sees the keys the others commit
+DOC_INDEX_PATH = os.getenv("DOC_INDEX_PATH", "data/doc_idt_index")
+DOC_INDEX_CAPACITY = int(os.getenv("DOC_INDEX_CAPACITY", 20_000_000))
+DOC_INDEX_ERROR_RATE = float(os.getenv("DOC_INDEX_ERROR_RATE", 0.01))
+
+# Bloom candidates confirmed per IN (...) round trip, and rows per partition when rebuilding
+EXACT_CHECK_BATCH = 5000
+REBUILD_PARTITION = 100_000
+
+# Second key for double hashing; hash_pandas_object needs exactly 16 bytes
+SECOND_HASH_KEY = "momo-doc-idt-idx"
+INDEX_FORMAT_VERSION = 1
+
+# Bits set in each byte value
+BITS_SET = np.array([bin(value).count("1") for value in range(256)], dtype=np.uint8)
+
+
+def normalize_doc_ids(doc_ids) -> pd.Series:
+    """DOC_IDT values as stripped strings, the form used for every membership test."""
+    return pd.Series(doc_ids, dtype=object).astype(str).str.strip()
+
+
+# Fixed-size Bloom filter over string keys, hashed vectorised with pandas
+class BloomFilter:
+    def __init__(self, bits: np.ndarray, hashes: int, count: int = 0):
+        self.bits = bits
+        self.size = len(bits) * 8
+        self.hashes = hashes
+        self.count = count
+
+    @classmethod
+    def with_capacity(cls, capacity: int, error_rate: float) -> "BloomFilter":
+        size = math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2)
+        hashes = max(1, round(size / capacity * math.log(2)))
+        return cls(np.zeros(math.ceil(size / 8), dtype=np.uint8), hashes)
+
+    def _positions(self, keys: pd.Series) -> np.ndarray:
+        first = pd.util.hash_pandas_object(keys, index=False).to_numpy()
+        second = pd.util.hash_pandas_object(keys, index=False, hash_key=SECOND_HASH_KEY).to_numpy()
+        rounds = np.arange(self.hashes, dtype=np.uint64)
+        with np.errstate(over="ignore"):
+            return (first[:, None] + rounds[None, :] * second[:, None]) % np.uint64(self.size)
+
+    def add(self, keys: pd.Series):
+        """Set the bits of keys; count only grows by the keys that were not already (apparently) present."""
+        keys = keys.drop_duplicates()
+        if len(keys) == 0:
+            return
+        positions = self._positions(keys)
+        # A false positive is not counted, so count slightly undershoots; it only sizes and reports the filter
+        present = self._hits(positions)
+        positions = positions.ravel()
+        np.bitwise_or.at(self.bits, positions >> np.uint64(3), (1 << (positions & np.uint64(7))).astype(np.uint8))
+        self.count += int(len(keys) - present.sum())
+
+    def merge(self, other: "BloomFilter"):
+        """Set every bit other has set; both must have the same size and hash count."""
+        np.bitwise_or(self.bits, other.bits, out=self.bits)
+        # Keys in both cannot be told apart, so the union's count is estimated from the share of bits set
+        set_bits = int(BITS_SET[self.bits].sum(dtype=np.int64))
+        estimate = round(-self.size / self.hashes * math.log(1 - set_bits / self.size)) if set_bits < self.size else 0
+        self.count = max(self.count, other.count, estimate)
+
+    def might_contain(self, keys: pd.Series) -> np.ndarray:
+        if len(keys) == 0:
+            return np.zeros(0, dtype=bool)
+        return self._hits(self._positions(keys))
+
+    def _hits(self, positions: np.ndarray) -> np.ndarray:
+        hits = (self.bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1
+        return hits.all(axis=1)
+
+
+# Incrementally maintained DOC_IDT membership index: Bloom filter in front of an exact DB check.
+# Processes sharing the files write them under <path>.lock, and fold in each other's writes before every lookup
+class DocIdIndex:
+    def __init__(self, path: str = DOC_INDEX_PATH, capacity: int = DOC_INDEX_CAPACITY,
+                 error_rate: float = DOC_INDEX_ERROR_RATE, tables: tuple = ("transactions", "transactions_archive")):
+        self.path = path
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.tables = tables  # every table a stored DOC_IDT can be in (hot, then archived)
+        self._bloom = None
+        self._lock = asyncio.Lock()
+        self._mutex = threading.Lock()  # one thread at a time changes the filter's bits
+        self._disk_state = None  # the bits file last folded into the filter (see _file_state)
+        self._journal_position = 0  # journal bytes already folded into the filter
+
+    @property
+    def bloom_path(self) -> str:
+        return f"{self.path}.npz"
+
+    @property
+    def journal_path(self) -> str:
+        return f"{self.path}.journal"
+
+    def _file_lock(self, shared: bool = False):
+        return FileLock(f"{self.path}.lock", shared)
+
+    async def ensure_loaded(self, engine):
+        """Load the index from disk, or rebuild it from the database when it is missing or unusable."""
+        if self._bloom is not None:
+            return
+        async with self._lock:
+            if self._bloom is not None:
+                return
+            bloom = await run_blocking(self._read)
+            if bloom is None:
+                await self.rebuild(engine)
+            else:
+                self._bloom = bloom
+
+    def _read(self):
+        with self._file_lock(shared=True):
+            state = _file_state(self.bloom_path)
+            bloom = self._read_bits()
+            if bloom is None:
+                return None
+            keys, position = self._read_journal(0)
+        bloom.add(keys)
+
+        if bloom.count > self.capacity:
+            logger.warning(f"DOC_IDT index holds {bloom.count} keys, over its capacity {self.capacity}; rebuilding.")
+            self.capacity = 2 * bloom.count
+            return None
+        self._disk_state, self._journal_position = state, position
+        logger.info(f"Loaded DOC_IDT index with {bloom.count} keys from {self.bloom_path}.")
+        return bloom
+
+    def _read_bits(self):
+        if not os.path.exists(self.bloom_path):
+            return None
+        try:
+            with np.load(self.bloom_path) as stored:
+                if int(stored["version"]) != INDEX_FORMAT_VERSION:
+                    logger.warning("DOC_IDT index format changed; rebuilding.")
+                    return None
+                return BloomFilter(stored["bits"].copy(), int(stored["hashes"]), int(stored["count"]))
+        except Exception as e:
+            logger.error(f"Unreadable DOC_IDT index at {self.bloom_path}: {e}")
+            return None
+
+    async def rebuild(self, engine):
+        """Stream every DOC_IDT from the database into a fresh filter, swap it in and persist it.
+
+        The filter being built is only swapped in once complete, so lookups meanwhile still use the old one.
+        """
+        started = time.perf_counter()
+        disk_state = await run_blocking(_file_state, self.bloom_path)
+        bloom = BloomFilter.with_capacity(self.capacity, self.error_rate)
+        async with engine.connect() as conn:
+            for table in self.tables:
+                result = await conn.stream(text(f"SELECT DOC_IDT FROM {table}"))
+                async for partition in result.partitions(REBUILD_PARTITION):
+                    await run_blocking(bloom.add, normalize_doc_ids([row[0] for row in partition]))
+
+        # Keys committed while the tables were being read reached the journal, if not the query; folded under the
+        # mutex, so no append lands between the fold and the swap
+        def swap_in():
+            with self._mutex:
+                with self._file_lock(shared=True):
+                    keys, position = self._read_journal(0)
+                bloom.add(keys)
+                self._bloom, self._disk_state, self._journal_position = bloom, disk_state, position
+
+        await run_blocking(swap_in)
+        await run_blocking(self.compact, False)
+        logger.info(f"Rebuilt DOC_IDT index with {bloom.count} keys in {time.perf_counter() - started:.2f}s.")
+
+    async def existing(self, doc_ids, engine) -> set:
+        """Return the subset of doc_ids already stored; only Bloom positives reach the database."""
+        await self.ensure_loaded(engine)
+        await run_blocking(self.refresh)
+        keys = normalize_doc_ids(doc_ids).drop_duplicates()
+        candidates = keys[await run_blocking(self._bloom.might_contain, keys)].tolist()
+
+        existing = set()
+        async with engine.connect() as conn:
+            # Only the candidates a table has not already confirmed are looked up in the next one
+            remaining = candidates
+            for table in self.tables:
+                query = text(f"SELECT DOC_IDT FROM {table} WHERE DOC_IDT IN :ids").bindparams(
+                    bindparam("ids", expanding=True)
+                )
+                for i in range(0, len(remaining), EXACT_CHECK_BATCH):
+                    result = await conn.execute(query, {"ids": remaining[i:i + EXACT_CHECK_BATCH]})
+                    existing.update(str(row[0]).strip() for row in result)
+                remaining = [key for key in remaining if key not in existing]
+        logger.info(f"DOC_IDT index: {len(keys)} keys checked, {len(candidates)} candidates, {len(existing)} existing.")
+        return existing
+
+    def refresh(self):
+        """Fold in what other processes wrote since the filter last looked: a newer bits file, then journal keys."""
+        if self._bloom is None:
+            return
+        if _file_state(self.bloom_path) == self._disk_state and _file_size(self.journal_path) == self._journal_position:
+            return
+        with self._mutex, self._file_lock(shared=True):
+            self._fold_disk()
+
+    def add(self, doc_ids):
+        """Record keys from a committed batch, in memory and in the on-disk journal."""
+        keys = normalize_doc_ids(doc_ids)
+        with self._mutex:
+            # Journaled even before the filter exists: a rebuild in progress folds the journal in when it swaps
+            with self._file_lock():
+                if self._bloom is not None:
+                    # Other processes' keys first, so the position after this append covers everything before it
+                    self._fold_disk()
+                    self._bloom.add(keys)
+                with open(self.journal_path, "ab") as journal:
+                    journal.write("".join(f"{key}\n" for key in keys).encode())
+                    position = journal.tell()
+                if self._bloom is not None:
+                    self._journal_position = position
+
+    async def record(self, doc_ids):
+        """add, off the event loop; the BulkLoader on_commit hook."""
+        await run_blocking(self.add, doc_ids)
+
+    def compact(self, adopt_resized: bool = True):
+        """Write the filter to disk atomically, with every key other processes have added, and empty the journal."""
+        if self._bloom is None:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with self._mutex, self._file_lock():
+            # Other processes' journal keys are only in the file about to be emptied
+            self._fold_disk(adopt_resized)
+            temp_path = f"{self.path}.tmp.npz"
+            np.savez(temp_path, bits=self._bloom.bits, hashes=self._bloom.hashes, count=self._bloom.count,
+                     version=INDEX_FORMAT_VERSION)
+            os.replace(temp_path, self.bloom_path)
+            self._truncate_journal()
+            self._disk_state, self._journal_position = _file_state(self.bloom_path), 0
+
+    # Fold the bits file (when another process has replaced it) and the unread journal into the filter.
+    # Callers hold self._mutex and the file lock
+    def _fold_disk(self, adopt_resized: bool = True):
+        state = _file_state(self.bloom_path)
+        if state is not None and state != self._disk_state:
+            stored = self._read_bits()
+            if stored is None:
+                pass
+            elif stored.bits.shape == self._bloom.bits.shape and stored.hashes == self._bloom.hashes:
+                self._bloom.merge(stored)
+            elif adopt_resized:
+                # Another process rebuilt the index at a new size from the database and the journal
+                logger.info(f"DOC_IDT index was rebuilt elsewhere with {stored.count} keys; using it.")
+                self._bloom = stored
+            else:
+                logger.warning("DOC_IDT index was rewritten at another size during the rebuild; "
+                               "keeping the rebuilt one.")
+            self._disk_state = state
+            self._journal_position = 0  # the journal was emptied when that file was written
+        keys, self._journal_position = self._read_journal(self._journal_position)
+        self._bloom.add(keys)
+
+    def _read_journal(self, position: int):
+        """Journal keys from byte position on, and the position after them."""
+        try:
+            with open(self.journal_path, "rb") as journal:
+                journal.seek(position)
+                data = journal.read()
+        except FileNotFoundError:
+            return pd.Series([], dtype=object), 0
+        keys = [line.strip() for line in data.decode().splitlines() if line.strip()]
+        return pd.Series(keys, dtype=object), position + len(data)
+
+    def _truncate_journal(self):
+        if os.path.exists(self.journal_path):
+            open(self.journal_path, "w").close()
+
+
+# Identifies one version of a file: compaction replaces the bits file, so its inode changes
+def _file_state(path: str):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_ino, stat.st_mtime_ns, stat.st_size
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path)
+    except FileNotFoundError:
+        return 0
+
+
+doc_index = DocIdIndex()
@@ -0,0 +1,17 @@
+#utils/env.py
+import os
+
+from dotenv import load_dotenv
+
+# Specify the path to the .env file
+DOTENV_PATH = os.getenv("DOTENV_PATH", "myenv/.env")
+
+_loaded = False
+
+
+# Every module calls this before reading its settings; only the first call in a process reads the file
+def load_env():
+    global _loaded
+    if not _loaded:
+        load_dotenv(DOTENV_PATH)
+        _loaded = True
@@ -1,29 +1,44 @@
 #utils/fetch_files.py
-from dotenv import load_dotenv
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
+from utils.env import load_env
 
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 import os
 import logging
 import shutil
-import pandas as pd
+
+from utils.metrics import ingest_stage
+from utils.offload import run_blocking
 
 #Local Path and Repository path
 
 LOCAL_PATH = os.getenv("LOCAL_PATH", "app/MOMORW_TRANSACTION_DUMP_20241031.csv")
-LOCAL_SAVE_PATH = os.getenv("LOCAL_SAVE_PATH", "app/data/")
+# Copies land where the ingest scheduler looks for dumps unless a separate path is set
+LOCAL_SAVE_PATH = os.getenv("LOCAL_SAVE_PATH", os.getenv("INGEST_DIR", "data"))
 
 #Function to fetch files from the repository
 async def fetch_files():
     try:
         os.makedirs(LOCAL_SAVE_PATH, exist_ok=True)
-        shutil.copy(LOCAL_PATH, LOCAL_SAVE_PATH)
+        target = os.path.join(LOCAL_SAVE_PATH, os.path.basename(LOCAL_PATH))
+        if _same_file_state(LOCAL_PATH, target):
+            logging.info(f"{LOCAL_PATH} is unchanged since the last copy; skipping.")
+            return
+        # copy2 keeps the source mtime, so the ingest manifest sees an unchanged copy as unchanged
+        with ingest_stage("fetch_files") as stage:
+            await run_blocking(shutil.copy2, LOCAL_PATH, target)
+            stage.bytes_read = os.path.getsize(target)
         logging.info(f"File successfully copied from {LOCAL_PATH} to {LOCAL_SAVE_PATH}")
     except FileNotFoundError:
         logging.error(f"File not found at {LOCAL_PATH}")
     except Exception as e:
         logging.error(f"Failed to fetch and process file: {e}")
 
+
+#Same size and modification time on both sides
+def _same_file_state(source, target):
+    if not os.path.exists(target):
+        return False
+    source_stat, target_stat = os.stat(source), os.stat(target)
+    return source_stat.st_size == target_stat.st_size and source_stat.st_mtime == target_stat.st_mtime
@@ -0,0 +1,28 @@
+#utils/file_lock.py
+import os
+
+try:
+    import fcntl
+except ImportError:  # Windows: only in-process locks apply
+    fcntl = None
+
+
+# Advisory flock on a side file, taken by every process (worker or instance on the same volume) using one data file
+class FileLock:
+    def __init__(self, path: str, shared: bool = False):
+        self.path = path
+        self.shared = shared  # readers may hold it together; an exclusive holder waits for them all
+        self._file = None
+
+    def __enter__(self):
+        if fcntl is not None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            self._file = open(self.path, "a")
+            fcntl.flock(self._file, fcntl.LOCK_SH if self.shared else fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        if self._file is not None:
+            fcntl.flock(self._file, fcntl.LOCK_UN)
+            self._file.close()
+            self._file = None
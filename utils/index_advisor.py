@@ -0,0 +1,88 @@
+#utils/index_advisor.py
+import logging
+import os
+from collections import defaultdict
+
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Queries slower than this are recorded by the advisor
+SLOW_QUERY_MS = float(os.getenv("SLOW_QUERY_MS", 200))
+
+
+# Which filter/sort combinations a table's declared indexes can serve without a scan or filesort
+class IndexCatalog:
+    def __init__(self, table):
+        self.table = table
+        # InnoDB secondary indexes end with the primary key, so (a, b) really orders rows by (a, b, pk)
+        primary_key = [col.name for col in table.primary_key.columns]
+        self.prefixes = [primary_key]
+        for index in table.indexes:
+            self.prefixes.append([col.name for col in index.columns] + primary_key)
+
+    @property
+    def sortable_columns(self) -> list:
+        """Columns that can be sorted on over the whole table."""
+        return sorted({prefix[0] for prefix in self.prefixes})
+
+    def is_indexed(self, column: str) -> bool:
+        """True when some index leads with column, so `column = ?` does not scan the table."""
+        return any(prefix[0] == column for prefix in self.prefixes)
+
+    def supports(self, filter_by: str = None, sort_by: str = None) -> bool:
+        """True when an index yields the rows for `filter_by = ?` already ordered by (sort_by, primary key)."""
+        primary_key = self.prefixes[0][0]
+        # With the filter column pinned by equality, sorting on it leaves only the primary key tiebreak
+        if not sort_by or sort_by == filter_by:
+            sort_by = primary_key
+        for prefix in self.prefixes:
+            columns = prefix
+            if filter_by:
+                if prefix[0] != filter_by:
+                    continue
+                columns = prefix[1:]
+            if columns and columns[0] == sort_by:
+                return True
+        return False
+
+
+# Records slow filter/sort shapes seen in traffic so indexes can be added based on data
+class IndexAdvisor:
+    def __init__(self, catalog: IndexCatalog, slow_query_ms: float = SLOW_QUERY_MS):
+        self.catalog = catalog
+        self.slow_query_ms = slow_query_ms
+        self.slow_shapes = defaultdict(lambda: {"count": 0, "total_ms": 0.0, "max_ms": 0.0})
+
+    def record(self, filter_by: str, sort_by: str, elapsed_ms: float):
+        if elapsed_ms < self.slow_query_ms:
+            return
+        shape = (filter_by, sort_by)
+        stats = self.slow_shapes[shape]
+        stats["count"] += 1
+        stats["total_ms"] += elapsed_ms
+        stats["max_ms"] = max(stats["max_ms"], elapsed_ms)
+        indexed = self.catalog.supports(filter_by, sort_by)
+        logger.warning(
+            f"Slow query shape filter_by={filter_by} sort_by={sort_by}: {elapsed_ms:.0f}ms "
+            f"({'index-backed' if indexed else 'no supporting index'}, seen {stats['count']} times)."
+        )
+
+    def report(self) -> list:
+        """Slow shapes, worst first, each flagged with whether an index already backs it."""
+        rows = [
+            {"filter_by": filter_by, "sort_by": sort_by, "indexed": self.catalog.supports(filter_by, sort_by),
+             "count": stats["count"], "avg_ms": stats["total_ms"] / stats["count"], "max_ms": stats["max_ms"]}
+            for (filter_by, sort_by), stats in self.slow_shapes.items()
+        ]
+        return sorted(rows, key=lambda row: row["count"] * row["avg_ms"], reverse=True)
+
+    def log_report(self, top: int = 10):
+        for row in self.report()[:top]:
+            if not row["indexed"]:
+                columns = ", ".join(col for col in (row["filter_by"], row["sort_by"]) if col)
+                logger.info(f"Index candidate ({columns}): {row['count']} slow queries, "
+                            f"avg {row['avg_ms']:.0f}ms, max {row['max_ms']:.0f}ms.")
@@ -0,0 +1,241 @@
+#utils/ingest.py
+"""The ingestion path: preprocess, deduplicate and upsert cleaned frames. Imported lazily, since it pulls in pandas."""
+import logging
+import time
+
+import pandas as pd
+
+from utils.bulk_load import BulkLoader, BulkLoadReport, BULK_BATCH_SIZE, chain_hooks
+from utils.cache import response_cache
+from utils.db_errors import ABORT_ERRORS
+from utils.db_operations import SettlementRollup, Transaction, engine, get_session, transaction_search
+from utils.doc_index import doc_index
+from utils.metrics import ingest_stage
+from utils.offload import run_blocking
+from utils.parse_transform import deduplicate_data, CHUNK_SIZE
+from utils.rollups import SettlementRollupMaintainer
+from utils.search import SearchIndexMaintainer
+from utils.staging_cache import staging_cache, LOAD_COLUMNS
+from utils.validation import validate_frame, frame_to_records
+
+logger = logging.getLogger(__name__)
+
+# Folds every committed ingest batch into the settlement rollups
+rollup_maintainer = SettlementRollupMaintainer(SettlementRollup.__table__, Transaction.__table__)
+
+# Keeps the full-text search documents in step with every committed ingest batch
+search_maintainer = SearchIndexMaintainer(transaction_search)
+
+
+# Improved preprocessing with logging
+async def preprocess_data(df: pd.DataFrame) -> pd.DataFrame:
+    """Preprocess the data: convert dates, handle NaNs, and filter invalid rows."""
+    logger.info("Starting data preprocessing.")
+    with ingest_stage("preprocess_data", rows_in=len(df)) as stage:
+        df = await run_blocking(_preprocess_frame, df)
+        stage.rows_out = len(df)
+        stage.rejected = stage.rows_in - len(df)
+    logger.info(f"Preprocessing complete. Valid rows count: {len(df)}.")
+    return df
+
+
+def _preprocess_frame(df: pd.DataFrame) -> pd.DataFrame:
+    # Convert date columns to datetime
+    date_columns = ['BANKING_DATE', 'ACCOUNT_DATE_CLOSE']
+    for col in date_columns:
+        if col in df.columns:
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+
+    # Replace NaN with None for SQLAlchemy compatibility
+    df = df.where(pd.notnull(df), None)
+
+    # Filter out rows without 'DOC_IDT'
+    return df[df['DOC_IDT'].notnull()]
+
+
+# Existing DOC_IDT values among doc_ids, answered by the DOC_IDT index with an exact check on its positives
+async def get_existing_doc_ids(doc_ids: list) -> set:
+    """Fetch the DOC_IDT values among doc_ids that are already stored."""
+    logger.info(f"Fetching existing DOC_IDT values for {len(doc_ids)} records.")
+    with ingest_stage("get_existing_doc_ids", rows_in=len(doc_ids)) as stage:
+        try:
+            existing = await doc_index.existing(doc_ids, engine)
+        except ABORT_ERRORS:
+            raise
+        except Exception as e:
+            logger.error(f"Error fetching existing DOC_IDT values: {e}")
+            existing = set()
+        stage.rows_out = len(existing)
+    return existing
+
+
+# Vectorised filtering: anti-join on the normalised DOC_IDT column
+def filter_new_records(df: pd.DataFrame, existing_ids: set) -> pd.DataFrame:
+    """Filter out rows whose DOC_IDT (stripped, as a string) is already in existing_ids."""
+    initial_count = len(df)
+    logger.info(f"Starting filtering process. Initial DataFrame size: {initial_count}.")
+    logger.info(f"Existing DOC_IDT values fetched from DB: {len(existing_ids)}")
+
+    with ingest_stage("filter_new_records", rows_in=initial_count) as stage:
+        # Compare as stripped strings on both sides, whatever dtype the column was parsed with
+        existing_ids = {str(doc_id) for doc_id in existing_ids}
+        doc_ids = df['DOC_IDT'].astype(str).str.strip()
+
+        df_filtered = df[~doc_ids.isin(existing_ids)]
+        stage.rows_out = len(df_filtered)
+    logger.info(f"Filtered out {initial_count - len(df_filtered)} rows. Remaining rows: {len(df_filtered)}.")
+    return df_filtered
+
+
+# Insert records with logging
+async def insert_unique_records(df: pd.DataFrame, batch_size: int = BULK_BATCH_SIZE) -> BulkLoadReport:
+    """Validate rows column by column and upsert them in batches, returning inserted/updated/rejected counts."""
+    report = BulkLoadReport()
+    with ingest_stage("insert_unique_records", rows_in=len(df)) as stage:
+        try:
+            valid, rejected = await run_blocking(validate_frame, df)
+            for doc_id, reason in rejected.itertuples(index=False):
+                report.reject(doc_id, reason)
+            if len(rejected):
+                logger.error(f"Validation rejected {len(rejected)} rows, e.g. {rejected.head(5).to_dict('records')}")
+
+            if valid.empty:
+                logger.warning("No valid records to insert.")
+            else:
+                loader = BulkLoader(get_session, Transaction.__table__, batch_size=batch_size,
+                                    before_write=chain_hooks(rollup_maintainer, search_maintainer),
+                                    on_commit=doc_index.record)
+                report.merge(await loader.load(await run_blocking(frame_to_records, valid)))
+                logger.info(f"Upserted {report.inserted + report.updated} records ({report}).")
+        except ABORT_ERRORS:
+            raise
+        except Exception as e:
+            logger.error(f"Error during unique records insertion: {e}")
+        stage.rows_out = report.inserted + report.updated
+        stage.rejected = report.rejected
+    return report
+
+# Main function with logging and error handling
+async def process_and_insert_data(df: pd.DataFrame) -> BulkLoadReport:
+    """Main function to process and insert data into the database."""
+    report = BulkLoadReport()
+    try:
+        logger.info("Starting data insertion process.")
+
+        # Preprocess the data
+        df = await preprocess_data(df)
+        if df.empty:
+            logger.info("No valid records to process. Exiting.")
+            return report
+
+        # Get unique DOC_IDT values to check in the database
+        unique_ids = df['DOC_IDT'].unique().tolist()
+        logger.info(f"Extracted {len(unique_ids)} unique DOC_IDT values for deduplication.")
+
+        # Fetch existing DOC_IDT values from the database
+        existing_ids = await get_existing_doc_ids(unique_ids)
+        logger.info(f"Found {len(existing_ids)} existing DOC_IDT values in the database.")
+
+        # Filter out existing records
+        logger.info("Starting record filtering...")
+        df_new = await run_blocking(filter_new_records, df, existing_ids)
+        if df_new.empty:
+            logger.info("No new records to insert after filtering. Exiting.")
+            return report
+
+        # Insert new records
+        logger.info(f"Inserting {len(df_new)} new records into the database.")
+        report = await insert_unique_records(df_new)
+        logger.info("Data insertion process completed successfully.")
+    except ABORT_ERRORS:
+        # The database is unreachable or unusable: the caller must not record these rows as loaded
+        raise
+    except Exception as e:
+        logger.error(f"Error during the insertion process: {e}")
+    return report
+
+
+# Function to process and load data from CSV file
+async def process_and_load_data(file_path, chunk_size=CHUNK_SIZE) -> BulkLoadReport:
+    """Load a dump into the database, streaming it in chunks when chunk_size is set (0 loads it whole)."""
+    if chunk_size:
+        return await process_and_load_data_chunked(file_path, chunk_size)
+
+    report = BulkLoadReport()
+    df = await run_blocking(staging_cache.load_frame, file_path, LOAD_COLUMNS)
+    if not df.empty:
+        deduplicated_df = await deduplicate_data(df, engine)
+        report = await process_and_insert_data(deduplicated_df)
+        if report.inserted or report.updated:
+            await response_cache.bump_generation()
+    else:
+        logger.warning("Parsed DataFrame is empty. Skipping insertion.")
+    await run_blocking(doc_index.compact)
+    logger.info(f"Load report for {file_path}: {report}")
+    return report
+
+
+# Deduplicate and upsert one already-cleaned frame, invalidating cached responses if anything changed.
+# Row errors end up in the report; database failures (ABORT_ERRORS) are raised
+async def load_clean_frame(df: pd.DataFrame) -> BulkLoadReport:
+    deduplicated_df = await deduplicate_data(df, engine)
+    try:
+        report = await process_and_insert_data(deduplicated_df)
+    except ABORT_ERRORS:
+        # Batches committed before the failure may already have changed what cached pages show
+        await response_cache.bump_generation()
+        raise
+    if report.inserted or report.updated:
+        await response_cache.bump_generation()
+    return report
+
+
+# Streaming mode: every chunk is cleaned, deduplicated and committed before the next one is read
+async def load_chunks(chunks, source: str, on_chunk=None) -> BulkLoadReport:
+    """Stream cleaned frames from an iterator through dedup and upsert chunk by chunk so memory stays flat.
+
+    on_chunk, if given, is awaited with (rows read so far, report so far) once each chunk is committed.
+    Database failures (ABORT_ERRORS) are raised; rows of the chunks before them stay committed.
+    """
+    report = BulkLoadReport()
+    total_rows = 0
+    chunk_number = 0
+    started = time.perf_counter()
+    chunk_started = started
+    # Each chunk is read and cleaned on a worker thread; only the DB round trips stay on the loop
+    while (chunk := await run_blocking(next, chunks, None)) is not None:
+        chunk_number += 1
+        if not chunk.empty:
+            report.merge(await load_clean_frame(chunk))
+        total_rows += len(chunk)
+        if on_chunk is not None:
+            await on_chunk(total_rows, report)
+
+        elapsed = time.perf_counter() - chunk_started
+        rate = len(chunk) / elapsed if elapsed > 0 else float("inf")
+        logger.info(f"Chunk {chunk_number}: {len(chunk)} rows in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+        chunk_started = time.perf_counter()
+
+    elapsed = time.perf_counter() - started
+    rate = total_rows / elapsed if elapsed > 0 else float("inf")
+    logger.info(f"Streamed {total_rows} rows from {source} in {elapsed:.2f}s ({rate:,.0f} rows/s).")
+    return report
+
+
+# Stream a whole dump file (from its staged copy when there is one)
+async def process_and_load_data_chunked(file_path, chunk_size=CHUNK_SIZE) -> BulkLoadReport:
+    """Stream a dump through dedup and upsert chunk by chunk so memory stays flat; ABORT_ERRORS are raised."""
+    report = BulkLoadReport()
+    chunks = staging_cache.iter_chunks(file_path, chunk_size=chunk_size, columns=LOAD_COLUMNS)
+    try:
+        report = await load_chunks(chunks, file_path)
+    except ABORT_ERRORS:
+        # The database is unreachable or unusable: the load failed, not merely some of its rows
+        raise
+    except Exception as e:
+        logger.error(f"Error streaming {file_path}: {e}")
+    finally:
+        chunks.close()
+    await run_blocking(doc_index.compact)
+    logger.info(f"Load report for {file_path}: {report}")
+    return report
@@ -0,0 +1,242 @@
+#utils/ingest_manifest.py
+import datetime
+import hashlib
+import logging
+import os
+import socket
+import uuid
+from dataclasses import dataclass, field
+
+from sqlalchemy import or_, select, update
+
+from utils.bulk_load import insert_ignore_statement
+from utils.env import load_env
+from utils.offload import run_blocking
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+# Rows per chunk when streaming a dump (0: process_and_load_data loads it whole); defined here, not in the
+# pandas-only parse_transform, because db_operations imports this module when the API starts
+CHUNK_SIZE = int(os.getenv("INGEST_CHUNK_SIZE", 50000))
+
+# Rows between the points a partly loaded dump is committed at; the loader's chunk size, so each chunk ends on one
+CHECKPOINT_ROWS = CHUNK_SIZE or 50000
+
+# How long a claim on a dump lasts without a checkpoint renewing it; an instance that dies mid-load
+# holds its dump this long before another instance can take it over
+INGEST_LEASE_SECONDS = int(os.getenv("INGEST_LEASE_SECONDS", 900))
+
+# What the manifest records for a dump no row of which is committed yet (the sha256 of no bytes)
+EMPTY_HASH = hashlib.sha256().hexdigest()
+
+
+class LeaseLost(RuntimeError):
+    pass
+
+
+# What to load from a dump: the complete rows in [start_offset, end_offset), and the state to record once loaded
+@dataclass
+class IngestPlan:
+    path: str
+    start_offset: int  # 0 loads the whole file; otherwise the first byte after the rows already committed
+    end_offset: int  # just past the last complete line; a partially written last line waits for the next scan
+    start_row: int
+    row_count: int  # data rows in [0, end_offset)
+    content_hash: str  # sha256 of the bytes [0, end_offset)
+    size: int
+    mtime: float
+    checkpoints: list = field(default_factory=list)  # (row_count, offset, content_hash) every CHECKPOINT_ROWS rows
+    base: tuple = None  # (offset, content_hash) committed when this was planned; None when nothing was
+    committed_rows: int = None  # row count last recorded in the manifest while loading
+
+    @property
+    def is_tail(self) -> bool:
+        return self.start_offset > 0
+
+
+# sha256 and line count of [0, committed_offset), then of every complete line after it. With checkpoint_rows,
+# the offset and prefix hash after every checkpoint_rows-th data row are recorded too, so a load can be
+# committed part way through
+def scan_dump(file_path: str, committed_offset: int = 0, checkpoint_rows: int = 0) -> dict:
+    digest = hashlib.sha256()
+    lines = 0
+    offset = 0
+    pending = b""
+    checkpoints = []
+    with open(file_path, "rb") as f:
+        while offset < committed_offset:
+            block = f.read(min(HASH_BLOCK_SIZE, committed_offset - offset))
+            if not block:
+                break
+            digest.update(block)
+            lines += block.count(b"\n")
+            offset += len(block)
+        prefix_hash = digest.hexdigest() if offset == committed_offset else None
+        # Line count (header included) at the next checkpoint
+        next_lines = max(lines, 1) + checkpoint_rows
+
+        # Only whole lines count: the bytes after the last newline may still be being written
+        while block := f.read(HASH_BLOCK_SIZE):
+            block = pending + block
+            cut = block.rfind(b"\n") + 1
+            start = 0
+            remaining = block.count(b"\n", 0, cut)
+            while checkpoint_rows and lines + remaining >= next_lines:
+                end = start - 1
+                for _ in range(next_lines - lines):
+                    end = block.index(b"\n", end + 1)
+                digest.update(block[start:end + 1])
+                offset += end + 1 - start
+                remaining -= next_lines - lines
+                lines = next_lines
+                start = end + 1
+                checkpoints.append((lines - 1, offset, digest.hexdigest()))
+                next_lines += checkpoint_rows
+            digest.update(block[start:cut])
+            lines += remaining
+            offset += cut - start
+            pending = block[cut:]
+    return {
+        "prefix_hash": prefix_hash,
+        "content_hash": digest.hexdigest(),
+        "end_offset": offset,
+        "lines": lines,
+        "checkpoints": checkpoints,
+    }
+
+
+# Per-file ingest state kept in the database, so every app instance skips the same unchanged dumps.
+# An instance claims a dump before loading it, so instances sharing the database never load one at once
+class FileManifest:
+    def __init__(self, session_factory, table, checkpoint_rows: int = CHECKPOINT_ROWS,
+                 lease_seconds: int = INGEST_LEASE_SECONDS):
+        self.session_factory = session_factory
+        self.table = table
+        self.checkpoint_rows = checkpoint_rows  # rows between the points a partly loaded dump can be committed at
+        self.lease = datetime.timedelta(seconds=lease_seconds)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+
+    async def entry(self, file_name: str):
+        async with self.session_factory() as session:
+            result = await session.execute(select(self.table).where(self.table.c.FILE_NAME == file_name))
+            return result.first()
+
+    async def plan(self, file_path: str):
+        """Return what to load from file_path, or None when nothing new has been committed to it."""
+        stat = os.stat(file_path)
+        entry = await self.entry(os.path.basename(file_path))
+
+        # Same size and mtime as when it was last loaded: not even worth hashing
+        if entry is not None and entry.FILE_SIZE == stat.st_size and entry.FILE_MTIME == stat.st_mtime:
+            return None
+
+        committed_offset = entry.COMMITTED_OFFSET if entry is not None else 0
+        scan = await run_blocking(scan_dump, file_path, committed_offset, self.checkpoint_rows)
+        data_rows = max(0, scan["lines"] - 1)  # the first line is the header
+        base = _committed(entry)
+
+        if entry is not None and scan["prefix_hash"] == entry.CONTENT_HASH:
+            if scan["end_offset"] == committed_offset:
+                # Touched but not changed (or only a partial line added): remember it only if fully unchanged
+                if stat.st_size == committed_offset:
+                    await self._update(file_path, FILE_SIZE=stat.st_size, FILE_MTIME=stat.st_mtime)
+                return None
+            if committed_offset:
+                logger.info(f"{file_path} has rows past its committed offset; "
+                            f"loading rows {entry.ROW_COUNT + 1} to {data_rows}.")
+            return IngestPlan(file_path, committed_offset, scan["end_offset"], entry.ROW_COUNT, data_rows,
+                              scan["content_hash"], stat.st_size, stat.st_mtime, scan["checkpoints"], base)
+
+        if entry is not None:
+            logger.warning(f"{file_path} was rewritten since it was last loaded; loading it again in full.")
+        return IngestPlan(file_path, 0, scan["end_offset"], 0, data_rows,
+                          scan["content_hash"], stat.st_size, stat.st_mtime, scan["checkpoints"], base)
+
+    async def claim(self, plan: IngestPlan) -> bool:
+        """Take (or renew) this instance's lease on plan's dump; False while another instance holds it."""
+        now = _utcnow()
+        name = os.path.basename(plan.path)
+        async with self.session_factory() as session:
+            # A dump seen for the first time gets a row with nothing committed, to hold the lease
+            statement = insert_ignore_statement(self.table, session.get_bind().dialect.name)
+            await session.execute(statement, [{
+                "FILE_NAME": name, "FILE_SIZE": 0, "FILE_MTIME": 0, "CONTENT_HASH": EMPTY_HASH,
+                "ROW_COUNT": 0, "COMMITTED_OFFSET": 0, "UPDATED_AT": now,
+            }])
+            # Atomic: of the instances racing for a free or expired lease, exactly one matches the WHERE
+            result = await session.execute(
+                update(self.table)
+                .where(self.table.c.FILE_NAME == name,
+                       or_(self.table.c.CLAIMED_BY.is_(None), self.table.c.CLAIMED_BY == self.owner,
+                           self.table.c.LEASE_EXPIRES < now))
+                .values(CLAIMED_BY=self.owner, LEASE_EXPIRES=now + self.lease)
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+    async def refresh(self, plan: IngestPlan):
+        """plan itself if the manifest is as it was when plan was made, else a new plan (None if nothing is left)."""
+        if _committed(await self.entry(os.path.basename(plan.path))) == plan.base:
+            return plan
+        logger.info(f"{plan.path} was loaded further by another instance since it was planned; planning it again.")
+        return await self.plan(plan.path)
+
+    async def release(self, plan: IngestPlan):
+        """Give up this instance's lease on plan's dump without recording any rows."""
+        await self._update(plan.path, owned=True, CLAIMED_BY=None, LEASE_EXPIRES=None)
+
+    async def commit(self, plan: IngestPlan):
+        """Record that every row of plan has been loaded, and release the lease."""
+        recorded = await self._update(
+            plan.path, owned=True, FILE_SIZE=plan.size, FILE_MTIME=plan.mtime, CONTENT_HASH=plan.content_hash,
+            ROW_COUNT=plan.row_count, COMMITTED_OFFSET=plan.end_offset, CLAIMED_BY=None, LEASE_EXPIRES=None,
+        )
+        if not recorded:
+            # The rows are loaded all the same; the instance now holding the dump finds them already stored
+            logger.warning(f"Lost the lease on {plan.path} before committing it; another instance will load it.")
+        plan.committed_rows = plan.row_count
+
+    async def commit_progress(self, plan: IngestPlan, rows_loaded: int):
+        """Record the last checkpoint of plan covered by its first rows_loaded rows (counted from start_row),
+        renewing the lease. Raises LeaseLost when another instance has taken the dump over."""
+        # Checkpoints count lines and the loader counts parsed rows; blank lines only make this err on the early side
+        covered = [checkpoint for checkpoint in plan.checkpoints
+                   if checkpoint[0] <= plan.start_row + rows_loaded and checkpoint[1] < plan.end_offset]
+        values = {"LEASE_EXPIRES": _utcnow() + self.lease}
+        if covered and covered[-1][0] != plan.committed_rows:
+            row_count, offset, content_hash = covered[-1]
+            # The committed offset stands in for the size, so the next scan sees a change and plans the rest
+            values.update(FILE_SIZE=offset, FILE_MTIME=plan.mtime, CONTENT_HASH=content_hash, ROW_COUNT=row_count,
+                          COMMITTED_OFFSET=offset)
+        if not await self._update(plan.path, owned=True, **values):
+            raise LeaseLost(f"Another instance took over {plan.path}.")
+        if "ROW_COUNT" in values:
+            plan.committed_rows = values["ROW_COUNT"]
+
+    async def _update(self, file_path, owned: bool = False, **values) -> bool:
+        """Update the dump's row (only while this instance holds its lease, with owned); False if none matched."""
+        condition = [self.table.c.FILE_NAME == os.path.basename(file_path)]
+        if owned:
+            condition.append(self.table.c.CLAIMED_BY == self.owner)
+        async with self.session_factory() as session:
+            result = await session.execute(
+                update(self.table).where(*condition).values(UPDATED_AT=_utcnow(), **values)
+            )
+            await session.commit()
+        return result.rowcount == 1
+
+
+# (offset, content_hash) an entry has committed, or None when it has committed nothing
+def _committed(entry):
+    if entry is None or not entry.COMMITTED_OFFSET:
+        return None
+    return entry.COMMITTED_OFFSET, entry.CONTENT_HASH
+
+
+def _utcnow():
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
@@ -0,0 +1,201 @@
+#utils/ingest_scheduler.py
+import asyncio
+import logging
+import os
+import re
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+
+from utils.env import load_env
+from utils.bulk_load import BulkLoadReport
+from utils.ingest_manifest import FileManifest, IngestPlan
+from utils.metrics import ingest_stage
+from utils.parse_transform import iter_csv_chunks, CHUNK_SIZE
+from utils.staging_cache import staging_cache, LOAD_COLUMNS
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Where dumps are picked up from
+INGEST_DIR = os.getenv("INGEST_DIR", "data")
+
+# Parser processes (defaults to one per core) and staged dumps allowed to wait for the loader
+INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", os.cpu_count() or 1))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 2))
+
+# The scheduler always streams; INGEST_CHUNK_SIZE=0 (whole-file loads) only applies to process_and_load_data
+STREAM_CHUNK_SIZE = CHUNK_SIZE or 50000
+
+DUMP_NAME = re.compile(r"^MOMORW_TRANSACTION_DUMP_(\d{8})\.csv$")
+
+
+# Runs in a worker process: stages a whole dump's cleaned rows as Parquet for the loader to stream back, and
+# returns the staged row count. Nothing is staged (None) for an appended tail, or when staging is off or fails
+def stage_dump(plan: IngestPlan, chunk_size: int = STREAM_CHUNK_SIZE):
+    if plan.is_tail:
+        return None
+    return staging_cache.stage(plan.path, plan.content_hash, plan.end_offset, chunk_size=chunk_size)
+
+
+# The planned rows of a dump parsed and cleaned, as chunk_size-row frames produced one at a time. A whole file
+# is read from its staged copy (or parsed here when it has none); an appended tail is new bytes, so it is parsed
+def iter_plan_chunks(plan: IngestPlan, chunk_size: int = STREAM_CHUNK_SIZE):
+    if not plan.is_tail:
+        return staging_cache.iter_chunks(plan.path, chunk_size=chunk_size, columns=LOAD_COLUMNS,
+                                         content_hash=plan.content_hash, end_offset=plan.end_offset)
+    return iter_csv_chunks(plan.path, chunk_size=chunk_size, start_offset=plan.start_offset,
+                           end_offset=plan.end_offset)
+
+
+# Dumps in a directory, oldest dump date first (the order their upserts must be applied in)
+def list_dumps(directory: str = INGEST_DIR) -> list:
+    try:
+        names = os.listdir(directory)
+    except FileNotFoundError:
+        logger.warning(f"Ingest directory {directory} does not exist.")
+        return []
+    dumps = [(match.group(1), name) for name in names if (match := DUMP_NAME.match(name))]
+    return [os.path.join(directory, name) for _, name in sorted(dumps)]
+
+
+# Stages new dumps in a process pool and streams them into the database one at a time, in dump-date order.
+# Only plans cross the queue: each worker holds one chunk while staging and the loader one chunk while loading
+class IngestScheduler:
+    def __init__(self, manifest: FileManifest, directory: str = INGEST_DIR, workers: int = INGEST_WORKERS,
+                 queue_size: int = INGEST_QUEUE_SIZE, chunk_size: int = STREAM_CHUNK_SIZE):
+        self.manifest = manifest
+        self.directory = directory
+        self.workers = max(1, workers)
+        self.queue_size = max(1, queue_size)
+        self.chunk_size = chunk_size or STREAM_CHUNK_SIZE
+        self._pool = None
+
+    @property
+    def pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self._pool
+
+    async def pending(self) -> list:
+        """Plans for every dump with rows not yet committed, oldest dump first."""
+        plans = []
+        for path in list_dumps(self.directory):
+            try:
+                plan = await self.manifest.plan(path)
+            except Exception as e:
+                logger.error(f"Error checking {path} against the ingest manifest: {e}")
+                continue
+            if plan is not None:
+                plans.append(plan)
+        return plans
+
+    async def run(self, load_chunks) -> dict:
+        """Load every pending dump with load_chunks (ingest.load_chunks); returns a report per loaded file.
+
+        A dump whose load aborts keeps only its checkpointed rows in the manifest, and ends the run; so does one
+        another instance holds the lease on, since the dumps after it must not be applied first.
+        """
+        plans = await self.pending()
+        if not plans:
+            logger.info(f"No new or changed dumps in {self.directory}.")
+            return {}
+        logger.info(f"Ingesting {len(plans)} dumps from {self.directory} with {self.workers} parser processes.")
+
+        # Staged dumps wait here for the loader; a full queue stops new ones being submitted
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        producer = asyncio.create_task(self._produce(plans, queue))
+        reports = {}
+        started = time.perf_counter()
+        try:
+            while True:
+                item = await queue.get()
+                if item is None:
+                    break
+                # Claimed only now, so a lease never runs out while its dump waits in the queue
+                if not await self.manifest.claim(item):
+                    logger.info(f"{item.path} is being loaded by another instance; the dumps after it wait for it.")
+                    break
+                plan = await self.manifest.refresh(item)
+                if plan is None:
+                    await self.manifest.release(item)
+                    continue
+                report = await self._load(plan, load_chunks)
+                if report is None:
+                    # Later dumps must not be applied before this one; they stay pending for the next run
+                    logger.warning(f"Stopping this run; {plan.path} and the dumps after it are retried on the next one.")
+                    break
+                reports[plan.path] = report
+        finally:
+            producer.cancel()
+            await asyncio.gather(producer, return_exceptions=True)
+
+        rows = sum(report.inserted + report.updated for report in reports.values())
+        logger.info(f"Ingested {len(reports)} dumps ({rows} rows upserted) in {time.perf_counter() - started:.2f}s.")
+        return reports
+
+    async def _produce(self, plans: list, queue: asyncio.Queue):
+        futures = {}
+        try:
+            for index, plan in enumerate(plans):
+                # Keep up to one staging per worker running ahead of the dump being handed over
+                for ahead in range(index, min(index + self.workers, len(plans))):
+                    if ahead not in futures:
+                        futures[ahead] = asyncio.ensure_future(self._stage(plans[ahead]))
+                try:
+                    await futures.pop(index)
+                except Exception as e:
+                    # Handed over all the same: the loader parses what the worker could not stage
+                    logger.error(f"Error staging {plan.path}: {e}")
+                await queue.put(plan)
+        finally:
+            for future in futures.values():
+                future.cancel()
+        # Not in the finally: a cancelled producer has no loader waiting, and the queue may be full
+        await queue.put(None)
+
+    # Stage in a worker process; the stage is recorded here because metrics in the workers are not scraped
+    async def _stage(self, plan: IngestPlan):
+        loop = asyncio.get_running_loop()
+        with ingest_stage("stage_dump") as stage:
+            stage.rows_out = await loop.run_in_executor(self.pool, stage_dump, plan, self.chunk_size)
+            stage.bytes_read = plan.end_offset - plan.start_offset
+        return stage.rows_out
+
+    async def _load(self, plan: IngestPlan, load_chunks):
+        """Stream the chunks of plan in order, recording progress at each checkpoint; None if the load aborted."""
+        rows_loaded = 0
+        progress = BulkLoadReport()
+
+        async def checkpoint(rows: int, report: BulkLoadReport):
+            nonlocal rows_loaded, progress
+            rows_loaded, progress = rows, report
+            await self.manifest.commit_progress(plan, rows)
+
+        chunks = iter_plan_chunks(plan, self.chunk_size)
+        try:
+            report = await load_chunks(chunks, plan.path, on_chunk=checkpoint)
+        except Exception as e:
+            # Rows past the last recorded checkpoint are planned again on the next scan
+            committed = plan.committed_rows if plan.committed_rows is not None else plan.start_row
+            logger.error(f"Aborted loading {plan.path} after {rows_loaded} rows ({progress}); "
+                         f"rows up to {committed} are recorded as loaded: {e}")
+            try:
+                await self.manifest.release(plan)
+            except Exception as release_error:
+                logger.error(f"Could not release {plan.path}; its lease runs out on its own: {release_error}")
+            return None
+        finally:
+            chunks.close()
+        await self.manifest.commit(plan)
+        rows = f"rows {plan.start_row + 1}-{plan.row_count}" if plan.is_tail else f"{plan.row_count} rows"
+        logger.info(f"Load report for {plan.path} ({rows}): {report}")
+        return report
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
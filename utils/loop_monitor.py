@@ -0,0 +1,79 @@
+#utils/loop_monitor.py
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# How often the loop is probed, and the lag above which a stall is logged
+LOOP_LAG_INTERVAL_MS = float(os.getenv("LOOP_LAG_INTERVAL_MS", 100))
+LOOP_LAG_THRESHOLD_MS = float(os.getenv("LOOP_LAG_THRESHOLD_MS", 100))
+
+# Probes kept for the percentiles (about ten minutes at the default interval)
+LOOP_LAG_WINDOW = int(os.getenv("LOOP_LAG_WINDOW", 6000))
+
+
+# Sleeps for a fixed interval and measures how late it wakes up: the time the loop spent blocked
+class LoopLagMonitor:
+    def __init__(self, interval_ms: float = LOOP_LAG_INTERVAL_MS, threshold_ms: float = LOOP_LAG_THRESHOLD_MS,
+                 window: int = LOOP_LAG_WINDOW):
+        self.interval = interval_ms / 1000
+        self.threshold_ms = threshold_ms
+        self.samples = deque(maxlen=window)
+        self.stalls = 0
+        self.max_lag_ms = 0.0
+        self._task = None
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._probe())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe(self):
+        while True:
+            expected = time.perf_counter() + self.interval
+            await asyncio.sleep(self.interval)
+            lag_ms = max(0.0, (time.perf_counter() - expected) * 1000)
+            self.samples.append(lag_ms)
+            self.max_lag_ms = max(self.max_lag_ms, lag_ms)
+            if lag_ms > self.threshold_ms:
+                self.stalls += 1
+                logger.warning(f"Event loop stalled for {lag_ms:.0f}ms (threshold {self.threshold_ms:.0f}ms).")
+
+    def stats(self) -> dict:
+        """Lag percentiles over the recent window, plus stall count and worst lag since startup."""
+        ordered = sorted(self.samples)
+
+        def percentile(p):
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] if ordered else 0.0
+
+        return {
+            "samples": len(ordered),
+            "p50_ms": percentile(0.50),
+            "p99_ms": percentile(0.99),
+            "max_ms": self.max_lag_ms,
+            "stalls": self.stalls,
+        }
+
+    def log_report(self):
+        stats = self.stats()
+        logger.info(f"Event loop lag: p50 {stats['p50_ms']:.1f}ms, p99 {stats['p99_ms']:.1f}ms, "
+                    f"max {stats['max_ms']:.1f}ms, {stats['stalls']} stalls over {self.threshold_ms:.0f}ms.")
+
+
+loop_monitor = LoopLagMonitor()
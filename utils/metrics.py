@@ -0,0 +1,101 @@
+#utils/metrics.py
+import contextvars
+import logging
+import time
+from contextlib import contextmanager
+
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, Counter, Histogram, generate_latest
+from prometheus_client.core import GaugeMetricFamily
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Ingest stages run from seconds to tens of minutes on a full dump
+STAGE_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1800)
+
+INGEST_STAGE_SECONDS = Histogram(
+    "ingest_stage_seconds", "Wall time of one run of an ingest stage.", ["stage"], buckets=STAGE_BUCKETS
+)
+INGEST_STAGE_ROWS_IN = Counter("ingest_stage_rows_in_total", "Rows handed to an ingest stage.", ["stage"])
+INGEST_STAGE_ROWS_OUT = Counter("ingest_stage_rows_out_total", "Rows passed on by an ingest stage.", ["stage"])
+INGEST_STAGE_REJECTED = Counter("ingest_stage_rows_rejected_total", "Rows an ingest stage rejected.", ["stage"])
+INGEST_STAGE_BYTES = Counter("ingest_stage_bytes_read_total", "Bytes of dump files read by a stage.", ["stage"])
+INGEST_STAGE_ROUND_TRIPS = Counter(
+    "ingest_stage_db_round_trips_total", "SQL statements executed while a stage was running.", ["stage"]
+)
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds", "API request latency.", ["method", "route", "status"]
+)
+
+# The stage whose DB round trips are being counted; inherited by tasks (and greenlets) the stage starts
+current_stage = contextvars.ContextVar("current_stage", default=None)
+
+
+# Counts for one run of a stage; fill in what applies before the block ends
+class StageRun:
+    def __init__(self, name: str, rows_in: int = None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.rejected = 0
+        self.bytes_read = 0
+        self.elapsed = 0.0
+
+
+@contextmanager
+def ingest_stage(name: str, rows_in: int = None):
+    """Time the enclosed block as one run of the named ingest stage and record its counters."""
+    run = StageRun(name, rows_in)
+    token = current_stage.set(name)
+    started = time.perf_counter()
+    try:
+        yield run
+    finally:
+        run.elapsed = time.perf_counter() - started
+        current_stage.reset(token)
+        INGEST_STAGE_SECONDS.labels(name).observe(run.elapsed)
+        if run.rows_in is not None:
+            INGEST_STAGE_ROWS_IN.labels(name).inc(run.rows_in)
+        if run.rows_out is not None:
+            INGEST_STAGE_ROWS_OUT.labels(name).inc(run.rows_out)
+        if run.rejected:
+            INGEST_STAGE_REJECTED.labels(name).inc(run.rejected)
+        if run.bytes_read:
+            INGEST_STAGE_BYTES.labels(name).inc(run.bytes_read)
+
+
+# Attribute every statement an engine executes to the stage running at the time
+def track_round_trips(engine):
+    @event.listens_for(engine.sync_engine, "before_cursor_execute")
+    def _count(conn, cursor, statement, parameters, context, executemany):
+        stage = current_stage.get()
+        if stage is not None:
+            INGEST_STAGE_ROUND_TRIPS.labels(stage).inc()
+
+
+# Exposes a stats() dict (cache hit counts, loop lag, ...) as gauges at scrape time
+class StatsCollector:
+    def __init__(self, prefix: str, stats, description: str):
+        self.prefix = prefix
+        self.stats = stats
+        self.description = description
+
+    def collect(self):
+        try:
+            values = self.stats()
+        except Exception as e:
+            logger.error(f"Could not collect {self.prefix} metrics: {e}")
+            return
+        for key, value in values.items():
+            if isinstance(value, (int, float)):
+                yield GaugeMetricFamily(f"{self.prefix}_{key}", f"{self.description}: {key}", value=value)
+
+
+def register_stats(prefix: str, stats, description: str):
+    REGISTRY.register(StatsCollector(prefix, stats, description))
+
+
+def render_metrics() -> tuple:
+    """The Prometheus text exposition of every registered metric, and its content type."""
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
@@ -0,0 +1,36 @@
+#utils/offload.py
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+# Threads for pandas/parsing work that must not run on the event loop
+INGEST_THREADS = int(os.getenv("INGEST_THREADS", 2))
+
+_cpu_executor = None
+
+
+# Created on first use, and again after a shutdown, so an app restarted in-process still has one
+def cpu_executor() -> ThreadPoolExecutor:
+    global _cpu_executor
+    if _cpu_executor is None:
+        _cpu_executor = ThreadPoolExecutor(max_workers=max(1, INGEST_THREADS), thread_name_prefix="ingest-cpu")
+    return _cpu_executor
+
+
+# Await a blocking or CPU-bound call on the worker threads so the loop keeps serving requests
+async def run_blocking(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_executor(), functools.partial(func, *args, **kwargs))
+
+
+def shutdown():
+    global _cpu_executor
+    if _cpu_executor is not None:
+        _cpu_executor.shutdown(wait=False, cancel_futures=True)
+        _cpu_executor = None
@@ -1,87 +1,51 @@
 #utils/parse_transform.py
+import io
+import os
+import re
 import pandas as pd
 import logging
-from sqlalchemy.sql import text
-from dotenv import load_dotenv
-# Specify the path to the .env file
-dotenv_path = "myenv/.env"
 
-# Load environment variables from the specified .env file
-load_dotenv(dotenv_path)
+from utils.env import load_env
+from utils.db_errors import ABORT_ERRORS
+from utils.doc_index import doc_index, normalize_doc_ids
+from utils.ingest_manifest import CHUNK_SIZE
+from utils.metrics import ingest_stage
+from utils.validation import FIELD_RULES
+# Load environment variables from myenv/.env (once per process)
+load_env()
 
 #Added Logger
 logging.basicConfig(level=logging.INFO)
 
+# Columns always read as text. Inferred per chunk, one blank DOC_IDT turns a chunk's keys into floats
+# ('1003.0' where the next chunk has '1004'), so the key would depend on where a dump was split.
+# Decimals stay text too, for validate_frame to parse exactly rather than through float64
+TEXT_COLUMNS = {name for name, rule in FIELD_RULES.items() if rule["kind"] in ("str", "decimal")}
+
+
+def text_dtypes(file_path) -> dict:
+    """read_csv dtype map keeping TEXT_COLUMNS as str, keyed by the names as written in the dump's header."""
+    with open(file_path, "r", errors="replace") as f:
+        header = f.readline().rstrip("\r\n")
+    return {name: str for name in header.split("|") if clean_column_name(name) in TEXT_COLUMNS}
+
+
+def clean_column_name(name):
+    """A header name without surrounding spaces or trailing commas, as clean_frame leaves it."""
+    return re.sub(r",+$", "", name.strip())
+
 #ANALYZING AND PARSING THE CSV
 def parse_csv(file_path, default_date='1900-01-01'):
     try:
         logging.info(f"Processing file: {file_path}")
 
-        # Read the file with appropriate delimiter and options
-        df = pd.read_csv(file_path, sep="|", engine='python', skip_blank_lines=True)
-
-        # Clean column names to remove extra commas or spaces
-        df.columns = df.columns.str.strip()  # Remove leading/trailing spaces
-        df.columns = df.columns.str.replace(r",+$", "", regex=True)  # Remove trailing commas
-
-        # Fill missing values with column-specific defaults
-        for col in df.columns:
-            if df[col].dtype == 'object':
-                df[col] = df[col].fillna('')  # Replace missing strings with empty string
-            elif pd.api.types.is_numeric_dtype(df[col]):
-                df[col] = df[col].fillna(0)  # Replace missing numeric values with 0
-            elif pd.api.types.is_datetime64_any_dtype(df[col]):
-                df[col] = df[col].fillna(pd.NaT)  # Replace missing dates with NaT
-
-        # Process and convert specific column groups
-        date_columns = ['BANKING_DATE', 'TRANS_DATE', 'EFFECTIVE_DATE', 'SETTLEMENT_DATE', 'ACCOUNT_DATE_OPEN',
-                        'ACCOUNT_DATE_CLOSE']
-        numeric_columns = ['AMOUNT', 'TRANS_AMOUNT', 'SETTLEMENT_FX_RATE', 'TRANSACTION_FX_RATE', 'TRANS_CASH_AMOUNT',
-                           'SETTL_CASH_AMOUNT', 'LOCAL_AMOUNT']
-        string_columns = [
-            'CONTRACT_NUMBER', 'DOC_IDT', 'PREVIOUS_DOC_IDT', 'CORRECTED_DOC_IDT', 'CORRECTION_TYPE',
-            'AUTH_CODE', 'DIRECTION', 'TRANS_REASON', 'TRANS_RRN', 'TRANS_RESPONSE_CODE', 'TRANS_SRN',
-            'RBS_NUMBER', 'PARENT_CONTRACT_NUMBER'
-        ]
-
-        for col in string_columns:
-            if col in df.columns:
-                df[col] = df[col].astype(str)  # Convert these columns to strings explicitly
-
-        for col in string_columns:
-            if col in df.columns:
-                df[col] = df[col].apply(lambda x: str(x).rstrip('.0') if isinstance(x, float) else str(x))
-
-        for col in date_columns:
-            if col in df.columns:
-                # Specify a consistent format if possible, otherwise rely on 'coerce'
-                df[col] = pd.to_datetime(df[col], format='%d-%b-%y', errors='coerce')
-
-        for col in numeric_columns:
-            if col in df.columns:
-                df[col] = pd.to_numeric(df[col], errors='coerce')  # Convert to numeric, coerce invalid entries to NaN
-
-        df['AMOUNT'] = pd.to_numeric(df['AMOUNT'], errors='coerce')
-        df['BANKING_DATE'] = pd.to_datetime(df['BANKING_DATE'], format='%d-%b-%y', errors='coerce')
-
-        # Handle columns with special formats like JSON, lists, or nested data
-        if 'CONDITION_LIST' in df.columns:
-            df['CONDITION_LIST'] = df['CONDITION_LIST'].apply(
-                lambda x: ";".join(x) if isinstance(x, list) else str(x)
-            )
-
-        # Drop rows with missing essential identifiers (e.g., 'DOC_IDT')
-        if 'DOC_IDT' in df.columns:
-            df = df.dropna(subset=['DOC_IDT'])
-
-        # Log invalid data for dates (NaT values)
-        invalid_dates = df[df['ACCOUNT_DATE_CLOSE'].isna()]
-        if not invalid_dates.empty:
-            logging.warning(f"Invalid 'ACCOUNT_DATE_CLOSE' dates found in rows: {invalid_dates.index.tolist()}")
-            logging.warning(f"Sample of invalid rows: {invalid_dates[['ACCOUNT_DATE_CLOSE']].head()}")
-
-            # Replace NaT with the default date
-            df['ACCOUNT_DATE_CLOSE'] = df['ACCOUNT_DATE_CLOSE'].fillna(pd.to_datetime(default_date))
+        with ingest_stage("parse_csv") as stage:
+            # Read the file with appropriate delimiter and options
+            df = pd.read_csv(file_path, sep="|", engine='python', skip_blank_lines=True,
+                             dtype=text_dtypes(file_path))
+            df = clean_frame(df, default_date=default_date)
+            stage.rows_out = len(df)
+            stage.bytes_read = os.path.getsize(file_path)
 
         logging.info("File processed successfully.")
         return df
@@ -91,27 +55,158 @@ def parse_csv(file_path, default_date='1900-01-01'):
         return pd.DataFrame()  # Return an empty DataFrame on error
 
 
+#Streaming variant of parse_csv: yields cleaned frames of at most chunk_size rows
+def iter_csv_chunks(file_path, chunk_size=CHUNK_SIZE, default_date='1900-01-01', start_offset=0, end_offset=None):
+    """Read a dump (or the rows between two byte offsets of it) in fixed-size row chunks with the C parser."""
+    logging.info(f"Streaming file: {file_path} in chunks of {chunk_size} rows")
+    with open_byte_range(file_path, start_offset, end_offset) as source:
+        reader = pd.read_csv(source, sep="|", engine='c', skip_blank_lines=True, chunksize=chunk_size,
+                             dtype=text_dtypes(file_path))
+        with reader:
+            chunks = iter(reader)
+            while True:
+                # One stage run per chunk, closed before yielding so the timing excludes the consumer
+                with ingest_stage("parse_csv") as stage:
+                    position = source.tell()
+                    chunk = next(chunks, None)
+                    if chunk is not None:
+                        chunk = clean_frame(chunk, default_date=default_date)
+                        stage.rows_out = len(chunk)
+                    stage.bytes_read = source.tell() - position
+                if chunk is None:
+                    break
+                yield chunk
+
+
+#Header line followed by the bytes [start_offset, end_offset) of a dump, read lazily
+class _ByteRange(io.RawIOBase):
+    def __init__(self, file, header: bytes, end_offset):
+        self.file = file
+        self.header = header
+        self.end_offset = end_offset
+        self.served = 0
+
+    def readable(self):
+        return True
+
+    def tell(self):
+        return self.served
+
+    def readinto(self, buffer):
+        if self.header:
+            size = min(len(buffer), len(self.header))
+            buffer[:size] = self.header[:size]
+            self.header = self.header[size:]
+            self.served += size
+            return size
+        size = len(buffer)
+        if self.end_offset is not None:
+            size = min(size, self.end_offset - self.file.tell())
+        if size <= 0:
+            return 0
+        data = self.file.read(size)
+        buffer[:len(data)] = data
+        self.served += len(data)
+        return len(data)
+
+    def close(self):
+        self.file.close()
+        super().close()
+
+
+def open_byte_range(file_path, start_offset=0, end_offset=None):
+    """Binary stream over a dump's rows in [start_offset, end_offset), always starting with its header line."""
+    file = open(file_path, "rb")
+    header = file.readline() if start_offset else b""
+    if start_offset:
+        file.seek(start_offset)
+    return io.BufferedReader(_ByteRange(file, header, end_offset))
+
+
+# Bump whenever clean_frame's output changes, so dumps staged by the old version are parsed again
+CLEANING_VERSION = 3
+
+
+#Cleaning shared by the whole-file and the chunked readers
+def clean_frame(df, default_date='1900-01-01'):
+    """Normalise column names and coerce the string and date columns of a raw frame.
+
+    Decimal columns are left as read (text); validate_frame parses them exactly.
+    """
+    # Clean column names to remove extra commas or spaces
+    df.columns = df.columns.str.strip()  # Remove leading/trailing spaces
+    df.columns = df.columns.str.replace(r",+$", "", regex=True)  # Remove trailing commas
+
+    # Fill missing values with column-specific defaults
+    for col in df.columns:
+        if df[col].dtype == 'object':
+            df[col] = df[col].fillna('')  # Replace missing strings with empty string
+        elif pd.api.types.is_numeric_dtype(df[col]):
+            df[col] = df[col].fillna(0)  # Replace missing numeric values with 0
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = df[col].fillna(pd.NaT)  # Replace missing dates with NaT
+
+    # Process and convert specific column groups
+    date_columns = ['BANKING_DATE', 'TRANS_DATE', 'EFFECTIVE_DATE', 'SETTLEMENT_DATE', 'ACCOUNT_DATE_OPEN',
+                    'ACCOUNT_DATE_CLOSE']
+    string_columns = [
+        'CONTRACT_NUMBER', 'DOC_IDT', 'PREVIOUS_DOC_IDT', 'CORRECTED_DOC_IDT', 'CORRECTION_TYPE',
+        'AUTH_CODE', 'DIRECTION', 'TRANS_REASON', 'TRANS_RRN', 'TRANS_RESPONSE_CODE', 'TRANS_SRN',
+        'RBS_NUMBER', 'PARENT_CONTRACT_NUMBER'
+    ]
+
+    for col in string_columns:
+        if col in df.columns:
+            df[col] = df[col].astype(str)  # Convert these columns to strings explicitly
+
+    for col in date_columns:
+        if col in df.columns:
+            # Specify a consistent format if possible, otherwise rely on 'coerce'
+            df[col] = pd.to_datetime(df[col], format='%d-%b-%y', errors='coerce')
+
+    df['BANKING_DATE'] = pd.to_datetime(df['BANKING_DATE'], format='%d-%b-%y', errors='coerce')
+
+    # Handle columns with special formats like JSON, lists, or nested data
+    if 'CONDITION_LIST' in df.columns:
+        df['CONDITION_LIST'] = df['CONDITION_LIST'].apply(
+            lambda x: ";".join(x) if isinstance(x, list) else str(x)
+        )
+
+    # Drop rows with missing essential identifiers (e.g., 'DOC_IDT')
+    if 'DOC_IDT' in df.columns:
+        df = df.dropna(subset=['DOC_IDT'])
+
+    # Log invalid data for dates (NaT values)
+    invalid_dates = df[df['ACCOUNT_DATE_CLOSE'].isna()]
+    if not invalid_dates.empty:
+        logging.warning(f"Invalid 'ACCOUNT_DATE_CLOSE' dates found in rows: {invalid_dates.index.tolist()}")
+        logging.warning(f"Sample of invalid rows: {invalid_dates[['ACCOUNT_DATE_CLOSE']].head()}")
+
+        # Replace NaT with the default date
+        df['ACCOUNT_DATE_CLOSE'] = df['ACCOUNT_DATE_CLOSE'].fillna(pd.to_datetime(default_date))
+
+    return df
+
+
 #Function to prevent duplicate data
 async def deduplicate_data(df, engine):
     try:
-        # Use an asynchronous connection
-        async with engine.connect() as conn:
-            # Use the text() function to execute a raw SQL query
-            result = await conn.execute(text("SELECT DOC_IDT FROM transactions"))
-
-            # Fetch results and convert to a pandas DataFrame
-            existing_ids = pd.DataFrame(result.fetchall(), columns=['DOC_IDT'])
-
-        # Ensure the DOC_IDT column is present in the DataFrame
-        if 'DOC_IDT' in df.columns:
-            unique_df = df[~df['DOC_IDT'].isin(existing_ids['DOC_IDT'])]
-        else:
-            logging.warning("DOC_IDT column missing from DataFrame. Skipping deduplication.")
-            unique_df = df
+        with ingest_stage("deduplicate_data", rows_in=len(df)) as stage:
+            # Ensure the DOC_IDT column is present in the DataFrame
+            if 'DOC_IDT' in df.columns:
+                # Only the incoming keys are checked: the DOC_IDT index answers most of them without a query
+                existing_ids = await doc_index.existing(df['DOC_IDT'], engine)
+                unique_df = df[~normalize_doc_ids(df['DOC_IDT']).isin(existing_ids).to_numpy()]
+            else:
+                logging.warning("DOC_IDT column missing from DataFrame. Skipping deduplication.")
+                unique_df = df
+            stage.rows_out = len(unique_df)
 
         logging.info("Deduplication completed successfully.")
         return unique_df
 
+    except ABORT_ERRORS:
+        raise
     except Exception as e:
         logging.error(f"Error deduplicating data: {e}")
         return df
@@ -0,0 +1,230 @@
+#utils/query_spec.py
+"""Multi-predicate filters for transaction queries, and a cache of the statements built for each query shape.
+
+A predicate is COLUMN:op:value, e.g. MERCHANT:prefix:ACME, AMOUNT:between:10,500, DIRECTION:in:DR,CR or
+BANKING_DATE:gte:2024-10-01. Predicates are ANDed. Values only ever reach the database as bind parameters,
+so statements are built once per shape (columns and operators) and re-executed with new parameters.
+"""
+import datetime
+import decimal
+import logging
+import os
+from collections import OrderedDict
+from dataclasses import dataclass
+
+from sqlalchemy import bindparam
+
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Limits on one query: predicates, and values of a single `in`
+QUERY_MAX_PREDICATES = int(os.getenv("QUERY_MAX_PREDICATES", 8))
+QUERY_MAX_IN_VALUES = int(os.getenv("QUERY_MAX_IN_VALUES", 100))
+
+# Statements kept per process, least recently used evicted first
+STATEMENT_CACHE_SIZE = int(os.getenv("STATEMENT_CACHE_SIZE", 256))
+
+OPERATORS = ("eq", "in", "gt", "gte", "lt", "lte", "between", "prefix")
+
+# Ranges only make sense on ordered types: dates and amounts/codes
+RANGE_OPERATORS = ("gt", "gte", "lt", "lte", "between")
+RANGE_TYPES = (datetime.date, decimal.Decimal, int, float)
+
+
+class QuerySpecError(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class Predicate:
+    column: str
+    op: str
+    value: object  # a scalar; a tuple for `in` and (low, high) for `between`
+
+    def text(self) -> str:
+        values = self.value if isinstance(self.value, tuple) else (self.value,)
+        return f"{self.column}:{self.op}:{','.join(str(value) for value in values)}"
+
+
+def _coerce(column, raw: str):
+    python_type = column.type.python_type
+    try:
+        if python_type is datetime.date:
+            return datetime.date.fromisoformat(raw)
+        if python_type is decimal.Decimal:
+            return decimal.Decimal(raw)
+        return python_type(raw)
+    except (ValueError, TypeError, decimal.InvalidOperation):
+        raise QuerySpecError(f"{column.name}: {raw!r} is not a valid {python_type.__name__}.")
+
+
+def parse_predicate(text: str, table) -> Predicate:
+    """Parse and validate COLUMN:op:value against table's columns and their types."""
+    name, _, rest = text.partition(":")
+    op, _, raw = rest.partition(":")
+    if name not in table.c:
+        raise QuerySpecError(f"Unknown column in {text!r}.")
+    if op not in OPERATORS:
+        raise QuerySpecError(f"Unknown operator in {text!r}; use one of {', '.join(OPERATORS)}.")
+    column = table.c[name]
+    python_type = column.type.python_type
+
+    if op == "prefix":
+        if python_type is not str or not raw:
+            raise QuerySpecError(f"prefix needs a non-empty value on a text column: {text!r}.")
+        return Predicate(name, op, raw)
+    if op in RANGE_OPERATORS and not issubclass(python_type, RANGE_TYPES):
+        raise QuerySpecError(f"{name} is not a date or numeric column; {op} does not apply.")
+    if op == "in":
+        values = tuple(dict.fromkeys(_coerce(column, value) for value in raw.split(",") if value != ""))
+        if not values or len(values) > QUERY_MAX_IN_VALUES:
+            raise QuerySpecError(f"in takes 1 to {QUERY_MAX_IN_VALUES} values: {text!r}.")
+        return Predicate(name, op, values)
+    if op == "between":
+        bounds = raw.split(",")
+        if len(bounds) != 2:
+            raise QuerySpecError(f"between takes two values, low,high: {text!r}.")
+        low, high = (_coerce(column, bound) for bound in bounds)
+        if low > high:
+            raise QuerySpecError(f"between bounds are reversed: {text!r}.")
+        return Predicate(name, op, (low, high))
+    if raw == "":
+        raise QuerySpecError(f"Missing value in {text!r}.")
+    return Predicate(name, op, _coerce(column, raw))
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# Predicates ANDed together; `shape` identifies the statement, `params` supplies its values
+@dataclass(frozen=True)
+class QuerySpec:
+    predicates: tuple = ()
+
+    @classmethod
+    def parse(cls, where: list, table, filter_by: str = None, filter_value=None) -> "QuerySpec":
+        """Validated spec from `where` strings, with the legacy filter_by/filter_value as an equality predicate."""
+        predicates = [parse_predicate(text, table) for text in where or []]
+        if filter_by and filter_value:
+            predicates.insert(0, parse_predicate(f"{filter_by}:eq:{filter_value}", table))
+        if len(predicates) > QUERY_MAX_PREDICATES:
+            raise QuerySpecError(f"At most {QUERY_MAX_PREDICATES} predicates per query.")
+        return cls(tuple(dict.fromkeys(predicates)))
+
+    @property
+    def shape(self) -> tuple:
+        return tuple((predicate.column, predicate.op) for predicate in self.predicates)
+
+    @property
+    def equality_columns(self) -> list:
+        """Columns pinned to a single value, which an index can lead with."""
+        return [predicate.column for predicate in self.predicates if predicate.op == "eq"]
+
+    @property
+    def index_column(self):
+        """The column an index for this query would lead with: the first equality, else the first predicate."""
+        equalities = self.equality_columns
+        if equalities:
+            return equalities[0]
+        return self.predicates[0].column if self.predicates else None
+
+    def texts(self) -> list:
+        """Canonical COLUMN:op:value strings, for cache keys and cursors."""
+        return [predicate.text() for predicate in self.predicates]
+
+    def lower_bound(self, name: str):
+        """The smallest value of column `name` the predicates allow, or None when they leave it open."""
+        bounds = []
+        for predicate in self.predicates:
+            if predicate.column != name:
+                continue
+            if predicate.op in ("eq", "gt", "gte"):
+                bounds.append(predicate.value)
+            elif predicate.op == "between":
+                bounds.append(predicate.value[0])
+            elif predicate.op == "in":
+                bounds.append(min(predicate.value))
+        return max(bounds) if bounds else None
+
+    def conditions(self, table) -> list:
+        """Clauses over table with named bind parameters; the same names are reused for every table."""
+        clauses = []
+        for i, predicate in enumerate(self.predicates):
+            column = table.c[predicate.column]
+            name = f"w{i}"
+            if predicate.op == "eq":
+                clauses.append(column == bindparam(name, type_=column.type))
+            elif predicate.op == "in":
+                clauses.append(column.in_(bindparam(name, type_=column.type, expanding=True)))
+            elif predicate.op == "gt":
+                clauses.append(column > bindparam(name, type_=column.type))
+            elif predicate.op == "gte":
+                clauses.append(column >= bindparam(name, type_=column.type))
+            elif predicate.op == "lt":
+                clauses.append(column < bindparam(name, type_=column.type))
+            elif predicate.op == "lte":
+                clauses.append(column <= bindparam(name, type_=column.type))
+            elif predicate.op == "between":
+                clauses.append(column.between(bindparam(f"{name}_low", type_=column.type),
+                                              bindparam(f"{name}_high", type_=column.type)))
+            else:
+                clauses.append(column.like(bindparam(name, type_=column.type), escape="\\"))
+        return clauses
+
+    def params(self) -> dict:
+        params = {}
+        for i, predicate in enumerate(self.predicates):
+            name = f"w{i}"
+            if predicate.op == "in":
+                params[name] = list(predicate.value)
+            elif predicate.op == "between":
+                params[f"{name}_low"], params[f"{name}_high"] = predicate.value
+            elif predicate.op == "prefix":
+                params[name] = _escape_like(predicate.value) + "%"
+            else:
+                params[name] = predicate.value
+        return params
+
+
+# Built statements by query shape; SQLAlchemy memoizes the cache key on each statement object, so a
+# reused statement also goes straight to the engine's compiled cache
+class StatementCache:
+    def __init__(self, max_size: int = STATEMENT_CACHE_SIZE):
+        self.max_size = max_size
+        self._statements = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, shape: tuple, build):
+        """The statement cached for shape, or build() stored under it."""
+        statement = self._statements.get(shape)
+        if statement is not None:
+            self._statements.move_to_end(shape)
+            self.hits += 1
+            return statement
+        self.misses += 1
+        statement = build()
+        self._statements[shape] = statement
+        if len(self._statements) > self.max_size:
+            self._statements.popitem(last=False)
+        return statement
+
+    def clear(self):
+        self._statements.clear()
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "size": len(self._statements),
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+statement_cache = StatementCache()
@@ -0,0 +1,136 @@
+#utils/rollups.py
+import argparse
+import asyncio
+import datetime
+import decimal
+import logging
+
+from sqlalchemy import delete, func, insert, literal, select
+
+from utils.bulk_load import increment_statement
+
+logger = logging.getLogger(__name__)
+
+# Rollup key columns and the value stored when a transaction has none (key columns cannot be NULL)
+ROLLUP_DIMENSIONS = {
+    "SETTLEMENT_DATE": datetime.date(1900, 1, 1),
+    "SETTL_CURRENCY": -1,
+    "CARD_BRAND_NAME": "",
+    "DIRECTION": "",
+}
+ROLLUP_MEASURES = ["TXN_COUNT", "SETTL_AMOUNT_SUM"]
+
+CENT = decimal.Decimal("0.01")
+
+
+def _dimension_key(row) -> tuple:
+    return tuple(default if row.get(name) is None else row[name] for name, default in ROLLUP_DIMENSIONS.items())
+
+
+def _amount(value) -> decimal.Decimal:
+    if value is None:
+        return decimal.Decimal(0)
+    return decimal.Decimal(str(value)).quantize(CENT)
+
+
+# Net change to each rollup row from new rows, minus the stored versions of any rows they overwrite
+def rollup_delta(new_rows, old_rows=()) -> dict:
+    delta = {}
+    for sign, rows in ((1, new_rows), (-1, old_rows)):
+        for row in rows:
+            count, amount = delta.get(_dimension_key(row), (0, decimal.Decimal(0)))
+            delta[_dimension_key(row)] = (count + sign, amount + sign * _amount(row.get("SETTL_AMOUNT")))
+    return delta
+
+
+# BulkLoader before_write hook: folds each batch's delta into the rollups inside the batch's own transaction
+class SettlementRollupMaintainer:
+    def __init__(self, rollup_table, base_table):
+        self.rollup_table = rollup_table
+        self.base_table = base_table
+
+    async def __call__(self, session, batch: list, existing_keys: set):
+        old_rows = []
+        if existing_keys:
+            columns = [self.base_table.c[name] for name in ROLLUP_DIMENSIONS] + [self.base_table.c.SETTL_AMOUNT]
+            result = await session.execute(select(*columns).where(self.base_table.c.DOC_IDT.in_(existing_keys)))
+            old_rows = [row._mapping for row in result]
+
+        # Sorted so concurrent batches lock rollup rows in the same order
+        rows = [
+            {**dict(zip(ROLLUP_DIMENSIONS, key)), "TXN_COUNT": count, "SETTL_AMOUNT_SUM": amount}
+            for key, (count, amount) in sorted(rollup_delta(batch, old_rows).items())
+            if count or amount
+        ]
+        if rows:
+            dialect_name = session.get_bind().dialect.name
+            await session.execute(increment_statement(self.rollup_table, dialect_name, ROLLUP_MEASURES), rows)
+
+
+# The rollup recomputed from scratch over a base table
+def base_aggregate(base_table):
+    dimensions = [
+        func.coalesce(base_table.c[name], literal(default, type_=base_table.c[name].type)).label(name)
+        for name, default in ROLLUP_DIMENSIONS.items()
+    ]
+    return select(
+        *dimensions,
+        func.count().label("TXN_COUNT"),
+        func.coalesce(func.sum(base_table.c.SETTL_AMOUNT), 0).label("SETTL_AMOUNT_SUM"),
+    ).group_by(*dimensions)
+
+
+async def rebuild_rollups(session_factory, rollup_table, base_table):
+    """Replace the rollups with a fresh aggregate of the base table, in one transaction."""
+    columns = list(ROLLUP_DIMENSIONS) + ROLLUP_MEASURES
+    async with session_factory() as session:
+        await session.execute(delete(rollup_table))
+        await session.execute(insert(rollup_table).from_select(columns, base_aggregate(base_table)))
+        await session.commit()
+    logger.info("Settlement rollups rebuilt from the base table.")
+
+
+async def verify_rollups(session_factory, rollup_table, base_table) -> list:
+    """Compare the rollups with the base table; returns (key, expected, stored) for every mismatch."""
+    async with session_factory() as session:
+        expected = {
+            _dimension_key(row._mapping): (row.TXN_COUNT, _amount(row.SETTL_AMOUNT_SUM))
+            for row in await session.execute(base_aggregate(base_table))
+        }
+        stored = {
+            _dimension_key(row._mapping): (row.TXN_COUNT, _amount(row.SETTL_AMOUNT_SUM))
+            for row in await session.execute(select(rollup_table))
+            if row.TXN_COUNT or row.SETTL_AMOUNT_SUM
+        }
+    mismatches = [
+        (key, expected.get(key), stored.get(key))
+        for key in sorted(set(expected) | set(stored))
+        if expected.get(key) != stored.get(key)
+    ]
+    if mismatches:
+        logger.error(f"{len(mismatches)} settlement rollup rows differ from the base table, e.g. {mismatches[:5]}")
+    else:
+        logger.info(f"Settlement rollups match the base table ({len(expected)} groups).")
+    return mismatches
+
+
+async def _run(command: str) -> int:
+    from utils.db_operations import SettlementRollup, get_session, init_schema, session_router, transaction_history
+
+    try:
+        await init_schema()
+        # Rollups cover every transaction, hot or archived
+        rollup_table, base_table = SettlementRollup.__table__, transaction_history()
+        if command == "rebuild":
+            await rebuild_rollups(get_session, rollup_table, base_table)
+        mismatches = await verify_rollups(get_session, rollup_table, base_table)
+    finally:
+        await session_router.dispose()
+    return 1 if mismatches else 0
+
+
+# python -m utils.rollups rebuild|verify
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rebuild or verify the settlement rollup tables.")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    raise SystemExit(asyncio.run(_run(parser.parse_args().command)))
@@ -0,0 +1,187 @@
+#utils/search.py
+"""Full-text search over MERCHANT, ACCOUNT_NAME, TRANS_DETAILS and TRANS_INFO.
+
+Each transaction has one normalised document in a side table keyed by DOC_IDT, so hot and archived rows share
+one index. On MySQL the document carries a FULLTEXT index with the ngram parser, which matches fragments inside
+words; other dialects fall back to LIKE '%term%'.
+
+Usage: python -m utils.search rebuild
+       python -m utils.search status
+"""
+import argparse
+import asyncio
+import logging
+import os
+import re
+import time
+
+from sqlalchemy import DDL, Column, Date, String, Table, Text, event, func, literal, select
+from sqlalchemy.dialects.mysql import match
+
+from utils.bulk_load import upsert_statement
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Text columns folded into each transaction's search document, most specific first
+SEARCH_COLUMNS = ["MERCHANT", "ACCOUNT_NAME", "TRANS_DETAILS", "TRANS_INFO"]
+
+# Shorter terms than MySQL's ngram_token_size (2 by default) cannot be matched by the index
+SEARCH_MIN_TERM_LENGTH = int(os.getenv("SEARCH_MIN_TERM_LENGTH", 2))
+SEARCH_MAX_TERMS = int(os.getenv("SEARCH_MAX_TERMS", 5))
+
+# Deepest ranked result a client can page to (skip + limit)
+SEARCH_MAX_RESULTS = int(os.getenv("SEARCH_MAX_RESULTS", 1000))
+
+# Documents written per transaction by the rebuild command
+SEARCH_REBUILD_BATCH = int(os.getenv("SEARCH_REBUILD_BATCH", 5000))
+
+# Characters with a meaning in MySQL's boolean full-text syntax
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]')
+
+
+class SearchQueryError(ValueError):
+    pass
+
+
+def search_table(metadata, name: str = "transaction_search") -> Table:
+    table = Table(
+        name, metadata,
+        Column("DOC_IDT", String(255), primary_key=True),
+        Column("BANKING_DATE", Date),
+        Column("SEARCH_TEXT", Text, nullable=False),
+    )
+    event.listen(table, "after_create", DDL(
+        f"ALTER TABLE {name} ADD FULLTEXT INDEX ft_{name}_text (SEARCH_TEXT) WITH PARSER ngram"
+    ).execute_if(dialect="mysql"))
+    return table
+
+
+def search_document(row) -> str:
+    """The searchable text of one transaction: its text columns lowercased, whitespace collapsed."""
+    parts = [" ".join(str(row[name]).lower().split()) for name in SEARCH_COLUMNS if row.get(name) is not None]
+    return " | ".join(part for part in parts if part)
+
+
+def search_terms(q: str) -> list:
+    """Lowercased terms of a query; every term must occur in a matching document."""
+    terms = [
+        term for term in dict.fromkeys(_BOOLEAN_OPERATORS.sub(" ", q.lower()).split())
+        if len(term) >= SEARCH_MIN_TERM_LENGTH
+    ]
+    if not terms:
+        raise SearchQueryError(f"Search for at least one term of {SEARCH_MIN_TERM_LENGTH} or more characters.")
+    if len(terms) > SEARCH_MAX_TERMS:
+        raise SearchQueryError(f"At most {SEARCH_MAX_TERMS} search terms.")
+    return terms
+
+
+def _escape_like(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+
+
+# BulkLoader before_write hook: upserts the search documents of each batch inside the batch's transaction
+class SearchIndexMaintainer:
+    def __init__(self, search_table: Table):
+        self.search_table = search_table
+
+    async def __call__(self, session, batch: list, existing_keys: set):
+        documents = [
+            {"DOC_IDT": row["DOC_IDT"], "BANKING_DATE": row.get("BANKING_DATE"), "SEARCH_TEXT": search_document(row)}
+            for row in batch
+        ]
+        if documents:
+            dialect_name = session.get_bind().dialect.name
+            await session.execute(upsert_statement(self.search_table, dialect_name), documents)
+
+
+class SearchIndex:
+    def __init__(self, session_factory, read_session_factory, search_table: Table, base_tables: list):
+        self.session_factory = session_factory
+        self.read_session_factory = read_session_factory
+        self.search_table = search_table
+        self.base_tables = base_tables
+
+    def query(self, dialect_name: str, terms: list, skip: int, limit: int):
+        """DOC_IDT and score of one page of matches, best first."""
+        text = self.search_table.c.SEARCH_TEXT
+        if dialect_name == "mysql":
+            # Boolean mode requires every term as a phrase; natural-language relevance ranks the matches
+            required = " ".join(f'+"{term}"' for term in terms)
+            score = match(text, against=" ".join(terms)).label("score")
+            query = select(self.search_table.c.DOC_IDT, score).where(
+                match(text, against=required).in_boolean_mode()
+            )
+        else:
+            # Fallback scan: matches on the first term earlier in the document (the merchant) rank higher
+            score = (literal(1.0) / func.instr(text, terms[0])).label("score")
+            query = select(self.search_table.c.DOC_IDT, score).where(
+                *(text.like(f"%{_escape_like(term)}%", escape="\\") for term in terms)
+            )
+        # Equal scores list the most recent transactions first
+        query = query.order_by(
+            score.desc(), self.search_table.c.BANKING_DATE.desc(), self.search_table.c.DOC_IDT
+        ).limit(limit)
+        return query.offset(skip) if skip else query
+
+    async def search(self, terms: list, skip: int = 0, limit: int = 20) -> list:
+        """(DOC_IDT, score) pairs of the matches ranked skip .. skip + limit."""
+        async with self.read_session_factory() as session:
+            query = self.query(session.bind.dialect.name, terms, skip, limit)
+            return [(row.DOC_IDT, float(row.score or 0)) for row in await session.execute(query)]
+
+    async def rebuild(self) -> int:
+        """Write the document of every stored transaction, hot and archived; returns the number written."""
+        started = time.perf_counter()
+        written = 0
+        for table in self.base_tables:
+            columns = [table.c.DOC_IDT, table.c.BANKING_DATE, *(table.c[name] for name in SEARCH_COLUMNS)]
+            last = None
+            while True:
+                async with self.session_factory() as session:
+                    query = select(*columns).order_by(table.c.DOC_IDT).limit(SEARCH_REBUILD_BATCH)
+                    if last is not None:
+                        query = query.where(table.c.DOC_IDT > last)
+                    rows = [row._mapping for row in await session.execute(query)]
+                    if not rows:
+                        break
+                    await SearchIndexMaintainer(self.search_table)(session, rows, set())
+                    await session.commit()
+                last = rows[-1]["DOC_IDT"]
+                written += len(rows)
+            logger.info(f"Indexed {table.name} for search ({written} documents so far).")
+        logger.info(f"Search index rebuilt with {written} documents in {time.perf_counter() - started:.2f}s.")
+        return written
+
+    async def status(self) -> dict:
+        async with self.session_factory() as session:
+            counts = {
+                table.name: (await session.execute(select(func.count()).select_from(table))).scalar()
+                for table in [self.search_table, *self.base_tables]
+            }
+        return counts
+
+
+async def _run(command: str) -> int:
+    from utils.db_operations import init_schema, search_index, session_router
+
+    try:
+        await init_schema()
+        if command == "rebuild":
+            await search_index.rebuild()
+        counts = await search_index.status()
+        for name, count in counts.items():
+            print(f"{name:32} {count:>12} rows")
+    finally:
+        await session_router.dispose()
+    return 0
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("command", choices=["rebuild", "status"])
+    logging.basicConfig(level=logging.INFO)
+    raise SystemExit(asyncio.run(_run(parser.parse_args().command)))
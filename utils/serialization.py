@@ -0,0 +1,19 @@
+#utils/serialization.py
+import decimal
+
+import orjson
+
+
+# Decimals go out as strings, matching how the API's pydantic models serialize them
+def _encode_default(value):
+    if isinstance(value, decimal.Decimal):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(value, option: int = None) -> bytes:
+    """Encode value as JSON bytes with orjson; dates and datetimes come out as ISO strings."""
+    return orjson.dumps(value, default=_encode_default, option=option)
+
+
+loads = orjson.loads
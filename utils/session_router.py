@@ -0,0 +1,176 @@
+#utils/session_router.py
+import asyncio
+import itertools
+import logging
+import os
+import time
+from contextlib import asynccontextmanager
+
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError, InterfaceError, OperationalError
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
+from sqlalchemy.orm import sessionmaker
+
+from utils.env import load_env
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Comma-separated replica URLs for API reads; empty reads from the primary through its own reader pool
+DATABASE_READ_URLS = [url.strip() for url in os.getenv("DATABASE_READ_URLS", "").split(",") if url.strip()]
+
+# Writers (ingestion) and readers (API) get separate pools so a bulk upsert cannot starve page queries
+DB_WRITE_POOL_SIZE = int(os.getenv("DB_WRITE_POOL_SIZE", 10))
+DB_WRITE_MAX_OVERFLOW = int(os.getenv("DB_WRITE_MAX_OVERFLOW", 10))
+DB_READ_POOL_SIZE = int(os.getenv("DB_READ_POOL_SIZE", 10))
+DB_READ_MAX_OVERFLOW = int(os.getenv("DB_READ_MAX_OVERFLOW", 10))
+
+# Replica probes: interval and timeout of the SELECT 1 that decides whether a replica takes reads
+REPLICA_HEALTH_INTERVAL = float(os.getenv("REPLICA_HEALTH_INTERVAL", 10))
+REPLICA_HEALTH_TIMEOUT = float(os.getenv("REPLICA_HEALTH_TIMEOUT", 2))
+
+# Reads go to the primary for this many seconds after the ingest generation changes (0 disables the pin)
+READ_YOUR_WRITES_SECONDS = float(os.getenv("READ_YOUR_WRITES_SECONDS", 0))
+
+
+# SQLite (benchmarks, local runs) does not take pool sizing arguments
+def pool_options(url: str, pool_size: int, max_overflow: int) -> dict:
+    return {} if url.startswith("sqlite") else {"pool_size": pool_size, "max_overflow": max_overflow}
+
+
+# One read target: its engine, session factory and health
+class ReadTarget:
+    def __init__(self, name: str, url: str, pool_size: int, max_overflow: int):
+        self.name = name
+        self.engine = create_async_engine(url, **pool_options(url, pool_size, max_overflow))
+        self.sessions = sessionmaker(bind=self.engine, class_=AsyncSession, expire_on_commit=False)
+        self.healthy = True
+        self.reads = 0
+        self.failures = 0
+
+    def mark(self, healthy: bool, reason: str = ""):
+        if healthy != self.healthy:
+            if healthy:
+                logger.info(f"Read target {self.name} is healthy again.")
+            else:
+                logger.warning(f"Read target {self.name} taken out of rotation: {reason}")
+        self.healthy = healthy
+
+
+# Hands out write sessions on the primary and read sessions round-robin across healthy replicas
+class SessionRouter:
+    def __init__(self, primary_url: str, replica_urls: list = DATABASE_READ_URLS,
+                 write_pool: tuple = (DB_WRITE_POOL_SIZE, DB_WRITE_MAX_OVERFLOW),
+                 read_pool: tuple = (DB_READ_POOL_SIZE, DB_READ_MAX_OVERFLOW),
+                 health_interval: float = REPLICA_HEALTH_INTERVAL, pin_seconds: float = READ_YOUR_WRITES_SECONDS):
+        self.writer = create_async_engine(primary_url, **pool_options(primary_url, *write_pool))
+        self.write_sessions = sessionmaker(bind=self.writer, class_=AsyncSession, expire_on_commit=False)
+        # The primary also serves reads, from its own pool, whenever no replica is usable
+        self.primary_reader = ReadTarget("primary", primary_url, *read_pool)
+        self.replicas = [ReadTarget(f"replica{i}", url, *read_pool) for i, url in enumerate(replica_urls, 1)]
+        self._next_replica = itertools.cycle(self.replicas) if self.replicas else None
+        self.health_interval = health_interval
+        self.pin_seconds = pin_seconds
+        self.generation_source = None
+        self._seen_generation = None
+        self._pinned_until = 0.0
+        self._task = None
+
+    @property
+    def engines(self) -> list:
+        return [self.writer, self.primary_reader.engine, *(replica.engine for replica in self.replicas)]
+
+    async def read_target(self) -> ReadTarget:
+        """The next healthy replica, or the primary when pinned or when none is healthy."""
+        if await self._pinned():
+            return self.primary_reader
+        for _ in range(len(self.replicas)):
+            replica = next(self._next_replica)
+            if replica.healthy:
+                return replica
+        return self.primary_reader
+
+    @asynccontextmanager
+    async def read_session(self):
+        target = await self.read_target()
+        target.reads += 1
+        async with target.sessions() as session:
+            try:
+                yield session
+            except (OperationalError, InterfaceError) as e:
+                # Connection-level failure: stop routing here until the next probe succeeds
+                if target is not self.primary_reader:
+                    target.failures += 1
+                    target.mark(False, str(e.orig if isinstance(e, DBAPIError) else e))
+                raise
+
+    def pin_primary(self, seconds: float = None):
+        """Send reads to the primary for the next `seconds` (default: pin_seconds)."""
+        seconds = self.pin_seconds if seconds is None else seconds
+        self._pinned_until = max(self._pinned_until, time.monotonic() + seconds)
+
+    # A generation bump (seen by any worker through the shared cache) means replicas may still lag the new rows
+    async def _pinned(self) -> bool:
+        if self.pin_seconds > 0 and self.replicas and self.generation_source is not None:
+            try:
+                generation = await self.generation_source()
+            except Exception as e:
+                logger.error(f"Could not read the ingest generation: {e}")
+                generation = self._seen_generation
+            if self._seen_generation is not None and generation != self._seen_generation:
+                logger.info(f"Ingest generation {generation}: reading from the primary for {self.pin_seconds:.0f}s.")
+                self.pin_primary()
+            self._seen_generation = generation
+        return time.monotonic() < self._pinned_until
+
+    async def check_replicas(self):
+        """Probe every replica with SELECT 1 and update which ones take reads."""
+        for replica in self.replicas:
+            try:
+                await asyncio.wait_for(self._ping(replica), REPLICA_HEALTH_TIMEOUT)
+                replica.mark(True)
+            except Exception as e:
+                replica.failures += 1
+                replica.mark(False, f"health check failed: {e}")
+
+    @staticmethod
+    async def _ping(replica: ReadTarget):
+        async with replica.engine.connect() as conn:
+            await conn.execute(text("SELECT 1"))
+
+    def start(self):
+        if self.replicas and self._task is None:
+            self._task = asyncio.create_task(self._probe())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    async def _probe(self):
+        while True:
+            await self.check_replicas()
+            await asyncio.sleep(self.health_interval)
+
+    async def dispose(self):
+        await self.stop()
+        for engine in self.engines:
+            await engine.dispose()
+
+    def stats(self) -> dict:
+        stats = {
+            "replicas": len(self.replicas),
+            "healthy_replicas": sum(replica.healthy for replica in self.replicas),
+            "pinned": int(time.monotonic() < self._pinned_until),
+            "primary_reads": self.primary_reader.reads,
+        }
+        for replica in self.replicas:
+            stats[f"{replica.name}_reads"] = replica.reads
+            stats[f"{replica.name}_failures"] = replica.failures
+        return stats
@@ -0,0 +1,271 @@
+#utils/staging_cache.py
+"""Cleaned dumps staged as Parquet, keyed by the content hash of the raw file.
+
+Usage: python -m utils.staging_cache warm [PATH ...]
+       python -m utils.staging_cache list
+       python -m utils.staging_cache purge [--all] [--older-than DAYS]
+"""
+import argparse
+import logging
+import os
+import time
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from utils.env import load_env
+from utils.ingest_manifest import scan_dump
+from utils.metrics import ingest_stage
+from utils.parse_transform import CHUNK_SIZE, CLEANING_VERSION, iter_csv_chunks, parse_csv
+from utils.validation import FIELD_RULES
+
+# Load environment variables from myenv/.env (once per process)
+load_env()
+
+logger = logging.getLogger(__name__)
+
+# Where staged dumps are kept, and a switch to parse every dump from CSV again
+STAGING_DIR = os.getenv("STAGING_DIR", "data/staging")
+STAGING_ENABLED = os.getenv("STAGING_ENABLED", "true").lower() in ("1", "true", "yes")
+STAGING_COMPRESSION = os.getenv("STAGING_COMPRESSION", "zstd")
+
+# The columns the loader validates and inserts; anything else a dump carries is pruned on read
+LOAD_COLUMNS = list(FIELD_RULES)
+
+
+# One Parquet file per (dump content, clean_frame version); written once, then read with memory mapping
+class StagingCache:
+    def __init__(self, directory: str = STAGING_DIR, enabled: bool = STAGING_ENABLED,
+                 compression: str = STAGING_COMPRESSION):
+        self.directory = directory
+        self.enabled = enabled
+        self.compression = compression
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.failures = 0
+
+    def path_for(self, content_hash: str) -> str:
+        return os.path.join(self.directory, f"{content_hash}-v{CLEANING_VERSION}.parquet")
+
+    def has(self, content_hash: str) -> bool:
+        return self.enabled and os.path.exists(self.path_for(content_hash))
+
+    def iter_chunks(self, file_path: str, chunk_size: int = CHUNK_SIZE, columns: list = None,
+                    content_hash: str = None, end_offset: int = None):
+        """Cleaned frames of the complete rows of file_path, from its staged copy when there is one.
+
+        A miss parses the CSV with iter_csv_chunks and stages the chunks as they are yielded.
+        """
+        if content_hash is None:
+            scan = scan_dump(file_path)
+            content_hash, end_offset = scan["content_hash"], scan["end_offset"]
+
+        if self.has(content_hash):
+            self.hits += 1
+            yield from self.read(content_hash, columns, chunk_size)
+            return
+
+        self.misses += 1
+        chunks = iter_csv_chunks(file_path, chunk_size=chunk_size, end_offset=end_offset)
+        if self.enabled:
+            chunks = self._stage_while_parsing(chunks, content_hash, os.path.basename(file_path))
+        for chunk in chunks:
+            yield _prune(chunk, columns)
+
+    def stage(self, file_path: str, content_hash: str, end_offset: int, chunk_size: int = CHUNK_SIZE):
+        """Stage the complete rows of file_path unless they already are; the staged row count, or None if not staged.
+
+        Chunks are written as they are parsed and never held, so memory stays at one chunk whatever the dump size.
+        """
+        if not self.enabled:
+            return None
+        if not self.has(content_hash):
+            failures = self.failures
+            chunks = iter_csv_chunks(file_path, chunk_size=chunk_size, end_offset=end_offset)
+            staged = self._stage_while_parsing(chunks, content_hash, os.path.basename(file_path))
+            for _ in staged:
+                if self.failures > failures:
+                    staged.close()  # no point parsing the rest
+                    break
+            if not self.has(content_hash):
+                return None
+        return pq.read_metadata(self.path_for(content_hash)).num_rows
+
+    def load_frame(self, file_path: str, columns: list = None) -> pd.DataFrame:
+        """The whole cleaned dump, read from its staged copy or parsed with parse_csv and staged."""
+        scan = scan_dump(file_path)
+        content_hash = scan["content_hash"]
+        if self.has(content_hash):
+            self.hits += 1
+            return self.read_frame(content_hash, columns)
+
+        self.misses += 1
+        df = parse_csv(file_path)
+        # parse_csv also reads a trailing partial line, so a dump still being written is not staged
+        if self.enabled and not df.empty and scan["end_offset"] == os.path.getsize(file_path):
+            for _ in self._stage_while_parsing(iter([df]), content_hash, os.path.basename(file_path)):
+                pass
+        return _prune(df, columns)
+
+    def read(self, content_hash: str, columns: list = None, chunk_size: int = CHUNK_SIZE):
+        """Frames of at most chunk_size rows from a staged dump, reading only the requested columns."""
+        source = pq.ParquetFile(self.path_for(content_hash), memory_map=True)
+        columns = _present(columns, source.schema_arrow.names)
+        batches = source.iter_batches(batch_size=chunk_size, columns=columns)
+        while True:
+            with ingest_stage("read_staged") as stage:
+                batch = next(batches, None)
+                if batch is not None:
+                    chunk = batch.to_pandas()
+                    stage.rows_out = len(chunk)
+                    stage.bytes_read = batch.nbytes
+            if batch is None:
+                break
+            yield chunk
+
+    def read_frame(self, content_hash: str, columns: list = None) -> pd.DataFrame:
+        path = self.path_for(content_hash)
+        with ingest_stage("read_staged") as stage:
+            columns = _present(columns, pq.read_schema(path).names)
+            table = pq.read_table(path, columns=columns, memory_map=True)
+            df = table.to_pandas()
+            stage.rows_out = len(df)
+            stage.bytes_read = table.nbytes
+        return df
+
+    # Pass chunks through, appending each one as a row group; the file only appears once every chunk is written
+    def _stage_while_parsing(self, chunks, content_hash: str, source: str):
+        path = self.path_for(content_hash)
+        temp_path = f"{path}.{os.getpid()}.tmp"
+        writer = None
+        staging = True
+        try:
+            for chunk in chunks:
+                if staging:
+                    try:
+                        table = pa.Table.from_pandas(chunk, preserve_index=False)
+                        if writer is None:
+                            os.makedirs(self.directory, exist_ok=True)
+                            schema = table.schema.with_metadata({b"source": source.encode()})
+                            writer = pq.ParquetWriter(temp_path, schema, compression=self.compression)
+                        writer.write_table(table.cast(writer.schema))
+                    except (pa.ArrowException, OSError, ValueError) as e:
+                        # e.g. a column inferred as numeric in one chunk and text in another
+                        logger.warning(f"Not staging {source}: {e}")
+                        self.failures += 1
+                        staging = False
+                yield chunk
+            if staging and writer is not None:
+                writer.close()
+                writer = None
+                os.replace(temp_path, path)
+                self.writes += 1
+                logger.info(f"Staged {source} as {path}.")
+        finally:
+            if writer is not None:
+                writer.close()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def entries(self) -> list:
+        """Every staged file with its source dump, version, rows and size."""
+        try:
+            names = sorted(os.listdir(self.directory))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for name in names:
+            if not name.endswith(".parquet"):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                metadata = pq.read_metadata(path)
+            except (pa.ArrowException, OSError) as e:
+                logger.warning(f"Unreadable staged file {path}: {e}")
+                metadata = None
+            stat = os.stat(path)
+            content_hash, _, version = name[:-len(".parquet")].rpartition("-v")
+            source = (metadata.metadata or {}).get(b"source", b"").decode() if metadata else ""
+            entries.append({
+                "path": path,
+                "content_hash": content_hash,
+                "version": int(version) if version.isdigit() else None,
+                "source": source,
+                "rows": metadata.num_rows if metadata else None,
+                "size": stat.st_size,
+                "mtime": stat.st_mtime,
+            })
+        return entries
+
+    def purge(self, everything: bool = False, older_than: float = None) -> int:
+        """Remove staged files from older clean_frame versions (all of them with everything=True,
+        or those not written for older_than seconds); returns the number removed."""
+        removed = 0
+        for entry in self.entries():
+            stale = entry["version"] != CLEANING_VERSION or entry["rows"] is None
+            expired = older_than is not None and time.time() - entry["mtime"] > older_than
+            if everything or stale or expired:
+                os.remove(entry["path"])
+                removed += 1
+        logger.info(f"Purged {removed} staged dumps from {self.directory}.")
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "writes": self.writes,
+            "failures": self.failures,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+def _present(columns, names: list):
+    return None if columns is None else [name for name in columns if name in names]
+
+
+def _prune(df: pd.DataFrame, columns) -> pd.DataFrame:
+    return df if columns is None else df[_present(columns, df.columns)]
+
+
+staging_cache = StagingCache()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    commands = parser.add_subparsers(dest="command", required=True)
+    warm = commands.add_parser("warm", help="Parse and stage dumps that are not staged yet")
+    warm.add_argument("paths", nargs="*", help="Dump files (default: every dump in INGEST_DIR)")
+    commands.add_parser("list", help="Show staged dumps")
+    purge = commands.add_parser("purge", help="Remove staged dumps of older clean_frame versions")
+    purge.add_argument("--all", action="store_true", help="Remove every staged dump")
+    purge.add_argument("--older-than", type=float, metavar="DAYS", help="Also remove dumps staged before this")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+
+    if args.command == "warm":
+        from utils.ingest_scheduler import list_dumps
+        for path in args.paths or list_dumps():
+            started = time.perf_counter()
+            scan = scan_dump(path)
+            was_staged = staging_cache.has(scan["content_hash"])
+            rows = staging_cache.stage(path, scan["content_hash"], scan["end_offset"])
+            if was_staged:
+                state = "already staged"
+            else:
+                state = "staged" if rows is not None else "could not be staged"
+            print(f"{path}: {rows or 0} rows {state} in {time.perf_counter() - started:.2f}s")
+    elif args.command == "list":
+        for entry in staging_cache.entries():
+            print(f"{entry['source'] or '?':40} v{entry['version']} {entry['rows']:>10} rows "
+                  f"{entry['size'] / 1e6:9.1f} MB  {entry['path']}")
+    else:
+        older_than = args.older_than * 86400 if args.older_than is not None else None
+        print(f"Removed {staging_cache.purge(everything=args.all, older_than=older_than)} staged dumps.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,124 @@
+#utils/startup.py
+"""Startup cost report: import time per first-party module and the duration of each lifespan init step."""
+import importlib.abc
+import logging
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+# First-party packages whose module imports are timed
+TRACKED_PACKAGES = ("api", "utils")
+
+
+# Runs the real loader, timing the module body (and the imports it triggers)
+class _TimedLoader(importlib.abc.Loader):
+    def __init__(self, loader, report):
+        self.loader = loader
+        self.report = report
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        with self.report._timing(module.__name__):
+            self.loader.exec_module(module)
+
+    # get_source, get_code and friends (tracebacks, inspect) go to the real loader
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+
+# Meta path finder that only wraps the loaders of tracked modules
+class _ImportTimer(importlib.abc.MetaPathFinder):
+    def __init__(self, report, packages):
+        self.report = report
+        self.packages = set(packages)
+
+    def find_spec(self, fullname, path, target=None):
+        if fullname.partition(".")[0] not in self.packages:
+            return None
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, "find_spec"):
+                continue
+            spec = finder.find_spec(fullname, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, "exec_module"):
+                    spec.loader = _TimedLoader(spec.loader, self.report)
+                return spec
+        return None
+
+
+class StartupReport:
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.imports = {}  # module -> (cumulative seconds, self seconds)
+        self.import_seconds = 0.0
+        self.phases = []  # (init step, seconds)
+        self.ready_seconds = None
+        self._finder = None
+        self._local = threading.local()
+
+    def track_imports(self, packages=TRACKED_PACKAGES):
+        """Time every import of the given packages from now until finish()."""
+        if self._finder is None:
+            self._finder = _ImportTimer(self, packages)
+            sys.meta_path.insert(0, self._finder)
+
+    @contextmanager
+    def _timing(self, name: str):
+        stack = self._local.__dict__.setdefault("stack", [])
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            children = stack.pop()
+            self.imports[name] = (elapsed, elapsed - children)
+            if stack:
+                stack[-1] += elapsed
+            else:
+                self.import_seconds += elapsed
+
+    @contextmanager
+    def phase(self, name: str):
+        """Time one startup step, e.g. `with startup_report.phase("init_schema"): ...`."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.perf_counter() - started))
+
+    def finish(self, top: int = 10):
+        """Stop timing imports and log where startup time went."""
+        if self._finder is not None:
+            sys.meta_path.remove(self._finder)
+            self._finder = None
+        self.ready_seconds = time.perf_counter() - self.started
+        self.log_report(top)
+
+    def log_report(self, top: int = 10):
+        logger.info(f"Ready in {self.ready_seconds or 0:.3f}s: imports {self.import_seconds:.3f}s, "
+                    f"init {sum(seconds for _, seconds in self.phases):.3f}s.")
+        # Self time includes the third-party packages a module was the first to import
+        slowest = sorted(self.imports.items(), key=lambda item: item[1][1], reverse=True)[:top]
+        for name, (cumulative, own) in slowest:
+            logger.info(f"  import {name:32} {own * 1000:8.1f} ms self {cumulative * 1000:8.1f} ms total")
+        for name, seconds in self.phases:
+            logger.info(f"  init   {name:32} {seconds * 1000:8.1f} ms")
+
+    def stats(self) -> dict:
+        stats = {
+            "import_seconds": self.import_seconds,
+            "ready_seconds": self.ready_seconds or 0.0,
+            "modules": len(self.imports),
+        }
+        for name, seconds in self.phases:
+            stats[f"init_{name}_seconds"] = seconds
+        return stats
+
+
+startup_report = StartupReport()
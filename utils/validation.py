@@ -0,0 +1,169 @@
+#utils/validation.py
+import datetime
+import decimal
+import typing
+
+import numpy as np
+import pandas as pd
+
+from api.schemas import TransactionBase
+
+
+# Constraints of one TransactionBase field, read from its (Optional[Annotated[...]]) annotation
+def _field_rule(field) -> dict:
+    annotation = field.annotation
+    if typing.get_origin(annotation) is typing.Union:
+        annotation = next(arg for arg in typing.get_args(annotation) if arg is not type(None))
+
+    rule = {"required": field.is_required(), "ge": None, "max_digits": None, "decimal_places": None}
+    base = annotation
+    if typing.get_origin(annotation) is typing.Annotated:
+        base, *metadata = typing.get_args(annotation)
+        for item in metadata:
+            for attr in ("ge", "max_digits", "decimal_places"):
+                if getattr(item, attr, None) is not None:
+                    rule[attr] = getattr(item, attr)
+
+    if base is decimal.Decimal:
+        rule["kind"] = "decimal"
+    elif base is int:
+        rule["kind"] = "int"
+    elif base is datetime.date:
+        rule["kind"] = "date"
+    else:
+        rule["kind"] = "str"
+    return rule
+
+
+FIELD_RULES = {name: _field_rule(field) for name, field in TransactionBase.model_fields.items()}
+
+
+# Missing values: NaN/NaT/None, and for non-str fields the blank strings left by parse_csv's fillna('')
+def _null_mask(series: pd.Series) -> np.ndarray:
+    mask = series.isna().to_numpy()
+    if series.dtype == object:
+        mask |= (series.astype(str).str.strip() == "").to_numpy()
+    return mask
+
+
+def _check_str(series: pd.Series, null: np.ndarray, rule: dict):
+    # Numbers parsed out of string columns are written back as text rather than rejected
+    if pd.api.types.is_numeric_dtype(series):
+        numbers = series.astype(float)
+        integral = numbers.dropna().mod(1).eq(0).all()
+        values = numbers.astype("Int64").astype("string") if integral else numbers.astype("string")
+    else:
+        values = series.astype(str)
+    return values, np.zeros(len(series), dtype=bool), ""
+
+
+def _check_int(series: pd.Series, null: np.ndarray, rule: dict):
+    numbers = pd.to_numeric(series, errors="coerce")
+    invalid = ~null & (numbers.isna() | (numbers % 1 != 0)).to_numpy()
+    message = "not a valid integer"
+    if rule["ge"] is not None:
+        invalid |= ~null & (numbers < rule["ge"]).to_numpy()
+        message = f"not an integer >= {rule['ge']}"
+    values = numbers.where(~(null | invalid)).astype("Int64")
+    return values, invalid, message
+
+
+# As pydantic reads a decimal: text as written, numbers through str(); None if it is not a finite decimal
+def _to_decimal(value):
+    try:
+        number = decimal.Decimal(value if isinstance(value, str) else str(value))
+    except decimal.InvalidOperation:
+        return None
+    return number if number.is_finite() else None
+
+
+# (digits before the point, digits after it), trailing zeros not counted, as pydantic counts them
+def _decimal_shape(number: decimal.Decimal) -> tuple:
+    _, digits, exponent = number.as_tuple()
+    if exponent < 0 and digits[-1] == 0:
+        _, digits, exponent = number.normalize().as_tuple()
+    return max(len(digits) + exponent, 0), max(-exponent, 0)
+
+
+def _check_decimal(series: pd.Series, null: np.ndarray, rule: dict):
+    # Parsed and bound as Decimal: a float64 would round amounts past 2**53 and blur the scale check
+    numbers = np.full(len(series), None, dtype=object)
+    shapes = np.zeros((len(series), 2), dtype=np.int64)
+    values = series.to_numpy(dtype=object)
+    for i in np.flatnonzero(~null):
+        number = _to_decimal(values[i])
+        if number is not None:
+            numbers[i] = number
+            shapes[i] = _decimal_shape(number)
+
+    invalid = ~null & pd.isna(numbers)
+    places, digits = rule["decimal_places"], rule["max_digits"]
+    message = "not a valid decimal"
+    if places is not None:
+        invalid |= shapes[:, 1] > places
+        message = f"not a decimal with at most {places} decimal places"
+        if digits is not None:
+            invalid |= shapes[:, 0] > digits - places
+            message = f"not a decimal({digits}, {places})"
+    return pd.Series(numbers, index=series.index, dtype=object).where(~(null | invalid), None), invalid, message
+
+
+def _check_date(series: pd.Series, null: np.ndarray, rule: dict):
+    if pd.api.types.is_datetime64_any_dtype(series):
+        dates = series
+    else:
+        text = series.where(~null).astype(str).str.strip()
+        dates = pd.to_datetime(text, format="ISO8601", errors="coerce")
+        # Fall back to the dump's own DD-MON-YY format for whatever ISO parsing left behind
+        retry = dates.isna() & ~null
+        if retry.any():
+            dates = dates.mask(retry, pd.to_datetime(text[retry], format="%d-%b-%y", errors="coerce"))
+    # Like pydantic, a date may not carry a time of day
+    invalid = ~null & (dates.isna() | (dates != dates.dt.normalize())).to_numpy()
+    values = dates.where(~(null | invalid))
+    return values, invalid, "not a valid date"
+
+
+CHECKS = {"str": _check_str, "int": _check_int, "decimal": _check_decimal, "date": _check_date}
+
+
+# Vectorised equivalent of building a TransactionBase per row
+def validate_frame(df: pd.DataFrame) -> tuple:
+    """Check the TransactionBase constraints column by column.
+
+    Returns (valid, rejected): valid holds the schema columns of the passing rows with nulls
+    normalised, rejected holds DOC_IDT and the joined reasons for every failing row.
+    """
+    reasons = pd.Series("", index=df.index, dtype=object)
+    columns = {}
+    for name, rule in FIELD_RULES.items():
+        if name not in df.columns:
+            if rule["required"]:
+                reasons = reasons + f"{name}: field required; "
+            continue
+
+        series = df[name]
+        null = _null_mask(series)
+        values, invalid, message = CHECKS[rule["kind"]](series, null, rule)
+        # Blank strings stay as they are in str fields, as they did through pydantic
+        columns[name] = values.where(series.notna(), None) if rule["kind"] == "str" else values
+        if invalid.any():
+            reasons = reasons.mask(invalid, reasons + f"{name}: {message}; ")
+
+    rejected_mask = (reasons != "").to_numpy()
+    valid = pd.DataFrame(columns, index=df.index)[~rejected_mask]
+    rejected = pd.DataFrame({
+        "DOC_IDT": df["DOC_IDT"][rejected_mask] if "DOC_IDT" in df.columns else None,
+        "REASON": reasons[rejected_mask].str.rstrip("; "),
+    })
+    return valid, rejected
+
+
+# Rows of a validated frame as plain Python values ready to bind
+def frame_to_records(df: pd.DataFrame) -> list:
+    df = df.copy()
+    for name in df.columns:
+        if pd.api.types.is_datetime64_any_dtype(df[name]):
+            df[name] = df[name].dt.date
+    df = df.astype(object).where(df.notna(), None)
+    return df.to_dict("records")